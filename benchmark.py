@@ -0,0 +1,512 @@
+"""Benchmark dos servidores de chat e de autenticação em localhost.
+
+Sobe o servidor de chat (core.chatserver.start_server) e o de autenticação
+(core.auth_server.AuthServer) em um processo filho, conecta N clientes que
+falam o mesmo protocolo do ChatClient e mede:
+
+- tempo de conexão + handshake dos clientes;
+- handshakes de autenticação por segundo;
+- latência do broadcast (p50/p99/p999), do envio até a chegada em cada destinatário;
+- vazão (mensagens entregues e bytes por segundo) e bytes na rede por entrega
+  (com --compressao os clientes negociam o codec, ver core/compression.py);
+- CPU e RSS do processo servidor;
+- as métricas internas do servidor (core/metrics.py) ao fim da carga.
+
+O resultado é impresso (ou gravado com --saida) em JSON.
+
+Uso: python3 benchmark.py [--clientes 100] [--remetentes 10] [--taxa 200] [--tamanho 100]
+                          [--duracao 10] [--modo eventos|threads|processos] [--loops 1]
+                          [--processos N] [--compressao zlib|zlib-stream]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import select
+import selectors
+import socket
+import sys
+import threading
+import time
+import urllib.request
+
+# O processo servidor do benchmark não grava o log de mensagens em disco, não limita
+# a taxa dos clientes (core/ratelimit.py; mede-se o servidor, não o limitador) e não
+# se anuncia por multicast na rede de quem roda o benchmark (core/discovery.py)
+os.environ.setdefault("P2P_CHAT_LOG", "0")
+os.environ.setdefault("P2P_CHAT_LIMITE", "0")
+os.environ.setdefault("P2P_CHAT_DESCOBERTA", "0")
+
+from core.chatserver import MODO_EVENTOS, MODO_PROCESSOS, MODO_THREADS
+from core.compression import CODECS, criar_descompressor
+from core.framing import FrameDecoder, TIPO_CONTROLE, TIPO_MENSAGEM, decode_mensagem, encode_texto
+from core.protocol import OPCAO_COMPRESSAO, RESPOSTA_COMPRESSAO, montar_handshake, parse_comando
+from core.auth_token import MODO_BCRYPT, MODO_HMAC
+
+HOST = "127.0.0.1"
+SEPARADOR = "|"  # Texto das mensagens: '<perf_counter_ns do envio>|<preenchimento>'
+MARCA_SINCRONIA = "sync"
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def percentis(amostras_ns):
+    """p50/p99/p999/máx em milissegundos."""
+    if not amostras_ns:
+        return {}
+    ordenadas = sorted(amostras_ns)
+    ultimo = len(ordenadas) - 1
+
+    def p(fracao):
+        return round(ordenadas[min(ultimo, int(fracao * len(ordenadas)))] / 1e6, 3)
+
+    return {"p50": p(0.50), "p99": p(0.99), "p999": p(0.999),
+            "max": round(ordenadas[-1] / 1e6, 3), "amostras": len(ordenadas)}
+
+
+# --- Processo servidor ---
+
+def _rodar_servidor(modo, num_loops, num_processos, porta_chat, porta_auth, porta_metricas, modo_auth,
+                    pronto, verboso):
+    from core.auth_server import AuthServer
+    from core.chatserver import start_server
+    from core.metrics import expor_metricas
+    from core import logs
+
+    if not verboso:
+        logs.definir_nivel(logs.DESLIGADO)
+        # Demais avisos (ex.: geração do token) também ficam fora do terminal do benchmark
+        sys.stdout = open(os.devnull, "w")
+    expor_metricas(porta_metricas, 0)
+
+    AuthServer(HOST, porta_auth, modo=modo_auth).start()
+    threading.Thread(target=start_server, args=(None, modo, num_loops, HOST, porta_chat, num_processos),
+                     daemon=True).start()
+    pronto.set()
+    while True:
+        time.sleep(3600)
+
+
+class MonitorProcesso:
+    """CPU (utime + stime) e RSS de um processo e seus descendentes (workers), lidos de /proc."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self._ticks = os.sysconf("SC_CLK_TCK")
+
+    def processos(self):
+        pids, pendentes = [], [self.pid]
+        while pendentes:
+            pid = pendentes.pop()
+            pids.append(pid)
+            try:
+                for tarefa in os.listdir(f"/proc/{pid}/task"):
+                    with open(f"/proc/{pid}/task/{tarefa}/children") as f:
+                        pendentes.extend(int(filho) for filho in f.read().split())
+            except OSError:
+                continue
+        return pids
+
+    def cpu(self):
+        total = 0
+        for pid in self.processos():
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    campos = f.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            # utime e stime são os campos 14 e 15 de /proc/<pid>/stat (11 e 12 após o nome)
+            total += int(campos[11]) + int(campos[12])
+        return total / self._ticks
+
+    def memoria_kb(self):
+        rss = pico = 0
+        for pid in self.processos():
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for linha in f:
+                        if linha.startswith("VmRSS:"):
+                            rss += int(linha.split()[1])
+                        elif linha.startswith("VmHWM:"):
+                            pico += int(linha.split()[1])
+            except OSError:
+                continue
+        return rss, pico
+
+
+def ler_metricas(porta):
+    with urllib.request.urlopen(f"http://{HOST}:{porta}/", timeout=5) as resposta:
+        return json.load(resposta)
+
+
+def aguardar_porta(porta, timeout=10.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            socket.create_connection((HOST, porta), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.02)
+    raise RuntimeError(f"Servidor não respondeu na porta {porta}")
+
+
+# --- Autenticação ---
+
+def medir_autenticacao(porta, modo_auth, total, concorrencia):
+    from core.auth_token import validar_token
+    from core.networking import autenticar_com_host
+
+    latencias = []
+    falhas = [0]
+    lock = threading.Lock()
+    restantes = iter(range(total))
+
+    # Aquecimento: o primeiro bcrypt.checkpw do cliente não entra na medição
+    autenticar_com_host(HOST, validar_token, porta, modo_auth)
+
+    def trabalhador():
+        while True:
+            with lock:
+                if next(restantes, None) is None:
+                    return
+            inicio = time.perf_counter_ns()
+            ok = autenticar_com_host(HOST, validar_token, porta, modo_auth)
+            duracao = time.perf_counter_ns() - inicio
+            with lock:
+                latencias.append(duracao)
+                if not ok:
+                    falhas[0] += 1
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=trabalhador) for _ in range(concorrencia)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    return {
+        "modo": modo_auth,
+        "handshakes": total,
+        "falhas": falhas[0],
+        "concorrencia": concorrencia,
+        "duracao_s": round(duracao, 3),
+        "handshakes_por_s": round(total / duracao, 1) if duracao else None,
+        "latencia_ms": percentis(latencias),
+    }
+
+
+# --- Clientes de chat ---
+
+class ClienteSimulado:
+    """Cliente que fala o protocolo do ChatClient (handshake + frames TIPO_TEXTO)."""
+
+    def __init__(self, indice, codec=None):
+        self.nome = f"bench{indice}"
+        self.codec = codec  # Oferecido no handshake; o servidor responde com o escolhido
+        self.sock = None
+        self.decoder = FrameDecoder()
+        self.envio_lock = threading.Lock()
+        self.sincronizado = False
+
+    def conectar(self, porta):
+        self.sock = socket.create_connection((HOST, porta), timeout=10)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        opcoes = {OPCAO_COMPRESSAO: self.codec} if self.codec else {}
+        self.sock.sendall(encode_texto(montar_handshake(self.nome, **opcoes), TIPO_CONTROLE))
+        self.sock.setblocking(False)
+
+    def enviar(self, texto):
+        dados = encode_texto(texto)
+        with self.envio_lock:
+            # Socket não bloqueante: conclui o envio esperando espaço no buffer
+            visao = memoryview(dados)
+            while visao:
+                try:
+                    visao = visao[self.sock.send(visao):]
+                except BlockingIOError:
+                    select.select([], [self.sock], [], 1.0)
+
+    def fechar(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class Receptor(threading.Thread):
+    """Lê os frames de todos os clientes em um único laço e registra as latências."""
+
+    def __init__(self, clientes):
+        super().__init__(name="bench-receptor", daemon=True)
+        self.clientes = clientes
+        self.latencias = []
+        self.entregues = 0
+        self.bytes_recebidos = 0
+        self.bytes_rede = 0  # Bytes lidos do socket durante a medição (com frames comprimidos)
+        self.medindo = False
+        self.desconectados = 0
+        self._parar = threading.Event()
+        self._selector = selectors.DefaultSelector()
+        for cliente in clientes:
+            self._selector.register(cliente.sock, selectors.EVENT_READ, cliente)
+
+    def parar(self):
+        self._parar.set()
+
+    def run(self):
+        while not self._parar.is_set():
+            for key, _ in self._selector.select(timeout=0.1):
+                cliente = key.data
+                try:
+                    n = cliente.decoder.recv_into(cliente.sock)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    n = 0
+                if not n:
+                    self._selector.unregister(cliente.sock)
+                    self.desconectados += 1
+                    continue
+                agora = time.perf_counter_ns()
+                if self.medindo:
+                    self.bytes_rede += n
+                for tipo, payload in cliente.decoder.frames():
+                    if tipo == TIPO_CONTROLE:
+                        comando, codec, _ = parse_comando(payload.decode('utf-8'), (RESPOSTA_COMPRESSAO,))
+                        if comando:
+                            cliente.decoder.descompressor = criar_descompressor(codec)
+                        continue
+                    if tipo != TIPO_MENSAGEM:
+                        continue
+                    _, texto = decode_mensagem(payload)
+                    # 'nome: <ns>|...'
+                    corpo = texto.split(": ", 1)[-1]
+                    marca, _, _ = corpo.partition(SEPARADOR)
+                    if marca == MARCA_SINCRONIA:
+                        cliente.sincronizado = True
+                    elif self.medindo:
+                        self.latencias.append(agora - int(marca))
+                        self.entregues += 1
+                        self.bytes_recebidos += len(payload)
+        self._selector.close()
+
+
+def conectar_clientes(porta, quantidade, concorrencia, codec=None):
+    clientes = [ClienteSimulado(i, codec) for i in range(quantidade)]
+    latencias = []
+    lock = threading.Lock()
+    fila = iter(clientes)
+
+    def trabalhador():
+        while True:
+            with lock:
+                cliente = next(fila, None)
+            if cliente is None:
+                return
+            inicio = time.perf_counter_ns()
+            cliente.conectar(porta)
+            duracao = time.perf_counter_ns() - inicio
+            with lock:
+                latencias.append(duracao)
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=trabalhador) for _ in range(min(concorrencia, quantidade))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return clientes, time.perf_counter() - inicio, latencias
+
+
+def sincronizar(clientes, timeout=30.0):
+    """Garante que todos os clientes já estão inscritos no broadcast.
+
+    Dois clientes se revezam enviando uma marca até todos os demais a receberem
+    (quem envia não recebe a própria mensagem).
+    """
+    inicio = time.perf_counter()
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        clientes[0].enviar(f"{MARCA_SINCRONIA}{SEPARADOR}")
+        if len(clientes) > 1:
+            clientes[1].enviar(f"{MARCA_SINCRONIA}{SEPARADOR}")
+        time.sleep(0.05)
+        if all(c.sincronizado for c in clientes):
+            return time.perf_counter() - inicio
+    faltando = sum(1 for c in clientes if not c.sincronizado)
+    raise RuntimeError(f"{faltando} clientes não entraram no broadcast em {timeout}s")
+
+
+# Texto de enchimento parecido com o de um chat (um 'xxxx...' seria comprimido de forma irreal)
+PALAVRAS = ("alguém", "sabe", "se", "o", "arquivo", "já", "chegou", "pode", "mandar", "de", "novo",
+            "a", "reunião", "foi", "para", "amanhã", "às", "10h", "ok", "valeu", "tudo", "certo",
+            "aqui", "sala", "do", "projeto", "vou", "ver", "isso", "agora", "link", "não", "abre")
+
+
+def _preencher(tamanho, semente):
+    palavras = []
+    total = 0
+    i = semente * 7
+    while total < tamanho:
+        palavra = PALAVRAS[(i * 2654435761) % len(PALAVRAS)]
+        palavras.append(palavra)
+        total += len(palavra) + 1
+        i += 1
+    return " ".join(palavras)[:max(0, tamanho)]
+
+
+def gerar_carga(remetentes, taxa, tamanho, duracao):
+    """Envia `taxa` mensagens/s distribuídas entre os remetentes durante `duracao` segundos."""
+    intervalo = 1.0 / taxa
+    enviadas = 0
+    inicio = time.perf_counter()
+    proximo = inicio
+    fim = inicio + duracao
+    while True:
+        agora = time.perf_counter()
+        if agora >= fim:
+            break
+        if agora < proximo:
+            time.sleep(proximo - agora)
+        marca = str(time.perf_counter_ns())
+        texto = marca + SEPARADOR + _preencher(tamanho - len(marca) - 1, enviadas)
+        remetentes[enviadas % len(remetentes)].enviar(texto)
+        enviadas += 1
+        proximo += intervalo
+    return enviadas, time.perf_counter() - inicio
+
+
+def medir_chat(args, porta, monitor):
+    clientes, tempo_conexao, latencias_conexao = conectar_clientes(
+        porta, args.clientes, args.concorrencia_conexao, args.compressao)
+    receptor = Receptor(clientes)
+    receptor.start()
+    tempo_sincronia = sincronizar(clientes)
+
+    remetentes = clientes[:max(1, min(args.remetentes, len(clientes)))]
+    receptor.medindo = True
+    cpu_inicio = monitor.cpu()
+    enviadas, duracao = gerar_carga(remetentes, args.taxa, args.tamanho, args.duracao)
+    cpu_carga = monitor.cpu() - cpu_inicio
+
+    # Aguarda as entregas em trânsito antes de fechar a medição
+    esperadas = enviadas * (len(clientes) - 1)
+    limite = time.monotonic() + args.espera_final
+    while receptor.entregues < esperadas and time.monotonic() < limite:
+        time.sleep(0.05)
+    receptor.medindo = False
+    rss_kb, pico_rss_kb = monitor.memoria_kb()
+
+    receptor.parar()
+    receptor.join()
+    for cliente in clientes:
+        cliente.fechar()
+
+    return {
+        "conexao": {
+            "clientes": len(clientes),
+            "duracao_total_s": round(tempo_conexao, 3),
+            "conexoes_por_s": round(len(clientes) / tempo_conexao, 1) if tempo_conexao else None,
+            "latencia_ms": percentis(latencias_conexao),
+            "sincronia_s": round(tempo_sincronia, 3),
+        },
+        "broadcast": {
+            "remetentes": len(remetentes),
+            "taxa_alvo": args.taxa,
+            "tamanho_mensagem": args.tamanho,
+            "enviadas": enviadas,
+            "enviadas_por_s": round(enviadas / duracao, 1),
+            "entregas_esperadas": esperadas,
+            "entregues": receptor.entregues,
+            "perdidas": max(0, esperadas - receptor.entregues),
+            "clientes_desconectados": receptor.desconectados,
+            "entregas_por_s": round(receptor.entregues / duracao, 1),
+            "bytes_por_s": round(receptor.bytes_recebidos / duracao, 1),
+            "bytes_rede_por_entrega": round(receptor.bytes_rede / receptor.entregues, 1) if receptor.entregues else None,
+            "latencia_ms": percentis(receptor.latencias),
+        },
+        "servidor": {
+            "cpu_s": round(cpu_carga, 3),
+            "cpu_pct": round(100 * cpu_carga / duracao, 1),
+            "rss_kb": rss_kb,
+            "pico_rss_kb": pico_rss_kb,
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dos servidores de chat e autenticação")
+    parser.add_argument("--clientes", type=int, default=100, help="clientes de chat simulados")
+    parser.add_argument("--remetentes", type=int, default=10, help="quantos clientes enviam mensagens")
+    parser.add_argument("--taxa", type=float, default=200, help="mensagens por segundo (total)")
+    parser.add_argument("--tamanho", type=int, default=100, help="tamanho do texto de cada mensagem (bytes)")
+    parser.add_argument("--duracao", type=float, default=10, help="duração da carga em segundos")
+    parser.add_argument("--modo", choices=(MODO_EVENTOS, MODO_THREADS, MODO_PROCESSOS), default=MODO_EVENTOS)
+    parser.add_argument("--loops", type=int, default=1, help="laços de eventos no modo 'eventos'")
+    parser.add_argument("--processos", type=int, help="workers no modo 'processos' (padrão: CPUs)")
+    parser.add_argument("--auth-handshakes", type=int, default=500, help="0 desativa o teste de autenticação")
+    parser.add_argument("--auth-concorrencia", type=int, default=16)
+    parser.add_argument("--auth-modo", choices=(MODO_BCRYPT, MODO_HMAC), default=MODO_BCRYPT)
+    parser.add_argument("--compressao", choices=tuple(CODECS), help="codec oferecido pelos clientes")
+    parser.add_argument("--concorrencia-conexao", type=int, default=32)
+    parser.add_argument("--espera-final", type=float, default=5.0,
+                        help="segundos aguardando entregas pendentes após a carga")
+    parser.add_argument("--saida", help="grava o JSON neste arquivo em vez de imprimir")
+    parser.add_argument("--verboso", action="store_true", help="mantém as mensagens do servidor no terminal")
+    args = parser.parse_args(argv)
+
+    # Cada cliente simulado usa um descritor; sobe o limite flexível até o rígido
+    flexivel, rigido = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if flexivel < rigido:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (rigido, rigido))
+
+    porta_chat, porta_auth, porta_metricas = porta_livre(), porta_livre(), porta_livre()
+    pronto = multiprocessing.Event()
+    servidor = multiprocessing.Process(
+        target=_rodar_servidor,
+        args=(args.modo, args.loops, args.processos, porta_chat, porta_auth, porta_metricas, args.auth_modo,
+              pronto, args.verboso))  # Não daemon: no modo 'processos' ele inicia os workers
+    servidor.start()
+    try:
+        pronto.wait(10)
+        aguardar_porta(porta_chat)
+        aguardar_porta(porta_auth)
+        monitor = MonitorProcesso(servidor.pid)
+
+        resultado = {
+            "versao": 1,
+            "quando": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "ambiente": {
+                "python": platform.python_version(),
+                "plataforma": platform.platform(),
+                "cpus": os.cpu_count(),
+            },
+            "configuracao": {**{k: v for k, v in vars(args).items() if k not in ("saida", "verboso")},
+                             "limite": os.environ["P2P_CHAT_LIMITE"] == "1"},
+        }
+        if args.auth_handshakes:
+            resultado["auth"] = medir_autenticacao(
+                porta_auth, args.auth_modo, args.auth_handshakes, args.auth_concorrencia)
+        resultado.update(medir_chat(args, porta_chat, monitor))
+        resultado["metricas_servidor"] = ler_metricas(porta_metricas)
+    finally:
+        servidor.terminate()
+        servidor.join()
+
+    saida = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(saida + "\n")
+        print(f"[Benchmark] Resultado gravado em {args.saida}")
+    else:
+        print(saida)
+
+
+if __name__ == "__main__":
+    main()
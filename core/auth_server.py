@@ -0,0 +1,148 @@
+# core/auth_server.py
+"""Servidor de autenticação (porta 20556) executado dentro do processo do host.
+
+Substitui o subprocesso `python3 server.py`: aceita conexões em uma thread,
+atende os handshakes em um pool de threads com timeout por conexão e usa o
+mesmo cache de token (core.auth_token.servico_token) do restante do processo.
+"""
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from core.auth_token import MODO_AUTH, MODO_HMAC, PREFIXO_DESAFIO, servico_token
+from core.metrics import metricas
+from core import logs
+
+AUTH_SERVER_PORT = 20556
+BACKLOG = 128          # Absorve rajadas de dispositivos entrando ao mesmo tempo
+TIMEOUT_CONEXAO = 2.0  # Tempo máximo de um handshake
+MAX_WORKERS = 32
+
+_atendidas = metricas.contador("auth.atendidas")
+_falhas = metricas.contador("auth.falhas")
+_tempo_handshake = metricas.histograma("tempo.auth")
+
+
+class AuthServer:
+    """Servidor de autenticação que pode ser iniciado e parado."""
+
+    def __init__(self, host='0.0.0.0', port=AUTH_SERVER_PORT, modo=None, servico=None,
+                 max_workers=MAX_WORKERS, timeout=TIMEOUT_CONEXAO):
+        self.host = host
+        self.port = port
+        self.modo = modo or MODO_AUTH
+        self.servico = servico or servico_token
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.server_socket = None
+        self._pool = None
+        self._thread = None
+        self._despertar_r = self._despertar_w = None
+        self._lock = threading.Lock()
+        self.atendidas = 0
+        self.falhas = 0
+
+    @property
+    def ativo(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Abre a porta e começa a aceitar conexões. Retorna False se já estava ativo."""
+        with self._lock:
+            if self.ativo:
+                return False
+
+            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            try:
+                self.server_socket.bind((self.host, self.port))
+                self.server_socket.listen(BACKLOG)
+            except OSError:
+                self.server_socket.close()
+                self.server_socket = None
+                raise
+            self.server_socket.setblocking(False)
+            # Guarda a porta efetiva (permite port=0 em testes e benchmarks)
+            self.port = self.server_socket.getsockname()[1]
+
+            self._despertar_r, self._despertar_w = socket.socketpair()
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="auth")
+            self._thread = threading.Thread(target=self._aceitar, name="auth-accept", daemon=True)
+            self._thread.start()
+            logs.info(f"[Auth] Servidor de autenticação escutando em {self.host}:{self.port} (modo: {self.modo})")
+            return True
+
+    def stop(self):
+        with self._lock:
+            if not self.ativo:
+                return
+            self._despertar_w.send(b"\0")
+            self._thread.join()
+            self._thread = None
+            self._pool.shutdown(wait=False)
+            self.server_socket.close()
+            self._despertar_r.close()
+            self._despertar_w.close()
+            logs.info("[Auth] Servidor de autenticação encerrado.")
+
+    def _aceitar(self):
+        # Aquece o cache do modo em uso fora da thread de quem chamou start(); conexões
+        # que chegarem enquanto isso aguardam no backlog
+        if self.modo == MODO_HMAC:
+            self.servico.chave_hmac()
+        else:
+            self.servico.token_atual()
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.server_socket, selectors.EVENT_READ)
+            selector.register(self._despertar_r, selectors.EVENT_READ)
+            while True:
+                for key, _ in selector.select():
+                    if key.fileobj is self._despertar_r:
+                        return
+                    # Aceita todas as conexões pendentes de uma vez
+                    while True:
+                        try:
+                            conn, addr = self.server_socket.accept()
+                        except (BlockingIOError, InterruptedError):
+                            break
+                        except OSError as e:
+                            logs.erro(f"[Auth] Erro ao aceitar conexão: {e}")
+                            break
+                        self._pool.submit(self._atender, conn, addr)
+
+    def _atender(self, conn, addr):
+        inicio = time.perf_counter_ns()
+        try:
+            conn.setblocking(True)
+            conn.settimeout(self.timeout)
+            if self.modo == MODO_HMAC:
+                # Desafio-resposta: o cliente envia 'HMAC:<desafio hex>' e recebe o HMAC do desafio
+                pedido = conn.recv(1024).decode().strip()
+                if not pedido.startswith(PREFIXO_DESAFIO):
+                    raise ValueError(f"pedido inválido: {pedido!r}")
+                desafio = bytes.fromhex(pedido[len(PREFIXO_DESAFIO):])
+                conn.sendall(f"{PREFIXO_DESAFIO}{self.servico.responder_desafio(desafio)}".encode())
+            else:
+                conn.sendall(self.servico.token_atual().encode())
+            self.atendidas += 1
+            _atendidas.incrementar()
+            _tempo_handshake.observar_ns(time.perf_counter_ns() - inicio)
+        except Exception as e:
+            self.falhas += 1
+            _falhas.incrementar()
+            logs.erro(f"[Auth] Erro ao atender {addr}: {e}")
+        finally:
+            conn.close()
+
+
+_servidor_padrao = None
+_servidor_padrao_lock = threading.Lock()
+
+def servidor_autenticacao():
+    """Instância única do servidor de autenticação compartilhada pelas janelas."""
+    global _servidor_padrao
+    with _servidor_padrao_lock:
+        if _servidor_padrao is None:
+            _servidor_padrao = AuthServer()
+        return _servidor_padrao
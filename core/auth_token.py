@@ -1,6 +1,24 @@
 # core/auth_token.py
 import bcrypt
-from datetime import datetime
+import hashlib
+import hmac
+import os
+import threading
+from datetime import date, datetime
+
+# Modos de autenticação do servidor da porta 20556
+MODO_BCRYPT = "bcrypt"  # Servidor envia o token bcrypt do dia ao conectar
+MODO_HMAC = "hmac"      # Cliente envia um desafio e o servidor responde com HMAC
+MODO_AUTH = os.environ.get("P2P_AUTH_MODO", MODO_BCRYPT)
+
+PREFIXO_DESAFIO = "HMAC:"
+_SAL_HMAC = b"p2p-com/hmac-v1"
+_ITERACOES_HMAC = 200_000
+
+def palavra_base_do_dia(data_atual=None):
+    data_atual = data_atual or datetime.now()
+    mes_anterior = data_atual.month - 1 if data_atual.month != 1 else 12
+    return f"{data_atual.year}-{mes_anterior}-{data_atual.day}"
 
 def gerar_salt():
     salt = bcrypt.gensalt(rounds=12)
@@ -8,10 +26,8 @@ def gerar_salt():
 
 def gerar_token():
     try:
-        data_atual = datetime.now()
-        mes_anterior = data_atual.month - 1 if data_atual.month != 1 else 12
-        palavra_base = f"{data_atual.year}-{mes_anterior}-{data_atual.day}"
-        
+        palavra_base = palavra_base_do_dia()
+
         salt = gerar_salt()
         token = bcrypt.hashpw(palavra_base.encode("utf-8"), salt)
         return token.decode("utf-8")
@@ -19,12 +35,86 @@ def gerar_token():
         print(f"[ERRO] ao gerar token: {e}")
         return None
 
+# Tokens já validados hoje: evita repetir o bcrypt.checkpw (~250 ms) a cada verificação
+_tokens_validados = {}
+_tokens_validados_lock = threading.Lock()
+
 def validar_token(token_recebido):
     try:
-        data_atual = datetime.now()
-        mes_anterior = data_atual.month - 1 if data_atual.month != 1 else 12
-        palavra_base = f"{data_atual.year}-{mes_anterior}-{data_atual.day}"
-        return bcrypt.checkpw(palavra_base.encode("utf-8"), token_recebido.encode("utf-8"))
+        palavra_base = palavra_base_do_dia()
+        with _tokens_validados_lock:
+            if _tokens_validados.get(token_recebido) == palavra_base:
+                return True
+
+        valido = bcrypt.checkpw(palavra_base.encode("utf-8"), token_recebido.encode("utf-8"))
+        if valido:
+            with _tokens_validados_lock:
+                # Só guarda tokens do dia atual
+                for token, palavra in list(_tokens_validados.items()):
+                    if palavra != palavra_base:
+                        del _tokens_validados[token]
+                _tokens_validados[token_recebido] = palavra_base
+        return valido
     except Exception as e:
         print(f"[ERRO] ao validar token: {e}")
         return False
+
+
+class TokenService:
+    """Mantém em memória o material de autenticação do dia.
+
+    O token bcrypt e a chave HMAC são derivados uma única vez por dia (e
+    regenerados quando a data muda), em vez de um bcrypt.hashpw por conexão.
+    Cada um só é derivado quando alguém precisa dele: o cliente que valida
+    uma resposta HMAC não paga pelo bcrypt, e o servidor no modo bcrypt não
+    paga pelo PBKDF2.
+    """
+
+    def __init__(self):
+        self._locks = {"token": threading.Lock(), "chave_hmac": threading.Lock()}
+        self._do_dia = {}  # nome → (data, valor)
+
+    def _material(self, nome, derivar):
+        hoje = date.today()
+        data, valor = self._do_dia.get(nome, (None, None))
+        if data == hoje:
+            return valor
+        with self._locks[nome]:
+            data, valor = self._do_dia.get(nome, (None, None))
+            if data != hoje:
+                valor = derivar(palavra_base_do_dia().encode("utf-8"))
+                self._do_dia[nome] = (hoje, valor)
+                print(f"[LOG] Material de autenticação '{nome}' do dia {hoje.isoformat()} gerado.")
+            return valor
+
+    def token_atual(self):
+        """Token bcrypt do dia, servido da memória."""
+        try:
+            return self._material("token", lambda palavra: bcrypt.hashpw(palavra, gerar_salt()).decode("utf-8"))
+        except Exception as e:
+            print(f"[ERRO] ao gerar token: {e}")
+            return None
+
+    def chave_hmac(self):
+        """Chave HMAC do dia (PBKDF2 da palavra base), servida da memória."""
+        return self._material(
+            "chave_hmac", lambda palavra: hashlib.pbkdf2_hmac("sha256", palavra, _SAL_HMAC, _ITERACOES_HMAC))
+
+    def responder_desafio(self, desafio: bytes) -> str:
+        """Resposta HMAC-SHA256 (hex) para o desafio enviado pelo cliente."""
+        return hmac.new(self.chave_hmac(), desafio, hashlib.sha256).hexdigest()
+
+    def validar_resposta(self, desafio: bytes, resposta: str) -> bool:
+        try:
+            return hmac.compare_digest(self.responder_desafio(desafio), resposta.strip())
+        except Exception as e:
+            print(f"[ERRO] ao validar resposta HMAC: {e}")
+            return False
+
+    @staticmethod
+    def gerar_desafio() -> bytes:
+        return os.urandom(16)
+
+
+# Instância compartilhada pelo servidor de autenticação e pelo cliente
+servico_token = TokenService()
@@ -1,52 +1,280 @@
+import itertools
+import json
+import os
+import random
 import socket
 import threading
-import subprocess
-from PySide6.QtCore import QObject, Signal, Slot
+import time
+from collections import deque
+from PySide6.QtCore import QObject, Qt, Signal, Slot
+from core.framing import (
+    FrameDecoder, TIPO_BLOCO, TIPO_CONTROLE, TIPO_MENSAGEM, TIPO_PING, TIPO_PONG, TIPO_TEXTO, decode_mensagem,
+    encode_frame, encode_texto,
+)
+from core.protocol import (
+    COMANDO_DM, COMANDO_DOWNLOAD, COMANDO_ENTRAR, COMANDO_SAIR, COMANDO_SALA, COMANDO_UPLOAD, OPCAO_BATIMENTO,
+    OPCAO_COMPRESSAO, OPCAO_RESUME, OPCAO_SALAS, OPCAO_SESSAO, RESPOSTA_ARQUIVO, RESPOSTA_COMPRESSAO,
+    RESPOSTA_ERRO_ARQUIVO, RESPOSTA_LACUNA, RESPOSTA_SEQ, RESPOSTA_SESSAO, RESPOSTA_UPLOAD, RESPOSTAS_ARQUIVO,
+    SALA_PADRAO,
+    montar_comando, montar_handshake, montar_marca, nome_de_sala_valido, parse_comando, parse_marca,
+)
+from core.compression import CODECS_PADRAO, codecs_de, criar_compressor, criar_descompressor
+from core.netinfo import obter_gateway
+from core.outbound import enviar_vetorizado
+from core.heartbeat import (
+    INTERVALO_PING, RESOLUCAO, TIMEOUT_SILENCIO, configurar_keepalive, montar_ping, rtt_do_pong,
+)
+from core.transfer import (
+    EXTENSAO_PARCIAL, EnvioArquivo, EnviosDeArquivo, RecebimentoArquivo, decode_bloco, formatar_tamanho, novo_id,
+)
+
+# Espera entre tentativas de reconexão (backoff exponencial com jitter)
+RECONEXAO_ESPERA_INICIAL = 0.5
+RECONEXAO_ESPERA_MAXIMA = 30.0
+TIMEOUT_CONEXAO = 5.0
+DIRETORIO_DOWNLOADS = os.environ.get("P2P_CHAT_DOWNLOADS_DIR", os.path.join(os.path.expanduser("~"), "Downloads"))
+MAX_PENDENTES_BYTES = int(os.environ.get("P2P_CHAT_CLIENTE_FILA_MAX", 1024 * 1024))  # Retido enquanto sem conexão
+
+# Estados de entrega informados à janela (ChatClientWorker.entrega_atualizada)
+ENTREGA_ENVIADA = "enviada"        # Escrita no socket
+ENTREGA_PENDENTE = "pendente"      # Sem conexão: sai, na ordem, depois da reconexão
+ENTREGA_DESCARTADA = "descartada"  # Cliente desconectado antes de enviar
 
 class ChatClientWorker(QObject):
     message_received = Signal(str)
     connection_error = Signal(str)
+    entrega_atualizada = Signal(int, str, str)  # id do envio, estado (ENTREGA_*), texto
     
-    def __init__(self, client_socket):
+    def __init__(self, client):
         super().__init__()
-        self.client_socket = client_socket
+        self.client = client
         self._running = True
+        self._parado = threading.Event()  # Interrompe a espera entre tentativas de reconexão
 
     def stop(self):
         self._running = False
+        self._parado.set()
+
+    def vigiar_conexao(self):
+        """Pinga o servidor quando a conexão fica quieta e a derruba se nem o pong chegar.
+
+        Derrubar o socket faz o recv de listen_for_messages falhar, o que
+        dispara a reconexão normal; sem isso um servidor que sumiu do hotspot
+        só seria notado no próximo envio.
+        """
+        while not self._parado.wait(RESOLUCAO):
+            client_socket = self.client.client_socket
+            silencio = time.monotonic() - self.client.ultima_atividade
+            try:
+                if silencio >= TIMEOUT_SILENCIO:
+                    print(f"Servidor sem resposta há {silencio:.0f}s; reconectando.")
+                    self.client.ultima_atividade = time.monotonic()  # Um aviso por conexão
+                    client_socket.shutdown(socket.SHUT_RDWR)
+                elif silencio >= INTERVALO_PING and not self.client.ping_pendente:
+                    self.client.ping_pendente = True
+                    self.client._enviar(montar_ping())
+            except OSError:
+                pass  # A thread de escuta cuida da reconexão
 
     @Slot()
     def listen_for_messages(self):
-        """Escuta mensagens do servidor e emite sinais"""
+        """Escuta mensagens do servidor e emite sinais; reconecta se a conexão cair"""
         while self._running:
+            client_socket = self.client.client_socket
+            decoder = self.decoder = FrameDecoder()
             try:
-                message = self.client_socket.recv(1024).decode()
-                if message:
-                    self.message_received.emit(message)
-                else:
-                    self.message_received.emit("Servidor desconectou.")
-                    break
+                while self._running:
+                    if not decoder.recv_into(client_socket):
+                        raise ConnectionError("Servidor desconectou.")
+                    self.client.ultima_atividade = time.monotonic()
+                    self.client.ping_pendente = False
+
+                    # Um único recv pode conter várias mensagens (ou parte de uma)
+                    for tipo, payload in decoder.frames():
+                        self._processar_frame(tipo, payload)
             except Exception as e:
-                if self._running:
-                    self.connection_error.emit(f"Erro de conexão: {e}")
-                break
+                if not self._running:
+                    break
+                self.client.saida.pausar()  # O que for digitado agora espera a reconexão
+                self.message_received.emit(f"Conexão perdida ({e}). Reconectando...")
+                if not self.client.reconectar(self._parado):
+                    if self._running:
+                        self.connection_error.emit("Erro de conexão: não foi possível reconectar ao servidor.")
+                    break
+                self.message_received.emit("Reconectado ao servidor.")
+                self.client.saida.retomar()
+                self.client._retomar_transferencias()
         
-        self.client_socket.close()
+        self.client.client_socket.close()
         print("Thread de escuta encerrada.")
 
+    def _processar_frame(self, tipo, payload):
+        if tipo == TIPO_MENSAGEM:
+            seq, texto = decode_mensagem(payload)
+            if seq <= self.client.ultimo_seq:
+                return  # Já recebida antes da reconexão
+            self.client.ultimo_seq = seq
+            self.message_received.emit(texto)
+        elif tipo == TIPO_TEXTO:
+            self.message_received.emit(payload.decode('utf-8'))
+        elif tipo == TIPO_PING:
+            self.client._enviar(encode_frame(payload, TIPO_PONG))
+        elif tipo == TIPO_PONG:
+            self.client.rtt_ms = rtt_do_pong(payload)
+        elif tipo == TIPO_BLOCO:
+            texto = self.client._receber_bloco(payload)
+            if texto:
+                self.message_received.emit(texto)
+        elif tipo == TIPO_CONTROLE:
+            texto = payload.decode('utf-8')
+            comando, argumento, _ = parse_comando(texto, (RESPOSTA_COMPRESSAO, RESPOSTA_SEQ, RESPOSTA_SESSAO,
+                                                              RESPOSTA_LACUNA))
+            if comando == RESPOSTA_COMPRESSAO:
+                # Os próximos frames desta conexão já podem chegar comprimidos
+                self.decoder.descompressor = criar_descompressor(argumento)
+                self.client.compressor = criar_compressor(argumento)
+                return
+            if comando == RESPOSTA_SEQ:
+                # Outra época (ou, de um servidor antigo, um seq atrás do nosso): reiniciou sem
+                # log e a numeração recomeçou; o histórico que vem a seguir é todo novo
+                seq, epoca = parse_marca(argumento)
+                outra_epoca = epoca is not None and self.client.epoca is not None and epoca != self.client.epoca
+                if self.client.ultimo_seq and (outra_epoca or seq < self.client.ultimo_seq):
+                    self.client.ultimo_seq = 0
+                    self.message_received.emit("O servidor foi reiniciado; reexibindo o histórico dele.")
+                self.client.epoca = epoca
+                return
+            if comando == RESPOSTA_LACUNA:
+                de, _, ate = argumento.partition(",")
+                self.message_received.emit(f"Parte do histórico (mensagens #{de} a #{ate}) não pôde ser reexibida.")
+                return
+            if comando == RESPOSTA_SESSAO:
+                self.client.sessao = argumento  # Prova, na reconexão, que as mensagens diretas são nossas
+                return
+            texto = self.client._tratar_resposta(texto)
+            if texto:
+                self.message_received.emit(texto)
+
+
+class UploadArquivo:
+    """Arquivo oferecido ao servidor; sobrevive às reconexões até ser enviado por completo."""
+
+    def __init__(self, caminho, sala):
+        self.id = novo_id()
+        self.caminho = caminho
+        self.nome = os.path.basename(caminho)
+        self.tamanho = os.path.getsize(caminho)
+        self.sala = sala
+        self.offset = 0
+        self.liberado = threading.Event()  # Servidor respondeu __UPLOAD_OK__ com o offset
+        self.cancelado = False
+
+    def oferta(self):
+        return montar_comando(COMANDO_UPLOAD, self.id, json.dumps(
+            {"nome": self.nome, "tamanho": self.tamanho, "sala": self.sala}, ensure_ascii=False))
+
+class EnvioPendente:
+    __slots__ = ("id", "frame", "texto", "reter", "pendente")
+
+    def __init__(self, id_envio, frame, texto, reter):
+        self.id = id_envio
+        self.frame = frame
+        self.texto = texto    # O que o usuário digitou (None: frame interno, sem status na janela)
+        self.reter = reter    # Reenviar depois de uma reconexão?
+        self.pendente = False
+
+
+class FilaDeEnvio:
+    """Frames a caminho do servidor, drenados pela thread de escrita do ChatClient.
+
+    Enquanto a conexão está caída (pausada) a fila só acumula, até max_bytes;
+    o que não chegou a ser escrito no socket volta para a frente da fila e sai,
+    na ordem, depois do handshake da reconexão.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or MAX_PENDENTES_BYTES
+        self._itens = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._ids = itertools.count(1)
+        self.bytes_enfileirados = 0
+        self.pausada = True  # Até a primeira conexão
+        self.fechada = False
+        self.conexao = 0     # Incrementado a cada retomar(): separa falhas de conexões antigas
+
+    def __len__(self):
+        return len(self._itens)
+
+    def put(self, frame, texto=None, reter=True):
+        """Enfileira sem bloquear. Retorna o EnvioPendente (pendente=True se está sem conexão)."""
+        with self._cond:
+            if self.fechada:
+                raise ConnectionError("Cliente desconectado.")
+            if self.bytes_enfileirados + len(frame) > self.max_bytes:
+                raise ConnectionError("Fila de envio cheia; aguarde a reconexão.")
+            item = EnvioPendente(next(self._ids), frame, texto, reter)
+            item.pendente = self.pausada
+            self._itens.append(item)
+            self.bytes_enfileirados += len(frame)
+            if len(self._itens) == 1:
+                self._cond.notify()
+        return item
+
+    def aguardar_lote(self):
+        """Bloqueia até haver itens e conexão. Retorna (itens, conexão) ou (None, conexão) quando fechada."""
+        with self._cond:
+            while (self.pausada or not self._itens) and not self.fechada:
+                self._cond.wait()
+            if self.fechada:
+                return None, self.conexao
+            lote = list(self._itens)
+            self._itens.clear()
+            self.bytes_enfileirados = 0
+            return lote, self.conexao
+
+    def devolver(self, itens, conexao):
+        """Envio falhou: os itens retidos voltam para a frente da fila.
+
+        A fila pausa até a reconexão, a menos que a falha seja de uma conexão
+        que já foi substituída (aí os itens saem logo pela nova).
+        """
+        retidos = [item for item in itens if item.reter]
+        with self._cond:
+            if self.fechada:
+                return retidos
+            if conexao == self.conexao:
+                self.pausada = True
+            else:
+                self._cond.notify()
+            self._itens.extendleft(reversed(retidos))
+            self.bytes_enfileirados += sum(len(item.frame) for item in retidos)
+        return retidos
+
+    def pausar(self):
+        with self._cond:
+            self.pausada = True
+
+    def retomar(self):
+        with self._cond:
+            self.pausada = False
+            self.conexao += 1
+            self._cond.notify_all()
+
+    def fechar(self):
+        """Fecha a fila e retorna os itens que não foram enviados."""
+        with self._cond:
+            self.fechada = True
+            restantes = list(self._itens)
+            self._itens.clear()
+            self.bytes_enfileirados = 0
+            self._cond.notify_all()
+        return restantes
+
+
 class ChatClient:
     @staticmethod
     def obter_gateway():
-        try:
-            result = subprocess.run(["ip", "route"], capture_output=True, text=True)
-            for line in result.stdout.splitlines():
-                if line.startswith("default"):
-                    partes = line.split()
-                    if "via" in partes:
-                        return partes[partes.index("via") + 1]
-        except Exception as e:
-            print(f"[ERRO] ao obter gateway: {e}")
-        return None
+        return obter_gateway()
 
     def __init__(self, host, port, chat_window=None, nome_usuario="Usuário"):
         self.host = host
@@ -56,6 +284,309 @@ class ChatClient:
         self.nome_usuario = nome_usuario
         self.worker = None
         self.thread = None
+        self.ultimo_seq = 0  # Maior seq de mensagem recebido; enviado ao reconectar
+        self.epoca = None    # Época da numeração do servidor (core/protocol.py:montar_marca)
+        self.sessao = None   # Segredo da sessão do nosso nome no servidor (mensagens diretas)
+        self.salas = [SALA_PADRAO]  # Salas inscritas; a última é a sala atual (refeitas ao reconectar)
+        # Frames de chat e blocos de arquivo dividem o socket: um frame inteiro por vez
+        self._envio_lock = threading.Lock()
+        # O que o usuário envia passa pela fila: a janela nunca bloqueia em um sendall
+        self.saida = FilaDeEnvio()
+        self.uploads = {}    # id → UploadArquivo em andamento
+        self.downloads = {}  # id → RecebimentoArquivo (None até o servidor responder)
+        self.diretorio_downloads = DIRETORIO_DOWNLOADS
+        self.codecs = CODECS_PADRAO  # Oferecidos no handshake ('' desativa a compressão)
+        self.compressor = None       # Codec aceito pelo servidor nesta conexão
+        self.ultima_atividade = time.monotonic()  # Último dado recebido do servidor
+        self.ping_pendente = False
+        self.rtt_ms = None           # Medido pelos pings ao servidor
+
+    def _handshake(self):
+        # Sempre presente: a resposta __SEQ__ traz a época que a próxima reconexão vai conferir
+        opcoes = {OPCAO_RESUME: montar_marca(self.ultimo_seq, self.epoca)}
+        if self.salas != [SALA_PADRAO]:
+            opcoes[OPCAO_SALAS] = ",".join(self.salas)
+        if codecs_de(self.codecs):
+            opcoes[OPCAO_COMPRESSAO] = ",".join(codecs_de(self.codecs))
+        if self.sessao:
+            opcoes[OPCAO_SESSAO] = self.sessao
+        opcoes[OPCAO_BATIMENTO] = 1  # Responde aos pings do servidor
+        self.ultima_atividade = time.monotonic()
+        self.ping_pendente = False
+        self.compressor = None  # Nova conexão: comprime só depois da resposta do servidor
+        return encode_texto(montar_handshake(self.nome_usuario, **opcoes), TIPO_CONTROLE)
+
+    def _enviar(self, frame):
+        with self._envio_lock:
+            if self.compressor is not None:
+                frame = self.compressor.comprimir(frame)
+            self.client_socket.sendall(frame)
+
+    def _enfileirar(self, frame, texto=None, reter=True):
+        """Enfileira para a thread de escrita. Retorna o id do envio."""
+        item = self.saida.put(frame, texto, reter)
+        if item.pendente:
+            self._atualizar_entrega(item, ENTREGA_PENDENTE)
+        return item.id
+
+    def _enviar_controle(self, texto, reter=True, exibir=None):
+        return self._enfileirar(encode_texto(texto, TIPO_CONTROLE), exibir, reter)
+
+    def _atualizar_entrega(self, item, estado):
+        if item.texto is not None and self.worker:
+            self.worker.entrega_atualizada.emit(item.id, estado, item.texto)
+
+    def _escrever(self):
+        """Thread de escrita: junta tudo o que está na fila em uma única chamada de sendmsg."""
+        while True:
+            lote, conexao = self.saida.aguardar_lote()
+            if lote is None:
+                break
+            erro = None
+            with self._envio_lock:
+                client_socket = self.client_socket
+                if self.compressor is not None:
+                    restantes = [self.compressor.comprimir(item.frame) for item in lote]
+                else:
+                    restantes = [item.frame for item in lote]
+                try:
+                    while restantes:
+                        restantes = enviar_vetorizado(client_socket, restantes)
+                except OSError as e:
+                    erro = e
+            enviados = len(lote) - len(restantes)
+            for item in lote[:enviados]:
+                self._atualizar_entrega(item, ENTREGA_ENVIADA)
+            if erro is None:
+                continue
+            # Um frame escrito pela metade é reenviado inteiro na nova conexão
+            for item in self.saida.devolver(lote[enviados:], conexao):
+                if not item.pendente:
+                    item.pendente = True
+                    self._atualizar_entrega(item, ENTREGA_PENDENTE)
+            print(f"Erro ao enviar ({erro}); {len(self.saida)} envio(s) aguardando a reconexão.")
+            try:
+                client_socket.shutdown(socket.SHUT_RDWR)  # A thread de escuta percebe e reconecta
+            except OSError:
+                pass
+
+    def _notificar(self, texto):
+        if self.worker:
+            self.worker.message_received.emit(texto)
+        else:
+            print(texto)
+
+    # --- Transferência de arquivos (core/transfer.py) ---
+
+    def enviar_arquivo(self, caminho, sala=None):
+        """Envia um arquivo para a sala (padrão: a sala atual) em segundo plano. Retorna o id."""
+        upload = UploadArquivo(caminho, sala or self.sala_atual)
+        self.uploads[upload.id] = upload
+        threading.Thread(target=self._executar_upload, args=(upload,), daemon=True).start()
+        self._enviar_controle(upload.oferta(), reter=False)  # Reoferecido por _retomar_transferencias
+        return upload.id
+
+    def _executar_upload(self, upload):
+        while not upload.cancelado:
+            if not upload.liberado.wait(1.0):
+                continue
+            upload.liberado.clear()
+            envios = EnviosDeArquivo()
+            try:
+                envio = EnvioArquivo(upload.id, upload.caminho, upload.offset)
+                if not envio.concluido:
+                    envios.adicionar(envio)
+                # Um bloco por vez com o socket reservado; as mensagens de chat entram entre os blocos
+                while envios and not upload.cancelado:
+                    with self._envio_lock:
+                        envios.enviar(self.client_socket, envios.tamanho_bloco)
+            except OSError as e:
+                envios.fechar()
+                if not self.worker or not self.worker._running:
+                    break
+                print(f"Envio de '{upload.nome}' interrompido ({e}); será retomado ao reconectar.")
+                continue
+            if not upload.cancelado:
+                self.uploads.pop(upload.id, None)
+                self._notificar(f"Arquivo '{upload.nome}' enviado ({formatar_tamanho(upload.tamanho)}).")
+            return
+
+    def baixar_arquivo(self, id_transferencia):
+        """Pede um arquivo ao servidor; retoma do arquivo '.parte' se houver um."""
+        self.downloads[id_transferencia] = None
+        self._pedir_download(id_transferencia)
+
+    def _pedir_download(self, id_transferencia):
+        offset = self._offset_download(id_transferencia)
+        self._enviar_controle(montar_comando(COMANDO_DOWNLOAD, id_transferencia, str(offset)), reter=False)
+
+    def _caminho_parcial(self, id_transferencia):
+        return os.path.join(self.diretorio_downloads, id_transferencia + EXTENSAO_PARCIAL)
+
+    def _offset_download(self, id_transferencia):
+        recebimento = self.downloads.get(id_transferencia)
+        if recebimento is not None:
+            return recebimento.recebidos
+        try:
+            return os.path.getsize(self._caminho_parcial(id_transferencia))
+        except OSError:
+            return 0
+
+    def _destino_livre(self, nome):
+        base, extensao = os.path.splitext(os.path.basename(nome) or "arquivo")
+        destino = os.path.join(self.diretorio_downloads, base + extensao)
+        contador = 1
+        while os.path.exists(destino):
+            destino = os.path.join(self.diretorio_downloads, f"{base} ({contador}){extensao}")
+            contador += 1
+        return destino
+
+    def _tratar_resposta(self, texto):
+        """Respostas do servidor às transferências. Retorna o texto a exibir (ou None)."""
+        comando, id_transferencia, corpo = parse_comando(texto, RESPOSTAS_ARQUIVO)
+        if comando == RESPOSTA_UPLOAD and id_transferencia in self.uploads:
+            upload = self.uploads[id_transferencia]
+            upload.offset = int(corpo or 0)
+            upload.liberado.set()
+            if upload.offset:
+                return f"Retomando o envio de '{upload.nome}' a partir de {formatar_tamanho(upload.offset)}."
+            return f"Enviando '{upload.nome}' ({formatar_tamanho(upload.tamanho)})..."
+        if comando == RESPOSTA_ARQUIVO and id_transferencia in self.downloads:
+            dados = json.loads(corpo)
+            anterior = self.downloads.get(id_transferencia)
+            if anterior is not None:
+                anterior.fechar()
+            os.makedirs(self.diretorio_downloads, exist_ok=True)
+            recebimento = RecebimentoArquivo(id_transferencia, self._caminho_parcial(id_transferencia),
+                                             self._destino_livre(dados["nome"]), dados["tamanho"], dados["nome"])
+            self.downloads[id_transferencia] = recebimento
+            if recebimento.concluido:
+                recebimento.finalizar()
+                del self.downloads[id_transferencia]
+                return f"Arquivo '{recebimento.nome}' salvo em {recebimento.destino}."
+            return f"Baixando '{recebimento.nome}' ({formatar_tamanho(recebimento.tamanho)})..."
+        if comando == RESPOSTA_ERRO_ARQUIVO:
+            upload = self.uploads.pop(id_transferencia, None)
+            if upload:
+                upload.cancelado = True
+                upload.liberado.set()
+            recebimento = self.downloads.pop(id_transferencia, None)
+            if recebimento:
+                recebimento.fechar()
+            return f"Erro na transferência {id_transferencia}: {corpo}"
+        return None
+
+    def _receber_bloco(self, payload):
+        id_transferencia, offset, dados = decode_bloco(payload)
+        recebimento = self.downloads.get(id_transferencia)
+        if recebimento is None or not recebimento.escrever(offset, dados):
+            return None
+        del self.downloads[id_transferencia]
+        return f"Arquivo '{recebimento.nome}' salvo em {recebimento.destino}."
+
+    def _retomar_transferencias(self):
+        """Depois de uma reconexão: reoferece os uploads e repete os pedidos de download."""
+        for upload in list(self.uploads.values()):
+            self._enviar_controle(upload.oferta(), reter=False)
+        for id_transferencia in list(self.downloads):
+            self._pedir_download(id_transferencia)
+
+    @property
+    def sala_atual(self):
+        return self.salas[-1] if self.salas else None
+
+    def entrar_sala(self, sala):
+        """Entra na sala (que passa a ser a sala atual das mensagens enviadas)."""
+        if not nome_de_sala_valido(sala):
+            raise ValueError(f"Nome de sala inválido: '{sala}'")
+        self._enviar_controle(montar_comando(COMANDO_ENTRAR, sala))
+        if sala in self.salas:
+            self.salas.remove(sala)
+        self.salas.append(sala)
+
+    def sair_sala(self, sala):
+        self._enviar_controle(montar_comando(COMANDO_SAIR, sala))
+        if sala in self.salas:
+            self.salas.remove(sala)
+            # O servidor volta para a sala padrão quando o cliente sai da sala atual
+            if SALA_PADRAO in self.salas:
+                self.salas.remove(SALA_PADRAO)
+                self.salas.append(SALA_PADRAO)
+
+    def enviar_para_sala(self, sala, texto):
+        return self._enviar_controle(montar_comando(COMANDO_SALA, sala, texto), exibir=texto)
+
+    def enviar_dm(self, usuario, texto):
+        return self._enviar_controle(montar_comando(COMANDO_DM, usuario, texto), exibir=texto)
+
+    def executar_comando(self, linha):
+        """Interpreta os comandos digitados no chat. Retorna o texto a exibir ao usuário.
+
+        /entrar <sala>, /sair <sala>, /sala <sala> <texto>, /dm <usuário> <texto>, /salas,
+        /arquivo <caminho>, /baixar <id>
+        """
+        partes = linha.split(maxsplit=2)
+        comando = partes[0].lower()
+        try:
+            if comando == "/entrar" and len(partes) == 2:
+                self.entrar_sala(partes[1])
+                return f"Entrando na sala '{partes[1]}'..."
+            if comando == "/sair" and len(partes) == 2:
+                self.sair_sala(partes[1])
+                return f"Saindo da sala '{partes[1]}'..."
+            if comando == "/sala" and len(partes) == 3:
+                self.enviar_para_sala(partes[1], partes[2])
+                return f"Você [{partes[1]}]: {partes[2]}"
+            if comando == "/dm" and len(partes) == 3:
+                self.enviar_dm(partes[1], partes[2])
+                return f"Você [DM para {partes[1]}]: {partes[2]}"
+            if comando == "/salas":
+                return f"Salas: {', '.join(self.salas) or 'nenhuma'} (atual: {self.sala_atual or 'nenhuma'})"
+            if comando == "/arquivo" and len(partes) >= 2:
+                caminho = os.path.expanduser(linha.split(maxsplit=1)[1].strip())
+                self.enviar_arquivo(caminho)
+                return f"Oferecendo '{os.path.basename(caminho)}' na sala '{self.sala_atual}'..."
+            if comando == "/baixar" and len(partes) == 2:
+                self.baixar_arquivo(partes[1])
+                return f"Pedindo o arquivo {partes[1]}..."
+        except (OSError, ValueError) as e:
+            return f"Erro: {e}"
+        return ("Comandos: /entrar <sala>, /sair <sala>, /sala <sala> <texto>, /dm <usuário> <texto>, /salas, "
+                "/arquivo <caminho>, /baixar <id>")
+
+    def _abrir_conexao(self):
+        """Abre um novo socket e refaz o handshake (usado nas reconexões)."""
+        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            client_socket.settimeout(TIMEOUT_CONEXAO)
+            client_socket.connect((self.host, self.port))
+            client_socket.settimeout(None)
+            configurar_keepalive(client_socket)
+            client_socket.sendall(self._handshake())
+        except OSError:
+            client_socket.close()
+            raise
+        return client_socket
+
+    def reconectar(self, parado: threading.Event) -> bool:
+        """Tenta reconectar até conseguir ou até `parado` ser sinalizado.
+
+        A espera dobra a cada falha e é sorteada dentro do intervalo, para que
+        vários clientes derrubados juntos não voltem todos ao mesmo tempo.
+        """
+        espera = RECONEXAO_ESPERA_INICIAL
+        while not parado.wait(random.uniform(espera / 2, espera)):
+            try:
+                novo_socket = self._abrir_conexao()
+            except OSError as e:
+                print(f"Falha ao reconectar: {e}")
+                espera = min(espera * 2, RECONEXAO_ESPERA_MAXIMA)
+                continue
+            antigo, self.client_socket = self.client_socket, novo_socket
+            antigo.close()
+            print(f"Reconectado ao servidor em {self.host}:{self.port} (último seq: {self.ultimo_seq})")
+            return True
+        return False
 
     def connect(self):
         if not self.host:
@@ -64,33 +595,37 @@ class ChatClient:
         
         try:
             self.client_socket.connect((self.host, self.port))
+            configurar_keepalive(self.client_socket)
             print(f"Conectado ao servidor em {self.host}:{self.port}")
             
-            self.client_socket.sendall(f"__USERNAME__:{self.nome_usuario}\n".encode())
+            self.client_socket.sendall(self._handshake())
             print(f"Nome de usuário '{self.nome_usuario}' enviado ao servidor.")            
                         
             # Configura worker e thread
-            self.worker = ChatClientWorker(self.client_socket)
+            self.worker = ChatClientWorker(self)
             self.thread = threading.Thread(target=self.worker.listen_for_messages, daemon=True)
             
             # Conecta sinais
             if self.chat_window:
-                self.worker.message_received.connect(self.chat_window.add_message_to_chat)
-                self.worker.connection_error.connect(self.chat_window.add_message_to_chat)
+                # Conexão direta: a janela só acumula a mensagem, sem um evento Qt por mensagem
+                self.worker.message_received.connect(self.chat_window.add_message_to_chat, Qt.DirectConnection)
+                self.worker.connection_error.connect(self.chat_window.add_message_to_chat, Qt.DirectConnection)
+                self.worker.entrega_atualizada.connect(self.chat_window.atualizar_entrega, Qt.DirectConnection)
             
             self.thread.start()
+            threading.Thread(target=self._escrever, name="chat-escrita", daemon=True).start()
+            self.saida.retomar()
+            threading.Thread(target=self.worker.vigiar_conexao, name="chat-batimentos", daemon=True).start()
         except Exception as e:
             print(f"Erro ao conectar: {e}")
             if self.chat_window:
                 self.chat_window.add_message_to_chat(f"Erro ao conectar: {e}")
 
     def send_message(self, message):
+        """Enfileira a mensagem e retorna o id do envio; o estado chega por worker.entrega_atualizada."""
         try:
-            if not self.client_socket:
-                raise Exception("Socket não inicializado")
-            
-            # Adiciona quebra de linha para facilitar a leitura no servidor
-            self.client_socket.sendall((message + "\n").encode())
+            # Cada mensagem vai em um frame próprio (ver core/framing.py)
+            return self._enfileirar(encode_texto(message), message)
         except Exception as e:
             print(f"Erro ao enviar mensagem: {e}")
             if self.chat_window:
@@ -98,6 +633,13 @@ class ChatClient:
             raise  # Re-lança a exceção para ser tratada pelo chamador
 
     def disconnect(self):
+        for item in self.saida.fechar():
+            self._atualizar_entrega(item, ENTREGA_DESCARTADA)
+        for upload in self.uploads.values():
+            upload.cancelado = True
+        for recebimento in self.downloads.values():
+            if recebimento is not None:
+                recebimento.fechar()  # O '.parte' fica para uma próxima tentativa
         if self.worker:
             self.worker.stop()
         if self.client_socket:
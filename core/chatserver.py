@@ -1,119 +1,259 @@
+import os
 import socket
 import threading
 import time
-from PySide6.QtCore import QObject, Signal, Slot
-from core.globals import clientes_lock, handlers
+from core.globals import handlers, historico
+from core.rooms import (
+    inscrever_cliente, publicar_mensagem, publicar_na_sala, remover_cliente, salas, sessoes_dm, tratar_comando,
+)
+from core.events import EVENTO_MENSAGEM, EVENTO_STATUS, eventos_servidor
+from core.framing import FrameDecoder, TIPO_BLOCO, TIPO_CONTROLE, TIPO_PING, TIPO_PONG, encode_texto
+from core.protocol import COMANDOS_ARQUIVO, OPCAO_BATIMENTO, SALA_PADRAO, parse_comando, parse_handshake
+from core.outbound import OutboundQueue, enviar_vetorizado
+from core.messagelog import MessageLog
+from core.metrics import expor_metricas, metricas
+from core.federation import ID_HOST, iniciar_federacao
+from core.discovery import iniciar_anuncio
+from core.compression import negociar as negociar_compressao
+from core.heartbeat import MonitorBatimentos, configurar_keepalive, responder_ping
+from core.ratelimit import LimitadorDeConexao, avisar_descarte
+from core.transfer import EnviosDeArquivo, encerrar_transferencias, receber_bloco, tratar_comando_arquivo
+from core import logs
 
 # Porta do servidor de chat
 CHAT_SERVER_PORT = 20557
 
-class ClientHandler(QObject):
-    # Sinais para comunicar com a GUI do host
-    new_message_for_host = Signal(str)  # Mensagens recebidas de clientes
-    client_status_for_host = Signal(str)  # Status de conexão/desconexão de clientes
+# Modos de execução do servidor de chat
+MODO_THREADS = "threads"  # Legado: uma thread por cliente
+MODO_EVENTOS = "eventos"  # Laço(s) de eventos com selectors (core/eventserver.py)
+MODO_PROCESSOS = "processos"  # Vários processos na mesma porta com SO_REUSEPORT (core/workers.py)
+MODO_SERVIDOR = os.environ.get("P2P_CHAT_MODO_SERVIDOR", MODO_THREADS)
+NUM_LOOPS = int(os.environ.get("P2P_CHAT_NUM_LOOPS", "1"))
+LOG_ATIVADO = os.environ.get("P2P_CHAT_LOG", "0") == "1"  # Opcional: grava as mensagens em disco (core/messagelog.py)
 
-    def __init__(self, client_socket, addr):
-        super().__init__()
+# Métricas compartilhadas pelos dois modos (o registro devolve a mesma instância por nome)
+_conexoes_aceitas = metricas.contador("servidor.conexoes_aceitas")
+_handshakes = metricas.contador("servidor.handshakes")
+_desconexoes = metricas.contador("servidor.desconexoes")
+_erros_envio = metricas.contador("servidor.erros_envio")
+_bytes_recebidos = metricas.contador("entrada.bytes")
+_mensagens_recebidas = metricas.contador("entrada.mensagens")
+_amostra_mensagens = logs.Amostrador()  # Log das mensagens recebidas (nível debug)
+
+metricas.medidor("servidor.clientes", lambda: len(handlers))
+metricas.medidor("saida.bytes_pendentes",
+                 lambda: sum(h.fila_saida.bytes_enfileirados for h in handlers.snapshot()))
+metricas.medidor("saida.maior_fila_bytes",
+                 lambda: max((h.fila_saida.bytes_enfileirados for h in handlers.snapshot()), default=0))
+metricas.medidor("historico.ultimo_seq", lambda: historico.ultimo_seq)
+metricas.medidor("historico.mensagens", lambda: len(historico))
+
+class ClientHandler:
+    def __init__(self, client_socket, addr, eventos=None, batimentos=None):
+        # Eventos para quem acompanha o servidor (ex.: a janela de chat do host)
+        self.eventos = eventos or eventos_servidor
         self.client_socket = client_socket
         self.addr = addr
         self.username = f"[{addr[0]}]"  # Nome padrão: IP
         self._running = True
-        # Configura timeout para evitar bloqueios
-        self.client_socket.settimeout(1.0)
+        self._identificado = False
+        self.salas = set()      # Salas em que o cliente está inscrito (core/rooms.py)
+        self.dono_dm = False    # Provou ser o dono do nome e recebe as mensagens diretas dele
+        self.sala_atual = None  # Destino das mensagens de texto sem sala explícita
+        self.decoder = FrameDecoder()
+        # Fila de saída própria, drenada pela thread de escrita deste cliente
+        self.fila_saida = OutboundQueue(ao_despejar=self._despejar)
+        self.envios = EnviosDeArquivo()  # Downloads em andamento, intercalados com as mensagens
+        self.recebimentos = {}           # Uploads em andamento: id → RecebimentoArquivo
+        self.compressor = None           # Codec negociado no handshake (core/compression.py)
+        self.batimentos = batimentos     # Expira a conexão se ela ficar muda (core/heartbeat.py)
+        self.ultima_atividade = time.monotonic()
+        self.limitador = LimitadorDeConexao(addr[0])  # Taxa deste cliente e do IP dele (core/ratelimit.py)
+        # Sem timeout: a leitura bloqueia até chegar dados e stop() a interrompe com shutdown
+        self.client_socket.settimeout(None)
 
     def stop(self):
         self._running = False
+        self.fila_saida.fechar()
+        try:
+            self.client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
 
-    @Slot()
-    def run(self):
-        """Lida com a comunicação de um cliente individual."""
-        with clientes_lock:
-            handlers.append(self)
-            print(f"[Servidor] Novo cliente conectado: {self.addr}")
-            self.client_status_for_host.emit(f"[Servidor] Cliente conectado: {self.addr}")
+    def _despejar(self):
+        """Desconecta um consumidor lento cuja fila de saída estourou o limite."""
+        logs.aviso(f"[Servidor] Cliente {self.username} ({self.addr}) lento demais, desconectando "
+              f"({self.fila_saida.bytes_enfileirados} bytes pendentes)")
+        self.eventos.emit(EVENTO_MENSAGEM, f"[Servidor] Cliente '{self.username}' desconectado por lentidão.")
+        self.stop()
 
-        try:
-            # --- INÍCIO DAS NOVAS MODIFICAÇÕES ---
-            # Primeira mensagem esperada é o nome de usuário
+    def _escrever(self):
+        """Drena a fila de saída deste cliente (thread de escrita própria).
+
+        Blocos de arquivo só saem com a fila vazia, um por vez, para não atrasar as mensagens.
+        """
+        while True:
             try:
-                initial_message_bytes = self.client_socket.recv(1024)
-                if initial_message_bytes:
-                    initial_message = initial_message_bytes.decode('utf-8').strip()
-                    if initial_message.startswith("__USERNAME__:"):
-                        self.username = initial_message.split(":", 1)[1]
-                        print(f"[Servidor] Cliente {self.addr} identificado como: {self.username}")
-                        self.client_status_for_host.emit(f"[Servidor] Cliente '{self.username}' ({self.addr}) conectado.")
-                    else:
-                        print(f"[Servidor] Primeira mensagem inesperada de {self.addr}: {initial_message}")
-                        self.new_message_for_host.emit(f"[Servidor] Mensagem inesperada de {self.addr}: {initial_message}")
-                else:
-                    print(f"[Servidor] Cliente {self.addr} desconectou antes de enviar o nome.")
-                    return # Sai da função se não houver nome
-            except socket.timeout:
-                print(f"[Servidor] Timeout ao esperar nome de usuário de {self.addr}. Usando IP.")
+                if self.envios and not len(self.fila_saida):
+                    self.envios.enviar(self.client_socket, self.envios.tamanho_bloco)
+                    continue
+                lote = self.fila_saida.aguardar_lote()
+                if not lote:
+                    break  # Fila fechada
+                # Escrita vetorizada: os frames compartilhados do broadcast não são copiados
+                while lote:
+                    lote = enviar_vetorizado(self.client_socket, lote)
             except Exception as e:
-                print(f"[Servidor] Erro ao receber nome de usuário de {self.addr}: {e}. Usando IP.")
-            # --- FIM DAS NOVAS MODIFICAÇÕES ---
+                if self._running:
+                    _erros_envio.incrementar()
+                    logs.erro(f"[Servidor] Erro ao enviar para {self.username} ({self.addr}): {e}")
+                self.stop()
+                break
+
+    def enviar_frame(self, frame: bytes) -> bool:
+        """Enfileira um frame já serializado; não bloqueia o chamador."""
+        if not self._running:
+            return False
+        if self.compressor is not None:
+            return self.compressor.enfileirar(self.fila_saida, frame, self._despejar)
+        return self.fila_saida.put(frame)
 
+    def run(self):
+        """Lida com a comunicação de um cliente individual."""
+        logs.info(f"[Servidor] Novo cliente conectado: {self.addr}")
+        self.eventos.emit(EVENTO_STATUS, f"[Servidor] Cliente conectado: {self.addr}")
+
+        threading.Thread(target=self._escrever, daemon=True).start()
+        if self.batimentos is not None:
+            self.batimentos.acompanhar(self)
+
+        try:
             while self._running:
                 try:
-                    # Recebe a mensagem do cliente
-                    mensagem_bytes = self.client_socket.recv(1024)
-                    if not mensagem_bytes:
-                        print(f"[Servidor] Cliente {self.username} ({self.addr}) desconectou")
+                    # Lê direto no buffer do decodificador; um recv pode trazer vários frames
+                    recebidos = self.decoder.recv_into(self.client_socket)
+                    if not recebidos:
+                        if self._identificado:
+                            logs.info(f"[Servidor] Cliente {self.username} ({self.addr}) desconectou")
+                        else:
+                            logs.info(f"[Servidor] Cliente {self.addr} desconectou antes de enviar o nome.")
                         break
-                    
-                    mensagem = mensagem_bytes.decode('utf-8').strip()
-                    print(f"[Servidor] Mensagem recebida de {self.username} ({self.addr}): {mensagem}")
-                    
-                    # Exibe a mensagem no chat do host usando o nome
-                    self.new_message_for_host.emit(f"{self.username}: {mensagem}")
-                    
-                    # Retransmite a mensagem para outros clientes usando o nome
-                    self.broadcast_message(f"{self.username}: {mensagem}", self.client_socket)
+                    _bytes_recebidos.incrementar(recebidos)
+                    self.ultima_atividade = time.monotonic()
+
+                    self._consumir_frames()
 
                 except socket.timeout:
                     continue  # Timeout normal, continua o loop
                 except Exception as e:
                     if self._running:
-                        print(f"[Servidor] Erro com cliente {self.username} ({self.addr}): {e}")
-                        self.new_message_for_host.emit(f"[Servidor] Erro com cliente {self.username} ({self.addr}): {e}")
+                        logs.erro(f"[Servidor] Erro com cliente {self.username} ({self.addr}): {e}")
+                        self.eventos.emit(EVENTO_MENSAGEM, f"[Servidor] Erro com cliente {self.username} ({self.addr}): {e}")
                     break
 
         finally:
-            with clientes_lock:
-                if self in handlers:
-                    handlers.remove(self)
-                    print(f"[Servidor] Handler removido para {self.username} ({self.addr})")
+            _desconexoes.incrementar()
+            if self.batimentos is not None:
+                self.batimentos.esquecer(self)
+            self.limitador.encerrar()
+            if remover_cliente(self):
+                logs.debug(f"[Servidor] Handler removido para {self.username} ({self.addr})")
             
+            self.stop()
+            encerrar_transferencias(self)
             self.client_socket.close()
-            self.client_status_for_host.emit(f"[Servidor] Cliente '{self.username}' desconectado.")
-            print(f"[Servidor] Conexão encerrada com {self.username} ({self.addr})")
+            self.eventos.emit(EVENTO_STATUS, f"[Servidor] Cliente '{self.username}' desconectado.")
+            logs.info(f"[Servidor] Conexão encerrada com {self.username} ({self.addr})")
+
+    def _consumir_frames(self):
+        """Trata os frames recebidos; acima da taxa dorme até pagar o débito antes de seguir.
+
+        Enquanto a thread dorme ninguém lê o socket e o TCP segura o remetente.
+        """
+        while self._running:
+            for tipo, payload in self.decoder.frames():
+                self._processar_frame(tipo, payload)
+                if self.limitador.em_debito():
+                    break
+            else:
+                return
+            atraso = self.limitador.atraso_leitura()
+            if atraso:
+                time.sleep(atraso)
+
+    def _processar_frame(self, tipo, payload):
+        """Trata um frame completo recebido do cliente."""
+        if tipo == TIPO_PING:
+            responder_ping(self, payload)
+            return
+        if tipo == TIPO_PONG:
+            return  # A chegada já renovou ultima_atividade
+        if tipo == TIPO_BLOCO:
+            exibir = receber_bloco(self, payload) if self._identificado else None
+            if exibir:
+                self.eventos.emit(EVENTO_MENSAGEM, exibir)
+            return
+
+        mensagem = payload.decode('utf-8', errors='replace').strip()
+
+        if tipo == TIPO_CONTROLE:
+            nome_usuario, opcoes = parse_handshake(mensagem)
+            comando, argumento, corpo = parse_comando(mensagem)
+            if nome_usuario is not None and not self._identificado:
+                self._identificado = True
+                _handshakes.incrementar()
+                self.username = nome_usuario or self.username
+                logs.info(f"[Servidor] Cliente {self.addr} identificado como: {self.username}")
+                self.eventos.emit(EVENTO_STATUS, f"[Servidor] Cliente '{self.username}' ({self.addr}) conectado.")
+                negociar_compressao(self, opcoes)
+                if self.batimentos is not None:
+                    self.batimentos.apos_handshake(self, OPCAO_BATIMENTO in opcoes)
+                # Passa a receber o broadcast e recebe o histórico recente em uma única escrita;
+                # numa reconexão o cliente informa o último seq recebido e só recebe o que perdeu
+                reenviadas = inscrever_cliente(self, opcoes)
+                if reenviadas:
+                    logs.info(f"[Servidor] {reenviadas} mensagens do histórico reenviadas para {self.username}")
+            elif comando in COMANDOS_ARQUIVO and self._identificado:
+                exibir = tratar_comando_arquivo(self, comando, argumento, corpo)
+                if exibir:
+                    self.eventos.emit(EVENTO_MENSAGEM, exibir)
+            elif comando and self._identificado:
+                if not self.limitador.admitir(len(payload)):
+                    avisar_descarte(self)
+                    return
+                exibir = tratar_comando(self, comando, argumento, corpo)
+                if exibir:
+                    _mensagens_recebidas.incrementar()
+                    self.eventos.emit(EVENTO_MENSAGEM, exibir)
+            else:
+                logs.aviso(f"[Servidor] Comando inesperado de {self.addr}: {mensagem}")
+                self.eventos.emit(EVENTO_MENSAGEM, f"[Servidor] Mensagem inesperada de {self.addr}: {mensagem}")
+            return
+
+        if not mensagem:
+            return
+        if not self.limitador.admitir(len(payload)):
+            avisar_descarte(self)
+            return
+        _mensagens_recebidas.incrementar()
+        logs.log_amostrado(_amostra_mensagens, logs.DEBUG,
+                           lambda: f"[Servidor] Mensagem recebida de {self.username} ({self.addr}): {mensagem}")
+
+        # Retransmite aos inscritos da sala atual do cliente e exibe no chat do host
+        exibir = publicar_mensagem(self, mensagem)
+        if exibir:
+            self.eventos.emit(EVENTO_MENSAGEM, exibir)
 
     def send_to_client(self, message: str):
         """Envia uma mensagem para este cliente específico"""
-        try:
-            if self._running:
-                self.client_socket.sendall(message.encode('utf-8'))
-        except Exception as e:
-            print(f"[Servidor] Erro ao enviar para {self.username} ({self.addr}): {e}")
-
-    def broadcast_message(self, message: str, sender_socket=None):
-        """Envia mensagem para todos os clientes, exceto o remetente"""
-        message_bytes = message.encode('utf-8')
-        
-        with clientes_lock:
-            current_handlers = handlers.copy()
-        
-        for handler in current_handlers:
-            # --- MODIFICAÇÃO AQUI: Não enviar para o próprio remetente ---
-            if handler.client_socket != sender_socket and handler._running:
-                try:
-                    handler.client_socket.sendall(message_bytes)
-                except Exception as e:
-                    print(f"[Servidor] Erro no broadcast para {handler.username} ({handler.addr}): {e}")
+        self.enviar_frame(encode_texto(message))
+
+    def broadcast_message(self, message: str, remetente=None, nome_remetente="", sala=SALA_PADRAO):
+        """Envia mensagem para todos os inscritos da sala, exceto o remetente"""
+        # Serializa o frame uma única vez; todos os destinatários compartilham os mesmos bytes
+        publicar_na_sala(message, sala, remetente, nome_remetente)
 
-def broadcast_from_host(message: str, chat_window_instance):
+def broadcast_from_host(message: str, chat_window_instance=None):
     """Envia mensagem do host para todos os clientes conectados"""
     if not message:
         return
@@ -122,66 +262,177 @@ def broadcast_from_host(message: str, chat_window_instance):
         chat_window_instance.add_message_to_chat(f"Você (Host): {message}")
     
     message_with_prefix = f"[Host] {message}"
-    print(f"[Servidor] Broadcast do host: {message_with_prefix}")
+    logs.debug(f"[Servidor] Broadcast do host: {message_with_prefix}")
     
-    with clientes_lock:
-        current_handlers = handlers.copy()
-    
-    for handler in current_handlers:
-        try:
-            if handler._running:
-                handler.send_to_client(message_with_prefix)
-        except Exception as e:
-            print(f"[Servidor] Erro no broadcast para {handler.addr}: {e}")
-
-def start_server(chat_window_instance):
-    """Inicia o servidor de chat."""
-    print("[Servidor] Iniciando servidor de chat...")
+    publicar_na_sala(message_with_prefix, SALA_PADRAO, nome_remetente="Host")
+
+def _abrir_log():
+    """Abre o log persistente (uma vez por processo) e retoma a numeração a partir dele."""
+    if historico.log or not LOG_ATIVADO:
+        return
+    try:
+        log = MessageLog()
+        historico.carregar_log(log)
+        metricas.medidor("log.pendentes", lambda: log.registros_enfileirados - log.registros_gravados)
+        logs.info(f"[Servidor] Log de mensagens em {log.diretorio} (último seq: {log.ultimo_seq})")
+    except OSError as e:
+        logs.aviso(f"[Servidor] Log de mensagens desativado: {e}")
+
+_hub = None  # WorkerHub ativo no modo 'processos'
+
+def carga_atual():
+    """Clientes conectados a este host, anunciados na descoberta.
+
+    No modo 'processos' os clientes estão nos workers; o hub soma o que cada um informa.
+    """
+    return _hub.carga() if _hub is not None else len(handlers)
+
+def assinar_janela(chat_window_instance, eventos=None):
+    """Inscreve a janela de chat do host nos eventos do servidor.
+
+    add_message_to_chat só acumula a mensagem (pode ser chamada de qualquer
+    thread), então não há um evento Qt por mensagem.
+    """
+    eventos = eventos or eventos_servidor
+    eventos.subscribe(EVENTO_MENSAGEM, chat_window_instance.add_message_to_chat)
+    eventos.subscribe(EVENTO_STATUS, chat_window_instance.add_message_to_chat)
+
+def start_server(chat_window_instance=None, modo=None, num_loops=None, host='0.0.0.0', port=CHAT_SERVER_PORT,
+                 num_processos=None, pronto=None):
+    """Inicia o servidor de chat.
+
+    `modo` escolhe entre MODO_THREADS (legado), MODO_EVENTOS e MODO_PROCESSOS
+    (`num_processos` workers, padrão P2P_CHAT_NUM_PROCESSOS ou o número de CPUs);
+    quando omitido usa a variável de ambiente P2P_CHAT_MODO_SERVIDOR. Sem janela (modo headless)
+    os eventos podem ser acompanhados via core.events.eventos_servidor.
+    `host` e `port` só mudam em testes e benchmarks (ver benchmark.py).
+    Com P2P_CHAT_FEDERACAO_PORTA/P2P_CHAT_FEDERACAO_PARES o host também se liga
+    a outros hosts (core/federation.py). O host se anuncia por multicast para a
+    descoberta dos clientes (core/discovery.py; P2P_CHAT_DESCOBERTA=0 desativa).
+    `pronto` (threading.Event) é sinalizado quando o servidor já aceita conexões.
+    """
+    modo = modo or MODO_SERVIDOR
+    logs.info(f"[Servidor] Iniciando servidor de chat (modo: {modo})...")
     
     # Limpa handlers residuais
-    with clientes_lock:
-        handlers.clear()
+    handlers.clear()
+    salas.clear()
+    sessoes_dm.clear()
+    _abrir_log()
+    expor_metricas()
+    iniciar_federacao(host)
+    # Clientes na rede local acham este host sem supor que ele é o gateway (core/discovery.py)
+    iniciar_anuncio(port, carga=carga_atual, id_host=ID_HOST)
+    if chat_window_instance:
+        assinar_janela(chat_window_instance)
+
+    if modo == MODO_EVENTOS:
+        _start_event_server(chat_window_instance, num_loops or NUM_LOOPS, host, port, pronto)
+        return
+    if modo == MODO_PROCESSOS:
+        _start_process_server(chat_window_instance, num_processos, host, port, pronto)
+        return
     
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    
-    host = '0.0.0.0'
-    port = CHAT_SERVER_PORT
 
     try:
         server_socket.bind((host, port))
         server_socket.listen(5)
-        print(f"[Servidor] Servidor de chat escutando em {host}:{port}")
+        logs.info(f"[Servidor] Servidor de chat escutando em {host}:{port}")
+        if pronto:
+            pronto.set()
         
         if chat_window_instance:
             chat_window_instance.add_message_to_chat(f"Servidor de chat iniciado em {host}:{port}")
 
+        # Conexões mudas são encerradas com stop(); a thread de leitura remove o handler do registro
+        batimentos = MonitorBatimentos(ao_expirar=ClientHandler.stop)
+        batimentos.iniciar_thread()
+
         while True:
             try:
                 conn, addr = server_socket.accept()
-                print(f"[Servidor] Nova conexão de {addr}")
+                _conexoes_aceitas.incrementar()
+                logs.debug(f"[Servidor] Nova conexão de {addr}")
+                configurar_keepalive(conn)
                 
                 # Cria handler para o novo cliente
-                handler = ClientHandler(conn, addr)
+                handler = ClientHandler(conn, addr, batimentos=batimentos)
                 
                 # Configura thread
                 thread = threading.Thread(target=handler.run, daemon=True)
                 
-                # Conecta sinais à interface
-                if chat_window_instance:
-                    handler.new_message_for_host.connect(chat_window_instance.add_message_to_chat)
-                    handler.client_status_for_host.connect(chat_window_instance.add_message_to_chat)
-                
                 thread.start()
                 
             except Exception as e:
-                print(f"[Servidor] Erro ao aceitar conexão: {e}")
+                logs.erro(f"[Servidor] Erro ao aceitar conexão: {e}")
 
     except Exception as e:
-        print(f"[Servidor] Erro fatal no servidor: {e}")
+        logs.erro(f"[Servidor] Erro fatal no servidor: {e}")
         if chat_window_instance:
             chat_window_instance.add_message_to_chat(f"Erro no servidor: {e}")
     finally:
         server_socket.close()
-        print("[Servidor] Servidor de chat encerrado.")
+        logs.info("[Servidor] Servidor de chat encerrado.")
+
+def _start_event_server(chat_window_instance, num_loops, host, port, pronto=None):
+    """Inicia o servidor de chat orientado a eventos (bloqueia a thread atual)."""
+    from core.eventserver import EventLoopChatServer
+
+    server = EventLoopChatServer(host, port, num_loops=num_loops)
+
+    try:
+        server.bind()
+        logs.info(f"[Servidor] Servidor de chat escutando em {host}:{port} ({num_loops} laço(s) de eventos)")
+        if pronto:
+            pronto.set()
+
+        if chat_window_instance:
+            chat_window_instance.add_message_to_chat(f"Servidor de chat iniciado em {host}:{port}")
+
+        server.serve_forever()
+    except Exception as e:
+        logs.erro(f"[Servidor] Erro fatal no servidor: {e}")
+        if chat_window_instance:
+            chat_window_instance.add_message_to_chat(f"Erro no servidor: {e}")
+    finally:
+        logs.info("[Servidor] Servidor de chat encerrado.")
+
+def _start_process_server(chat_window_instance, num_processos, host, port, pronto=None):
+    """Inicia os processos worker e atende o barramento entre eles (bloqueia a thread atual)."""
+    global _hub
+    from core.workers import WorkerHub
+
+    hub = _hub = WorkerHub(host, port, num_processos)
+    try:
+        if chat_window_instance:
+            chat_window_instance.add_message_to_chat(
+                f"Servidor de chat iniciado em {host}:{port} ({hub.num_processos} processos)")
+        hub.serve_forever(pronto)
+    except Exception as e:
+        logs.erro(f"[Servidor] Erro fatal no servidor: {e}")
+        if chat_window_instance:
+            chat_window_instance.add_message_to_chat(f"Erro no servidor: {e}")
+    finally:
+        _hub = None
+        logs.info("[Servidor] Servidor de chat encerrado.")
+
+def iniciar_em_segundo_plano(chat_window_instance=None, timeout=20.0, **kwargs):
+    """Inicia start_server em uma thread daemon e espera até ele aceitar conexões.
 
+    Levanta OSError se o servidor terminar (ex.: porta em uso) ou não ficar
+    pronto em `timeout` segundos. Usado no provisionamento do host
+    (core/hotspot.py), que sobe os servidores em paralelo com o rádio.
+    """
+    pronto = threading.Event()
+    thread = threading.Thread(target=start_server, args=(chat_window_instance,), kwargs={**kwargs, "pronto": pronto},
+                              name="chat-servidor", daemon=True)
+    thread.start()
+    prazo = time.monotonic() + timeout
+    while not pronto.wait(0.05):
+        if not thread.is_alive():
+            raise OSError("o servidor de chat encerrou durante a inicialização (veja o log)")
+        if time.monotonic() >= prazo:
+            raise OSError(f"o servidor de chat não ficou pronto em {timeout:.0f}s")
+    return thread
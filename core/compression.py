@@ -0,0 +1,219 @@
+# core/compression.py
+"""Compressão opcional dos frames, negociada no handshake.
+
+O cliente oferece os codecs que conhece na opção __COMPRESSAO__; o servidor
+escolhe, na sua própria ordem de preferência, o primeiro que o cliente também
+oferece e responde '__COMPRESSAO__:<codec>' com o escolhido. A partir daí,
+os dois lados podem mandar frames TIPO_COMPRIMIDO, cujo payload
+é um ou mais frames comuns comprimidos. Frames menores que o limiar do codec
+seguem sem compressão, então mensagens curtas não pagam a latência da
+compressão; blocos de arquivo (TIPO_BLOCO) nunca passam por aqui.
+
+Codecs:
+    zlib-dict    cada frame comprimido isoladamente (deflate cru) com o
+                 dicionário pré-definido abaixo, então até mensagens curtas
+                 encolhem. O resultado é compartilhado entre os clientes do
+                 broadcast, como o frame original. É o padrão: no servidor a
+                 compressão acontece dentro do broadcast e assim custa uma vez
+                 por mensagem, não uma por destinatário.
+    zlib         como zlib-dict, sem dicionário e só a partir de 256 bytes
+                 (mantido para clientes que não conhecem zlib-dict).
+    zlib-stream  um fluxo deflate por conexão com dicionário pré-definido e
+                 Z_SYNC_FLUSH a cada frame: as mensagens seguintes aproveitam
+                 o contexto das anteriores, o que rende mesmo em mensagens
+                 pequenas. Custa uma compressão por destinatário, feita fora
+                 do lock do histórico (no laço de cada conexão, no modo
+                 eventos), e ~48 KiB de estado por conexão; só é
+                 usado quando o servidor o coloca antes dos outros em
+                 P2P_CHAT_COMPRESSAO.
+"""
+import os
+import threading
+import zlib
+from core.framing import (
+    HEADER, TAMANHO_MAXIMO, TIPO_COMPRIMIDO, TIPO_CONTROLE, FrameError, encode_frame, encode_texto,
+)
+from core.metrics import metricas
+from core.protocol import OPCAO_COMPRESSAO, RESPOSTA_COMPRESSAO, montar_comando
+
+CODEC_ZLIB = "zlib"
+CODEC_ZLIB_DICIONARIO = "zlib-dict"
+CODEC_ZLIB_STREAM = "zlib-stream"
+
+# Codecs aceitos/oferecidos, em ordem de preferência ('' desativa a compressão)
+CODECS_PADRAO = os.environ.get("P2P_CHAT_COMPRESSAO", f"{CODEC_ZLIB_DICIONARIO},{CODEC_ZLIB},{CODEC_ZLIB_STREAM}")
+NIVEL = int(os.environ.get("P2P_CHAT_COMPRESSAO_NIVEL", 6))
+LIMIAR_ZLIB = int(os.environ.get("P2P_CHAT_COMPRESSAO_LIMIAR", 256))
+LIMIAR_DICIONARIO = int(os.environ.get("P2P_CHAT_COMPRESSAO_LIMIAR_DICT", 32))
+LIMIAR_STREAM = int(os.environ.get("P2P_CHAT_COMPRESSAO_LIMIAR_STREAM", 32))
+
+_JANELA_STREAM = 12  # 4 KiB de janela: limita o estado por conexão
+_MEMORIA_STREAM = 6
+_FIM_SYNC_FLUSH = b"\x00\x00\xff\xff"  # Marcador final de todo Z_SYNC_FLUSH (omitido no fio)
+
+# Trechos frequentes no chat; o deflate encontra melhor o que está no fim do dicionário
+DICIONARIO = (
+    "https:// http:// www. .com .br .pdf .jpg .png .zip ... :) :( kkkk haha rsrs "
+    "Para baixar: /baixar compartilhou o arquivo KiB MiB bytes "
+    "[Servidor] Você entrou na sala participante(s) Você saiu da sala Usuário não está conectado. "
+    "obrigado obrigada valeu beleza blz tudo bem tudo certo bom dia boa tarde boa noite olá oi "
+    "alguém sabe onde quando quem qual porque por que como também agora depois hoje amanhã "
+    "então aqui ali isso esse essa este esta está estou estão vamos vai vou tem tenho pode posso "
+    "muito mais menos mas com sem para pra por pelo pela uma um dos das nos nas que não sim "
+    "você vocês ele ela eles nós a o e é de do da em no na os as ao se "
+    "[Host] [DM] [geral] geral: "
+).encode("utf-8")
+
+_bytes_originais = metricas.contador("compressao.bytes_originais")
+_bytes_comprimidos = metricas.contador("compressao.bytes_comprimidos")
+_frames_comprimidos = metricas.contador("compressao.frames")
+
+
+def codecs_de(texto):
+    return [c.strip() for c in (texto or "").split(",") if c.strip() in CODECS]
+
+
+def escolher_codec(oferecidos, aceitos=None):
+    """Primeiro codec da lista do servidor que o cliente também oferece (ou None)."""
+    oferecidos = codecs_de(oferecidos)
+    return next((c for c in codecs_de(CODECS_PADRAO if aceitos is None else aceitos) if c in oferecidos), None)
+
+
+def _frames_internos(dados):
+    """Gera (tipo, payload) dos frames contidos no payload descomprimido."""
+    pos = 0
+    while pos < len(dados):
+        if len(dados) - pos < HEADER.size:
+            raise FrameError("Frame comprimido truncado")
+        tamanho, tipo = HEADER.unpack_from(dados, pos)
+        inicio = pos + HEADER.size
+        pos = inicio + tamanho
+        if pos > len(dados):
+            raise FrameError("Frame comprimido truncado")
+        yield tipo, dados[inicio:pos]
+
+
+def _descomprimir(descompressor, dados):
+    try:
+        resultado = descompressor.decompress(dados, TAMANHO_MAXIMO + HEADER.size)
+    except zlib.error as e:
+        raise FrameError(f"Frame comprimido inválido: {e}") from e
+    if descompressor.unconsumed_tail:
+        raise FrameError(f"Frame descomprimido excede o limite de {TAMANHO_MAXIMO} bytes")
+    return resultado
+
+
+class CompressorZlib:
+    """Cada frame comprimido isoladamente; sem estado entre frames."""
+    com_estado = False
+    _cache = (None, None)  # (último frame, resultado): o broadcast comprime uma vez para todos
+    _base = zlib.compressobj(NIVEL, zlib.DEFLATED, -zlib.MAX_WBITS)  # Copiado a cada frame
+    limiar_padrao = LIMIAR_ZLIB
+
+    def __init__(self, limiar=None):
+        self.limiar = self.limiar_padrao if limiar is None else limiar
+
+    def comprimir(self, frame):
+        if len(frame) < self.limiar:
+            return frame
+        classe = type(self)  # Cada codec tem o próprio cache: os resultados não são intercambiáveis
+        original, resultado = classe._cache
+        if original is frame:
+            return resultado
+        compressor = self._base.copy()
+        dados = compressor.compress(frame) + compressor.flush()
+        # Só vale a pena se ficou menor (ex.: textos já comprimidos não ficam)
+        resultado = encode_frame(dados, TIPO_COMPRIMIDO) if len(dados) + HEADER.size < len(frame) else frame
+        classe._cache = (frame, resultado)
+        _frames_comprimidos.incrementar()
+        _bytes_originais.incrementar(len(frame))
+        _bytes_comprimidos.incrementar(len(resultado))
+        return resultado
+
+    def enfileirar(self, fila, frame, ao_perder=None):
+        return fila.put(self.comprimir(frame))
+
+
+class DescompressorZlib:
+    _base = zlib.decompressobj(-zlib.MAX_WBITS)
+
+    def frames(self, payload):
+        return _frames_internos(_descomprimir(self._base.copy(), payload))
+
+
+class CompressorZlibDicionario(CompressorZlib):
+    """Como CompressorZlib, com o dicionário pré-carregado (copiar é mais barato que recarregá-lo)."""
+    _cache = (None, None)
+    _base = zlib.compressobj(NIVEL, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=DICIONARIO)
+    limiar_padrao = LIMIAR_DICIONARIO
+
+
+class DescompressorZlibDicionario(DescompressorZlib):
+    _base = zlib.decompressobj(-zlib.MAX_WBITS, zdict=DICIONARIO)
+
+
+class CompressorZlibStream:
+    """Fluxo deflate contínuo da conexão, com dicionário; cada frame termina em Z_SYNC_FLUSH."""
+    com_estado = True
+
+    def __init__(self, limiar=None):
+        self.limiar = LIMIAR_STREAM if limiar is None else limiar
+        self._compressor = zlib.compressobj(NIVEL, zlib.DEFLATED, -_JANELA_STREAM, _MEMORIA_STREAM,
+                                            zdict=DICIONARIO)
+        # Comprimir e enfileirar na mesma ordem: o outro lado descomprime na ordem de chegada
+        self.lock = threading.Lock()
+
+    def comprimir(self, frame):
+        """Chamar com self.lock (ou de uma única thread)."""
+        if len(frame) < self.limiar:
+            return frame
+        dados = self._compressor.compress(frame) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        resultado = encode_frame(dados[:-len(_FIM_SYNC_FLUSH)], TIPO_COMPRIMIDO)
+        _frames_comprimidos.incrementar()
+        _bytes_originais.incrementar(len(frame))
+        _bytes_comprimidos.incrementar(len(resultado))
+        return resultado
+
+    def enfileirar(self, fila, frame, ao_perder=None):
+        """Comprime e enfileira. Um frame descartado quebra o fluxo: ao_perder() encerra a conexão."""
+        with self.lock:
+            aceito = fila.put(self.comprimir(frame))
+        if not aceito and not fila.fechada and ao_perder is not None:
+            ao_perder()
+        return aceito
+
+
+class DescompressorZlibStream:
+    def __init__(self):
+        # Janela máxima: aceita qualquer janela que o outro lado tenha escolhido
+        self._descompressor = zlib.decompressobj(-zlib.MAX_WBITS, zdict=DICIONARIO)
+
+    def frames(self, payload):
+        return _frames_internos(_descomprimir(self._descompressor, payload + _FIM_SYNC_FLUSH))
+
+
+CODECS = {
+    CODEC_ZLIB: (CompressorZlib, DescompressorZlib),
+    CODEC_ZLIB_DICIONARIO: (CompressorZlibDicionario, DescompressorZlibDicionario),
+    CODEC_ZLIB_STREAM: (CompressorZlibStream, DescompressorZlibStream),
+}
+
+
+def criar_compressor(codec):
+    return CODECS[codec][0]()
+
+
+def criar_descompressor(codec):
+    return CODECS[codec][1]()
+
+
+def negociar(handler, opcoes):
+    """Lado do servidor, no handshake: escolhe o codec e avisa o cliente (antes do histórico)."""
+    codec = escolher_codec(opcoes.get(OPCAO_COMPRESSAO))
+    if codec is None:
+        return None
+    # A resposta ainda sai sem compressão; os frames seguintes já podem vir comprimidos
+    handler.enviar_frame(encode_texto(montar_comando(RESPOSTA_COMPRESSAO, codec), TIPO_CONTROLE))
+    handler.compressor = criar_compressor(codec)
+    handler.decoder.descompressor = criar_descompressor(codec)
+    return codec
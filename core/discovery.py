@@ -0,0 +1,195 @@
+# core/discovery.py
+"""Descoberta de hosts de chat na rede local por UDP multicast/broadcast.
+
+Quem entra num chat não precisa mais supor que o host é o gateway: o cliente
+manda uma procura ao grupo multicast (e em broadcast, para redes que não
+repassam multicast), junta as respostas que chegarem dentro de uma janela
+curta e escolhe o host menos carregado. Cada host também se anuncia ao grupo
+periodicamente, para quem só estiver escutando.
+
+Mensagens (JSON em um datagrama):
+    {"p2p-com": 1, "tipo": "procura"}
+    {"p2p-com": 1, "tipo": "anuncio", "id", "nome", "chat", "auth", "carga"}
+
+A resposta a uma procura vai direto (unicast) ao endereço de quem procurou;
+o IP do host é o endereço de origem do datagrama. Configuração:
+P2P_CHAT_DESCOBERTA (0 desativa o anúncio), P2P_CHAT_DESCOBERTA_GRUPO,
+P2P_CHAT_DESCOBERTA_PORTA e P2P_CHAT_NOME_HOST.
+"""
+import json
+import os
+import select
+import socket
+import struct
+import threading
+import time
+from core import logs
+
+DESCOBERTA_ATIVADA = os.environ.get("P2P_CHAT_DESCOBERTA", "1") == "1"
+GRUPO_DESCOBERTA = os.environ.get("P2P_CHAT_DESCOBERTA_GRUPO", "239.255.20.57")
+PORTA_DESCOBERTA = int(os.environ.get("P2P_CHAT_DESCOBERTA_PORTA", 20558))
+NOME_HOST = os.environ.get("P2P_CHAT_NOME_HOST") or socket.gethostname()
+INTERVALO_ANUNCIO = 5.0   # Segundos entre anúncios espontâneos
+JANELA_DESCOBERTA = 0.3   # Quanto o cliente espera por respostas
+PORTA_AUTH_PADRAO = 20556
+PORTA_CHAT_PADRAO = 20557
+
+VERSAO_DESCOBERTA = 1
+TIPO_PROCURA = "procura"
+TIPO_ANUNCIO = "anuncio"
+
+
+class HostAnunciado:
+    """Um host que respondeu à procura (ou o gateway, quando ninguém respondeu)."""
+    __slots__ = ("endereco", "porta_chat", "porta_auth", "nome", "carga", "id")
+
+    def __init__(self, endereco, porta_chat=PORTA_CHAT_PADRAO, porta_auth=PORTA_AUTH_PADRAO, nome=None,
+                 carga=0, id_host=None):
+        self.endereco = endereco
+        self.porta_chat = porta_chat
+        self.porta_auth = porta_auth
+        self.nome = nome or endereco
+        self.carga = carga
+        self.id = id_host or f"{endereco}:{porta_chat}"
+
+    def __repr__(self):
+        return f"{self.nome} ({self.endereco}:{self.porta_chat}, {self.carga} cliente(s))"
+
+    @classmethod
+    def de_anuncio(cls, dados, endereco):
+        return cls(endereco, int(dados["chat"]), int(dados.get("auth", PORTA_AUTH_PADRAO)), dados.get("nome"),
+                   int(dados.get("carga", 0)), dados.get("id"))
+
+
+def _encode(tipo, **campos):
+    return json.dumps({"p2p-com": VERSAO_DESCOBERTA, "tipo": tipo, **campos}).encode("utf-8")
+
+
+def _decode(datagrama):
+    """Retorna o dicionário da mensagem ou None se não for deste protocolo."""
+    try:
+        dados = json.loads(datagrama.decode("utf-8"))
+    except ValueError:
+        return None
+    if not isinstance(dados, dict) or dados.get("p2p-com") != VERSAO_DESCOBERTA:
+        return None
+    return dados
+
+
+def descobrir_hosts(janela=JANELA_DESCOBERTA, grupo=GRUPO_DESCOBERTA, porta=PORTA_DESCOBERTA):
+    """Procura hosts e retorna os que responderam dentro de `janela` segundos, na ordem de chegada."""
+    hosts = {}
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)  # Só a rede local
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.bind(("", 0))
+        procura = _encode(TIPO_PROCURA)
+        for destino in ((grupo, porta), ("255.255.255.255", porta)):
+            try:
+                sock.sendto(procura, destino)
+            except OSError as e:
+                logs.debug(f"[Descoberta] Procura para {destino[0]} falhou: {e}")
+
+        prazo = time.monotonic() + janela
+        while (restante := prazo - time.monotonic()) > 0:
+            if not select.select([sock], [], [], restante)[0]:
+                break
+            datagrama, (endereco, _) = sock.recvfrom(2048)
+            dados = _decode(datagrama)
+            if not dados or dados.get("tipo") != TIPO_ANUNCIO:
+                continue
+            try:
+                host = HostAnunciado.de_anuncio(dados, endereco)
+            except (KeyError, TypeError, ValueError):
+                continue
+            hosts.setdefault(host.id, host)  # Multicast e broadcast podem trazer a mesma resposta
+    return list(hosts.values())
+
+
+def ordenar_hosts(hosts):
+    """Menos carregados primeiro; no empate, o que respondeu primeiro (sort estável)."""
+    return sorted(hosts, key=lambda host: host.carga)
+
+
+class AnunciadorDeHost:
+    """Responde às procuras e se anuncia periodicamente no grupo (thread daemon)."""
+
+    def __init__(self, porta_chat, porta_auth=PORTA_AUTH_PADRAO, carga=None, id_host=None, nome=None,
+                 grupo=GRUPO_DESCOBERTA, porta=PORTA_DESCOBERTA):
+        self.porta_chat = porta_chat
+        self.porta_auth = porta_auth
+        self.carga = carga or (lambda: 0)  # Clientes conectados agora
+        self.id_host = id_host
+        self.nome = nome or NOME_HOST
+        self.grupo = grupo
+        self.porta = porta
+        self.sock = None
+        self._running = False
+
+    def _anuncio(self):
+        return _encode(TIPO_ANUNCIO, id=self.id_host, nome=self.nome, chat=self.porta_chat,
+                       auth=self.porta_auth, carga=self.carga())
+
+    def start(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            # Vários hosts na mesma máquina (testes, federação) dividem a porta
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, "SO_REUSEPORT"):
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            sock.bind(("", self.porta))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                            struct.pack("=4s4s", socket.inet_aton(self.grupo), socket.inet_aton("0.0.0.0")))
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+        self._running = True
+        threading.Thread(target=self._executar, name="descoberta", daemon=True).start()
+        logs.info(f"[Descoberta] Anunciando '{self.nome}' em {self.grupo}:{self.porta}")
+
+    def _executar(self):
+        proximo_anuncio = 0.0
+        while self._running:
+            agora = time.monotonic()
+            try:
+                if agora >= proximo_anuncio:
+                    proximo_anuncio = agora + INTERVALO_ANUNCIO
+                    self.sock.sendto(self._anuncio(), (self.grupo, self.porta))
+                if not select.select([self.sock], [], [], proximo_anuncio - agora)[0]:
+                    continue
+                datagrama, origem = self.sock.recvfrom(2048)
+                dados = _decode(datagrama)
+                if dados and dados.get("tipo") == TIPO_PROCURA:
+                    self.sock.sendto(self._anuncio(), origem)
+            except (OSError, ValueError) as e:
+                if not self._running:
+                    break  # stop() fechou o socket
+                logs.debug(f"[Descoberta] Erro: {e}")
+                time.sleep(1.0)  # Ex.: rede ainda sem rota multicast
+
+    def stop(self):
+        self._running = False
+        if self.sock:
+            self.sock.close()
+
+
+_anunciador = None
+_anunciador_lock = threading.Lock()
+
+
+def iniciar_anuncio(porta_chat, carga=None, id_host=None):
+    """Inicia (uma vez por processo) o anúncio deste host. Retorna None se desativado ou indisponível."""
+    global _anunciador
+    with _anunciador_lock:
+        if _anunciador is not None or not DESCOBERTA_ATIVADA:
+            return _anunciador
+        anunciador = AnunciadorDeHost(porta_chat, carga=carga, id_host=id_host)
+        try:
+            anunciador.start()
+        except OSError as e:
+            logs.aviso(f"[Descoberta] Anúncio desativado: {e}")
+            return None
+        _anunciador = anunciador
+        return anunciador
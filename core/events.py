@@ -0,0 +1,44 @@
+# core/events.py
+"""Barramento de eventos em Python puro usado pelos servidores.
+
+Substitui os Signals do Qt no lado do servidor: a janela de chat do host é só
+mais um assinante, e o servidor pode rodar sem PySide6 (ver headless.py).
+Os callbacks são chamados na thread de quem emite o evento.
+"""
+import threading
+
+EVENTO_MENSAGEM = "mensagem"  # Mensagens recebidas de clientes (texto a exibir no host)
+EVENTO_STATUS = "status"      # Conexão/desconexão de clientes
+
+
+class EventBus:
+    def __init__(self):
+        self._assinantes = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, evento, callback):
+        """Registra o callback (uma única vez) para o evento."""
+        with self._lock:
+            atuais = self._assinantes.get(evento, ())
+            if callback not in atuais:
+                # Tupla nova a cada alteração: emit() lê sem lock
+                self._assinantes[evento] = atuais + (callback,)
+
+    def unsubscribe(self, evento, callback):
+        with self._lock:
+            atuais = self._assinantes.get(evento, ())
+            self._assinantes[evento] = tuple(c for c in atuais if c != callback)
+
+    def tem_assinantes(self, evento):
+        return bool(self._assinantes.get(evento))
+
+    def emit(self, evento, *args):
+        for callback in self._assinantes.get(evento, ()):
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"[Eventos] Erro no assinante de '{evento}': {e}")
+
+
+# Barramento padrão dos servidores de chat deste processo
+eventos_servidor = EventBus()
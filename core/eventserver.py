@@ -0,0 +1,495 @@
+import heapq
+import itertools
+import selectors
+import socket
+import threading
+import time
+from core.rooms import inscrever_cliente, publicar_mensagem, publicar_na_sala, remover_cliente, tratar_comando
+from core.events import EVENTO_MENSAGEM, EVENTO_STATUS, eventos_servidor
+from core.framing import FrameDecoder, FrameError, TIPO_BLOCO, TIPO_CONTROLE, TIPO_PING, TIPO_PONG, encode_texto
+from core.protocol import COMANDOS_ARQUIVO, OPCAO_BATIMENTO, SALA_PADRAO, parse_comando, parse_handshake
+from core.outbound import LOTE_MAXIMO, OutboundQueue, enviar_vetorizado
+from core.compression import negociar as negociar_compressao
+from core.heartbeat import RESOLUCAO, MonitorBatimentos, configurar_keepalive, responder_ping
+from core.ratelimit import LimitadorDeConexao, avisar_descarte
+from core.transfer import EnviosDeArquivo, encerrar_transferencias, receber_bloco, tratar_comando_arquivo
+from core.metrics import metricas
+from core import logs
+
+_conexoes_aceitas = metricas.contador("servidor.conexoes_aceitas")
+_handshakes = metricas.contador("servidor.handshakes")
+_desconexoes = metricas.contador("servidor.desconexoes")
+_erros_envio = metricas.contador("servidor.erros_envio")
+_bytes_recebidos = metricas.contador("entrada.bytes")
+_mensagens_recebidas = metricas.contador("entrada.mensagens")
+_iteracoes = metricas.contador("laco.iteracoes")
+_amostra_mensagens = logs.Amostrador()
+
+
+class EventClientHandler:
+    """Conexão de um cliente atendida por um EventLoop (sem thread própria)."""
+
+    def __init__(self, server, loop, client_socket, addr):
+        self.server = server
+        self.loop = loop
+        self.client_socket = client_socket
+        self.addr = addr
+        self.username = f"[{addr[0]}]"  # Nome padrão: IP
+        self._running = True
+        self._identificado = False
+        self.salas = set()      # Salas em que o cliente está inscrito (core/rooms.py)
+        self.dono_dm = False    # Provou ser o dono do nome e recebe as mensagens diretas dele
+        self.sala_atual = None
+        self.decoder = FrameDecoder()
+        self.fila_saida = OutboundQueue(ao_despejar=self._despejar,
+                                        ao_ficar_pendente=self._ao_ficar_pendente)
+        self._em_envio = []  # Buffers do lote atual ainda não enviados
+        self.envios = EnviosDeArquivo()  # Downloads em andamento, intercalados com as mensagens
+        self.recebimentos = {}           # Uploads em andamento: id → RecebimentoArquivo
+        self.compressor = None           # Codec negociado no handshake (core/compression.py)
+        self.ultima_atividade = time.monotonic()  # Conferida pelo monitor de batimentos do laço
+        self.limitador = LimitadorDeConexao(addr[0])  # Taxa deste cliente e do IP dele (core/ratelimit.py)
+        self._leitura_pausada = False
+        self._aguardando_escrita = False
+        self._escrita_agendada = False
+
+    def stop(self):
+        self._running = False
+        self.fila_saida.fechar()
+
+    def _despejar(self):
+        """Desconecta um consumidor lento cuja fila de saída estourou o limite."""
+        logs.aviso(f"[Servidor] Cliente {self.username} ({self.addr}) lento demais, desconectando "
+              f"({self.fila_saida.bytes_enfileirados} bytes pendentes)")
+        self.server.eventos.emit(
+            EVENTO_MENSAGEM, f"[Servidor] Cliente '{self.username}' desconectado por lentidão.")
+        if self.loop.no_laco():
+            self.loop.fechar(self)
+        else:
+            self.loop.call_soon_threadsafe(self.loop.fechar, self)
+
+    def send_to_client(self, message: str):
+        """Envia uma mensagem para este cliente específico (thread-safe)."""
+        self.enviar_frame(encode_texto(message))
+
+    def enviar_frame(self, frame: bytes) -> bool:
+        """Enfileira um frame já serializado; a escrita acontece no laço deste cliente."""
+        if not self._running:
+            return False
+        if self.compressor is not None:
+            return self.compressor.enfileirar(self.fila_saida, frame, self._despejar)
+        return self.fila_saida.put(frame)
+
+    def _ao_ficar_pendente(self):
+        # Só acorda o laço quando a fila passa de vazia para não vazia
+        self.loop.solicitar_escrita(self)
+
+    def on_readable(self):
+        try:
+            recebidos = self.decoder.recv_into(self.client_socket)
+        except (BlockingIOError, InterruptedError):
+            return
+        except (OSError, FrameError) as e:
+            if self._running:
+                logs.erro(f"[Servidor] Erro com cliente {self.username} ({self.addr}): {e}")
+                self.server.eventos.emit(
+                    EVENTO_MENSAGEM, f"[Servidor] Erro com cliente {self.username} ({self.addr}): {e}")
+            self.loop.fechar(self)
+            return
+
+        if not recebidos:
+            if self._identificado:
+                logs.info(f"[Servidor] Cliente {self.username} ({self.addr}) desconectou")
+            else:
+                logs.info(f"[Servidor] Cliente {self.addr} desconectou antes de enviar o nome.")
+            self.loop.fechar(self)
+            return
+        _bytes_recebidos.incrementar(recebidos)
+        self.ultima_atividade = time.monotonic()
+        self.consumir_frames()
+
+    def consumir_frames(self):
+        """Trata os frames do buffer; acima da taxa para no meio e pausa a leitura até pagar o débito.
+
+        Os frames restantes esperam no decodificador (no máximo um recv) e o
+        laço os retoma em pausar_leitura/_retomar_leituras.
+        """
+        try:
+            for tipo, payload in self.decoder.frames():
+                if not self._running:
+                    return
+                self._processar_frame(tipo, payload)
+                if self.limitador.em_debito():
+                    break
+        except FrameError as e:
+            logs.aviso(f"[Servidor] Frame inválido de {self.username} ({self.addr}): {e}")
+            self.loop.fechar(self)
+            return
+
+        # O TCP segura o remetente enquanto o servidor não lê
+        if self._running:
+            atraso = self.limitador.atraso_leitura()
+            if atraso:
+                self.loop.pausar_leitura(self, atraso)
+
+    def _processar_frame(self, tipo, payload):
+        if tipo == TIPO_PING:
+            responder_ping(self, payload)
+            return
+        if tipo == TIPO_PONG:
+            return  # A chegada já renovou ultima_atividade
+        if tipo == TIPO_BLOCO:
+            exibir = receber_bloco(self, payload) if self._identificado else None
+            if exibir:
+                self.server.eventos.emit(EVENTO_MENSAGEM, exibir)
+            return
+
+        mensagem = payload.decode('utf-8', errors='replace').strip()
+
+        if tipo == TIPO_CONTROLE:
+            nome_usuario, opcoes = parse_handshake(mensagem)
+            comando, argumento, corpo = parse_comando(mensagem)
+            if nome_usuario is not None and not self._identificado:
+                self._identificado = True
+                _handshakes.incrementar()
+                self.username = nome_usuario or self.username
+                logs.info(f"[Servidor] Cliente {self.addr} identificado como: {self.username}")
+                self.server.eventos.emit(
+                    EVENTO_STATUS, f"[Servidor] Cliente '{self.username}' ({self.addr}) conectado.")
+                negociar_compressao(self, opcoes)
+                self.loop.batimentos.apos_handshake(self, OPCAO_BATIMENTO in opcoes)
+                # Numa reconexão o cliente informa o último seq recebido e só recebe o que perdeu
+                reenviadas = inscrever_cliente(self, opcoes)
+                if reenviadas:
+                    logs.info(f"[Servidor] {reenviadas} mensagens do histórico reenviadas para {self.username}")
+            elif comando in COMANDOS_ARQUIVO and self._identificado:
+                exibir = tratar_comando_arquivo(self, comando, argumento, corpo)
+                if exibir:
+                    self.server.eventos.emit(EVENTO_MENSAGEM, exibir)
+            elif comando and self._identificado:
+                if not self.limitador.admitir(len(payload)):
+                    avisar_descarte(self)
+                    return
+                exibir = tratar_comando(self, comando, argumento, corpo)
+                if exibir:
+                    _mensagens_recebidas.incrementar()
+                    self.server.eventos.emit(EVENTO_MENSAGEM, exibir)
+            else:
+                logs.aviso(f"[Servidor] Comando inesperado de {self.addr}: {mensagem}")
+                self.server.eventos.emit(
+                    EVENTO_MENSAGEM, f"[Servidor] Mensagem inesperada de {self.addr}: {mensagem}")
+            return
+
+        if not mensagem:
+            return
+        if not self.limitador.admitir(len(payload)):
+            avisar_descarte(self)
+            return
+        _mensagens_recebidas.incrementar()
+        logs.log_amostrado(_amostra_mensagens, logs.DEBUG,
+                           lambda: f"[Servidor] Mensagem recebida de {self.username} ({self.addr}): {mensagem}")
+        exibir = publicar_mensagem(self, mensagem)
+        if exibir:
+            self.server.eventos.emit(EVENTO_MENSAGEM, exibir)
+
+    def on_writable(self):
+        """Envia o que houver na fila. Retorna True quando não resta nada pendente.
+
+        Blocos de arquivo só começam com a fila de mensagens vazia; um bloco já
+        iniciado termina antes de qualquer outro frame.
+        """
+        try:
+            while True:
+                if self.envios.em_andamento:
+                    self.envios.enviar(self.client_socket, 0)
+                if not self._em_envio:
+                    self._em_envio = self.fila_saida.proximo_lote()
+                if self._em_envio:
+                    # Vários frames por chamada de sendmsg, sem concatená-los
+                    self._em_envio = enviar_vetorizado(self.client_socket, self._em_envio)
+                    if self._em_envio:
+                        return False  # Buffer do kernel cheio; aguarda EVENT_WRITE
+                    continue
+                # Um lote de blocos por vez; o restante segue nas próximas iterações do laço
+                return not self.envios or self.envios.enviar(self.client_socket, LOTE_MAXIMO)
+        except (BlockingIOError, InterruptedError):
+            return False
+        except OSError as e:
+            _erros_envio.incrementar()
+            logs.erro(f"[Servidor] Erro ao enviar para {self.username} ({self.addr}): {e}")
+            self._em_envio = []
+            self.loop.fechar(self)
+            return True
+
+
+class EventLoop:
+    """Laço de eventos baseado em selectors que atende várias conexões."""
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.selector = selectors.DefaultSelector()
+        self._pendentes = []
+        self._pendentes_lock = threading.Lock()
+        self._despertar_r, self._despertar_w = socket.socketpair()
+        self._despertar_r.setblocking(False)
+        self._despertar_w.setblocking(False)
+        self.selector.register(self._despertar_r, selectors.EVENT_READ, None)
+        self._thread_id = None
+        self._running = True
+        self._escritas_agendadas = []  # Handlers com frames novos, escritos ao fim da iteração
+        # Prazos de silêncio das conexões deste laço; verificados a cada RESOLUCAO segundos
+        self.batimentos = MonitorBatimentos(ao_expirar=self.fechar)
+        self._proxima_verificacao = 0.0
+        self._retomadas = []  # Heap (instante, seq, handler) das leituras pausadas pelo limite de taxa
+        self._seq_retomada = itertools.count()
+
+    def call_soon_threadsafe(self, callback, *args):
+        with self._pendentes_lock:
+            self._pendentes.append((callback, args))
+        self._despertar()
+
+    def _despertar(self):
+        try:
+            self._despertar_w.send(b"\0")
+        except (BlockingIOError, InterruptedError):
+            pass  # Já existe um despertar pendente
+        except OSError:
+            pass
+
+    def no_laco(self):
+        return threading.get_ident() == self._thread_id
+
+    def registrar_servidor(self, server_socket, on_accept):
+        server_socket.setblocking(False)
+        self.selector.register(server_socket, selectors.EVENT_READ, on_accept)
+
+    def adicionar(self, handler):
+        """Registra uma nova conexão neste laço (deve rodar na thread do laço)."""
+        handler.client_socket.setblocking(False)
+        self.selector.register(handler.client_socket, selectors.EVENT_READ, handler)
+        self.batimentos.acompanhar(handler)
+        handler.server._conexao_aceita(handler)
+
+    def transmitir(self, frame, handlers):
+        """Repassa o frame a estes handlers do laço, na thread do laço e na ordem das chamadas.
+
+        Quem publica faz um único agendamento por laço; a compressão e o
+        enfileiramento de cada conexão acontecem no laço dela.
+        """
+        self.call_soon_threadsafe(self._transmitir, frame, handlers)
+
+    def _transmitir(self, frame, handlers):
+        for handler in handlers:
+            if handler._running:
+                handler.enviar_frame(frame)
+
+    def solicitar_escrita(self, handler):
+        if self.no_laco():
+            self._agendar_escrita(handler)
+        else:
+            self.call_soon_threadsafe(self._agendar_escrita, handler)
+
+    def _agendar_escrita(self, handler):
+        # Adia a escrita para o fim da iteração: o broadcast só enfileira e vários
+        # frames para o mesmo cliente saem em uma única chamada de send
+        if not handler._escrita_agendada:
+            handler._escrita_agendada = True
+            self._escritas_agendadas.append(handler)
+
+    def _descarregar_escritas(self):
+        while self._escritas_agendadas:
+            agendadas, self._escritas_agendadas = self._escritas_agendadas, []
+            for handler in agendadas:
+                handler._escrita_agendada = False
+                self._tentar_escrita(handler)
+
+    def _tentar_escrita(self, handler):
+        if not handler._running:
+            return
+        # Escrita otimista: na maioria dos casos o buffer do kernel aceita tudo
+        concluido = handler.on_writable()
+        if not handler._running:
+            return
+        if concluido == (not handler._aguardando_escrita):
+            return  # Interesse no selector já está correto
+        handler._aguardando_escrita = not concluido
+        self._atualizar_interesse(handler)
+
+    def _atualizar_interesse(self, handler):
+        """Ajusta os eventos do socket no selector: leitura (se não pausada) e escrita (se pendente)."""
+        eventos = 0 if handler._leitura_pausada else selectors.EVENT_READ
+        if handler._aguardando_escrita:
+            eventos |= selectors.EVENT_WRITE
+        try:
+            if not eventos:
+                self.selector.unregister(handler.client_socket)
+            elif handler.client_socket in self.selector.get_map():
+                self.selector.modify(handler.client_socket, eventos, handler)
+            else:
+                self.selector.register(handler.client_socket, eventos, handler)
+        except (KeyError, ValueError):
+            pass
+
+    def pausar_leitura(self, handler, segundos):
+        """Para de ler a conexão por `segundos` (limite de taxa); as escritas continuam."""
+        if handler._leitura_pausada:
+            return
+        handler._leitura_pausada = True
+        self._atualizar_interesse(handler)
+        heapq.heappush(self._retomadas, (time.monotonic() + segundos, next(self._seq_retomada), handler))
+
+    def _retomar_leituras(self, agora):
+        while self._retomadas and self._retomadas[0][0] <= agora:
+            handler = heapq.heappop(self._retomadas)[2]
+            if handler._running:
+                handler._leitura_pausada = False
+                handler.consumir_frames()  # Pode pausar de novo
+                if not handler._leitura_pausada:
+                    self._atualizar_interesse(handler)
+
+    def _timeout_select(self):
+        if not self._retomadas:
+            return RESOLUCAO
+        return max(0.0, min(RESOLUCAO, self._retomadas[0][0] - time.monotonic()))
+
+    def fechar(self, handler):
+        if not handler._running and handler.client_socket.fileno() == -1:
+            return
+        handler.stop()
+        self.batimentos.esquecer(handler)
+        handler.limitador.encerrar()
+        encerrar_transferencias(handler)
+        try:
+            self.selector.unregister(handler.client_socket)
+        except (KeyError, ValueError):
+            pass
+        handler.server._remover_handler(handler)
+        handler.client_socket.close()
+
+    def run(self):
+        self._thread_id = threading.get_ident()
+        while self._running:
+            for key, mask in self.selector.select(self._timeout_select()):
+                if key.data is None:
+                    self._drenar_despertar()
+                    continue
+                if callable(key.data):
+                    key.data()
+                    continue
+                handler = key.data
+                if mask & selectors.EVENT_READ and handler._running:
+                    handler.on_readable()
+                if mask & selectors.EVENT_WRITE and handler._running:
+                    self._tentar_escrita(handler)
+            self._executar_pendentes()
+            agora = time.monotonic()
+            self._retomar_leituras(agora)
+            if agora >= self._proxima_verificacao:
+                self._proxima_verificacao = agora + RESOLUCAO
+                self.batimentos.verificar(agora)
+            self._descarregar_escritas()
+            _iteracoes.incrementar()
+        self._encerrar()
+
+    def _drenar_despertar(self):
+        try:
+            while self._despertar_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _executar_pendentes(self):
+        with self._pendentes_lock:
+            pendentes, self._pendentes = self._pendentes, []
+        for callback, args in pendentes:
+            callback(*args)
+
+    def stop(self):
+        self._running = False
+        self._despertar()
+
+    def _encerrar(self):
+        for key in list(self.selector.get_map().values()):
+            if isinstance(key.data, EventClientHandler):
+                self.fechar(key.data)
+        for _, _, handler in self._retomadas:
+            self.fechar(handler)  # Leitura pausada: fora do selector
+        self.selector.close()
+        self._despertar_r.close()
+        self._despertar_w.close()
+
+
+class EventLoopChatServer:
+    """Servidor de chat com um ou mais laços de eventos em vez de uma thread por cliente.
+
+    O laço 0 aceita conexões e as distribui em rodízio entre os laços.
+    Atende o mesmo handshake '__USERNAME__:' e a mesma semântica de broadcast
+    do modo legado baseado em threads, usando os frames de core/framing.py.
+    """
+
+    def __init__(self, host, port, num_loops=1, eventos=None, reutilizar_porta=False):
+        self.host = host
+        self.port = port
+        self.reutilizar_porta = reutilizar_porta  # SO_REUSEPORT: vários processos na mesma porta
+        self.eventos = eventos or eventos_servidor
+        self.loops = [EventLoop(f"chat-loop-{i}") for i in range(max(1, num_loops))]
+        self._proximo_loop = itertools.cycle(self.loops)
+        self.server_socket = None
+
+    def _on_accept(self):
+        while True:
+            try:
+                conn, addr = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logs.erro(f"[Servidor] Erro ao aceitar conexão: {e}")
+                return
+            _conexoes_aceitas.incrementar()
+            logs.debug(f"[Servidor] Nova conexão de {addr}")
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            configurar_keepalive(conn)
+            loop = next(self._proximo_loop)
+            handler = EventClientHandler(self, loop, conn, addr)
+            if loop.no_laco():
+                loop.adicionar(handler)
+            else:
+                loop.call_soon_threadsafe(loop.adicionar, handler)
+
+    def _conexao_aceita(self, handler):
+        # O handler entra no registro (e passa a receber broadcast) só após o handshake
+        logs.info(f"[Servidor] Novo cliente conectado: {handler.addr}")
+        self.eventos.emit(EVENTO_STATUS, f"[Servidor] Cliente conectado: {handler.addr}")
+
+    def _remover_handler(self, handler):
+        _desconexoes.incrementar()
+        if remover_cliente(handler):
+            logs.debug(f"[Servidor] Handler removido para {handler.username} ({handler.addr})")
+        self.eventos.emit(EVENTO_STATUS, f"[Servidor] Cliente '{handler.username}' desconectado.")
+        logs.info(f"[Servidor] Conexão encerrada com {handler.username} ({handler.addr})")
+
+    def broadcast_message(self, message: str, remetente=None, nome_remetente="", sala=SALA_PADRAO):
+        """Envia mensagem para todos os inscritos da sala, exceto o remetente"""
+        publicar_na_sala(message, sala, remetente, nome_remetente)
+
+    def bind(self):
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reutilizar_porta:
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(socket.SOMAXCONN)
+        self.loops[0].registrar_servidor(self.server_socket, self._on_accept)
+
+    def serve_forever(self):
+        """Executa o laço 0 na thread atual e os demais em threads daemon."""
+        for loop in self.loops[1:]:
+            threading.Thread(target=loop.run, name=loop.nome, daemon=True).start()
+        try:
+            self.loops[0].run()
+        finally:
+            self.server_socket.close()
+
+    def stop(self):
+        for loop in self.loops:
+            loop.stop()
@@ -0,0 +1,354 @@
+# core/federation.py
+"""Federação entre hosts: links servidor-a-servidor que unem vários chats em um só.
+
+Cada host continua numerando e entregando as mensagens aos seus próprios
+clientes; o que é publicado localmente também segue, uma vez, por cada link
+de federação. O host que recebe publica a mensagem para os clientes dele e a
+repassa aos demais links (exceto aquele por onde chegou). Cada mensagem leva
+um identificador global '<id do host de origem>:<época>:<seq de origem>' e
+cada host lembra os identificadores recentes, então uma mensagem que volta
+por um ciclo da malha é descartada em vez de circular para sempre. A época é
+a do histórico (core/history.py): sem log, a numeração recomeça a cada
+reinício e só a época impede que as novas mensagens sejam tomadas por
+repetições das antigas.
+
+Links (frames de core/framing.py, porta própria):
+    FED_OLA       JSON {host, versao, desafio}  primeiro frame de cada lado
+    FED_PROVA     JSON {resposta}  HMAC do dia (core/auth_token.py) do desafio do par + id de quem responde
+    FED_MENSAGEM  JSON {id, sala, nome, texto}
+
+Um par só é aceito depois de provar que conhece a chave do dia; o id de quem
+responde entra no HMAC para que uma resposta não possa ser refletida de
+volta ao host que fez o desafio.
+
+Configuração: P2P_CHAT_FEDERACAO_PORTA (aceita links; 0 = não aceita) e
+P2P_CHAT_FEDERACAO_PARES ('host:porta,host:porta', hosts aos quais conectar).
+Para testar vários hosts na mesma máquina, ver headless.py (--porta,
+--federacao-porta e --federar) e tests/test_federation.py.
+"""
+import json
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from core.auth_token import servico_token
+from core.events import EVENTO_MENSAGEM, eventos_servidor
+from core.framing import FrameDecoder, encode_frame
+from core.heartbeat import configurar_keepalive
+from core.globals import historico
+from core.metrics import metricas
+from core.outbound import OutboundQueue, enviar_vetorizado
+from core.protocol import PREFIXO_DM
+from core import logs
+
+PORTA_FEDERACAO = int(os.environ.get("P2P_CHAT_FEDERACAO_PORTA", 0))
+PARES_FEDERACAO = os.environ.get("P2P_CHAT_FEDERACAO_PARES", "")
+ID_HOST = os.environ.get("P2P_CHAT_ID_HOST") or uuid.uuid4().hex[:12]
+MAX_IDS_VISTOS = int(os.environ.get("P2P_CHAT_FEDERACAO_IDS", 65536))
+
+# Espera entre tentativas de conexão a um par (backoff exponencial com jitter)
+RECONEXAO_ESPERA_INICIAL = 0.5
+RECONEXAO_ESPERA_MAXIMA = 30.0
+TIMEOUT_OLA = 5.0
+
+VERSAO_FEDERACAO = 2
+FED_OLA = 0x20
+FED_MENSAGEM = 0x21
+FED_PROVA = 0x22
+
+_enviadas = metricas.contador("federacao.enviadas")
+_recebidas = metricas.contador("federacao.recebidas")
+_duplicadas = metricas.contador("federacao.duplicadas")
+_recusados = metricas.contador("federacao.pares_recusados")
+
+
+def parse_pares(texto):
+    """'host:porta,host:porta' → [(host, porta), ...]."""
+    pares = []
+    for item in texto.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, porta = item.rpartition(":")
+        pares.append((host or "127.0.0.1", int(porta)))
+    return pares
+
+
+def _encode_json(dados, tipo):
+    return encode_frame(json.dumps(dados, ensure_ascii=False).encode('utf-8'), tipo)
+
+
+class FederationLink:
+    """Uma conexão com outro host. Leitura na thread do link, escrita em thread própria."""
+
+    def __init__(self, federacao, sock, endereco):
+        self.federacao = federacao
+        self.sock = sock
+        self.endereco = endereco
+        self.id_par = None
+        self._running = True
+        self.decoder = FrameDecoder()
+        # Um par lento é desconectado (e reconectado pelo discador) em vez de reter memória
+        self.fila_saida = OutboundQueue(ao_despejar=self.stop)
+
+    def __repr__(self):
+        return f"{self.id_par or '?'}@{self.endereco[0]}:{self.endereco[1]}"
+
+    def enviar_frame(self, frame) -> bool:
+        if not self._running:
+            return False
+        return self.fila_saida.put(frame)
+
+    def stop(self):
+        self._running = False
+        self.fila_saida.fechar()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _escrever(self):
+        while True:
+            lote = self.fila_saida.aguardar_lote()
+            if not lote:
+                break
+            try:
+                while lote:
+                    lote = enviar_vetorizado(self.sock, lote)
+            except OSError as e:
+                if self._running:
+                    logs.erro(f"[Federação] Erro ao enviar para {self}: {e}")
+                self.stop()
+                break
+
+    def _esperar(self, tipo_esperado):
+        """Próximo frame do handshake, decodificado. None se a conexão caiu ou veio outro tipo."""
+        while True:
+            for tipo, payload in self.decoder.frames():
+                if tipo != tipo_esperado:
+                    return None
+                return json.loads(payload.decode('utf-8'))
+            if not self.decoder.recv_into(self.sock):
+                return None
+
+    def _ler_ola(self):
+        """Troca os frames FED_OLA e FED_PROVA. Retorna o id do par autenticado ou None."""
+        self.sock.settimeout(TIMEOUT_OLA)
+        id_host = self.federacao.id_host
+        desafio = servico_token.gerar_desafio()
+        self.sock.sendall(_encode_json(
+            {"host": id_host, "versao": VERSAO_FEDERACAO, "desafio": desafio.hex()}, FED_OLA))
+        ola = self._esperar(FED_OLA)
+        if ola is None:
+            return None
+        id_par = ola.get("host")
+        if not id_par or not ola.get("desafio"):
+            logs.aviso(f"[Federação] Par {self.endereco} sem desafio (versão {ola.get('versao')}); recusado.")
+            _recusados.incrementar()
+            return None
+        resposta = servico_token.responder_desafio(bytes.fromhex(ola["desafio"]) + id_host.encode('utf-8'))
+        self.sock.sendall(_encode_json({"resposta": resposta}, FED_PROVA))
+        prova = self._esperar(FED_PROVA) or {}
+        if not servico_token.validar_resposta(desafio + str(id_par).encode('utf-8'), str(prova.get("resposta"))):
+            logs.aviso(f"[Federação] Par {self.endereco} ({id_par}) não provou a chave do dia; recusado.")
+            _recusados.incrementar()
+            return None
+        return id_par
+
+    def executar(self):
+        """Handshake e laço de leitura; retorna quando o link cai."""
+        try:
+            self.id_par = self._ler_ola()
+        except (OSError, ValueError) as e:
+            logs.aviso(f"[Federação] Handshake falhou com {self.endereco}: {e}")
+            self.id_par = None
+        if not self.id_par or not self.federacao._registrar(self):
+            self.sock.close()
+            return False
+
+        self.sock.settimeout(None)
+        threading.Thread(target=self._escrever, name=f"federacao-escrita-{self.id_par}", daemon=True).start()
+        try:
+            while self._running:
+                # Frames que chegaram junto com o FED_OLA já estão no decodificador
+                for tipo, payload in self.decoder.frames():
+                    if tipo == FED_MENSAGEM:
+                        self.federacao.receber(self, json.loads(payload.decode('utf-8')))
+                if not self.decoder.recv_into(self.sock):
+                    break
+        except (OSError, ValueError) as e:
+            if self._running:
+                logs.erro(f"[Federação] Erro no link com {self}: {e}")
+        finally:
+            self.federacao._remover(self)
+            self.stop()
+            self.sock.close()
+        return True
+
+
+class Federacao:
+    """Links de federação deste host: aceita pares, conecta-se aos configurados e repassa mensagens."""
+
+    def __init__(self, id_host=None, host="0.0.0.0", port=PORTA_FEDERACAO, pares=None, eventos=None):
+        self.id_host = id_host or ID_HOST
+        self.host = host
+        self.port = port
+        self.pares = list(pares if pares is not None else parse_pares(PARES_FEDERACAO))
+        self.eventos = eventos or eventos_servidor
+        self.server_socket = None
+        self._links = ()  # Cópia na escrita: o repasse (frequente) só lê a tupla
+        self._lock = threading.Lock()
+        self._vistos = set()
+        self._ordem_vistos = deque()
+        self._running = False
+        metricas.medidor("federacao.links", lambda: len(self._links))
+
+    # --- Links ---
+
+    def _registrar(self, link) -> bool:
+        if link.id_par == self.id_host:
+            logs.aviso(f"[Federação] Link com {link.endereco} leva a este mesmo host; ignorado.")
+            return False
+        with self._lock:
+            if any(l.id_par == link.id_par for l in self._links):
+                logs.debug(f"[Federação] Já existe link com {link.id_par}; conexão de {link.endereco} descartada.")
+                return False
+            self._links = self._links + (link,)
+        logs.info(f"[Federação] Link estabelecido com {link}")
+        return True
+
+    def _remover(self, link):
+        with self._lock:
+            if link not in self._links:
+                return
+            self._links = tuple(l for l in self._links if l is not link)
+        logs.info(f"[Federação] Link com {link} encerrado")
+
+    def links(self):
+        return self._links
+
+    # --- Identificadores já vistos (supressão de ciclos) ---
+
+    def _marcar(self, id_mensagem) -> bool:
+        """Registra o id. Retorna False se ele já tinha sido visto."""
+        with self._lock:
+            if id_mensagem in self._vistos:
+                return False
+            self._vistos.add(id_mensagem)
+            self._ordem_vistos.append(id_mensagem)
+            if len(self._ordem_vistos) > MAX_IDS_VISTOS:
+                self._vistos.discard(self._ordem_vistos.popleft())
+            return True
+
+    # --- Repasse ---
+
+    def ao_publicar(self, seq, texto, sala, remetente, via):
+        """Chamado por MessageHistory.publicar (na ordem dos seqs): repassa a todos os links.
+
+        `via` é (id da mensagem, link de chegada) para mensagens vindas da federação.
+        """
+        if via is None:
+            id_mensagem, chegada = f"{self.id_host}:{historico.epoca}:{seq}", None
+            self._marcar(id_mensagem)
+        else:
+            id_mensagem, chegada = via
+        links = self._links
+        if not links or (chegada is not None and links == (chegada,)):
+            return
+        frame = _encode_json({"id": id_mensagem, "sala": sala, "nome": remetente, "texto": texto}, FED_MENSAGEM)
+        for link in links:
+            if link is not chegada and link.enviar_frame(frame):
+                _enviadas.incrementar()
+
+    def receber(self, link, dados):
+        """Mensagem vinda de um par: publica para os clientes locais (e segue para os outros links)."""
+        from core.rooms import publicar_na_sala
+
+        _recebidas.incrementar()
+        if not self._marcar(dados["id"]):
+            _duplicadas.incrementar()
+            return
+        sala, texto = dados["sala"], dados["texto"]
+        publicar_na_sala(texto, sala, nome_remetente=dados["nome"], via=(dados["id"], link))
+        if not sala.startswith(PREFIXO_DM):  # Mensagens diretas não aparecem no chat do host
+            self.eventos.emit(EVENTO_MENSAGEM, texto)
+
+    # --- Ciclo de vida ---
+
+    def start(self):
+        self._running = True
+        historico.ao_publicar = self.ao_publicar
+        if self.port:
+            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server_socket.bind((self.host, self.port))
+            self.server_socket.listen(16)
+            self.port = self.server_socket.getsockname()[1]
+            threading.Thread(target=self._aceitar, name="federacao-escuta", daemon=True).start()
+            logs.info(f"[Federação] Host {self.id_host} aceitando links em {self.host}:{self.port}")
+        for par in self.pares:
+            threading.Thread(target=self._discar, args=(par,), name=f"federacao-{par[0]}:{par[1]}",
+                             daemon=True).start()
+
+    def _aceitar(self):
+        while self._running:
+            try:
+                conn, addr = self.server_socket.accept()
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            configurar_keepalive(conn)
+            threading.Thread(target=FederationLink(self, conn, addr).executar, daemon=True).start()
+
+    def _discar(self, par):
+        """Mantém um link com o par configurado, reconectando com backoff."""
+        espera = RECONEXAO_ESPERA_INICIAL
+        while self._running:
+            try:
+                sock = socket.create_connection(par, timeout=TIMEOUT_OLA)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                configurar_keepalive(sock)
+            except OSError as e:
+                logs.debug(f"[Federação] Par {par[0]}:{par[1]} indisponível: {e}")
+            else:
+                if FederationLink(self, sock, par).executar():
+                    espera = RECONEXAO_ESPERA_INICIAL  # O link chegou a funcionar
+            if not self._running:
+                break
+            time.sleep(espera * random.uniform(0.5, 1.0))
+            espera = min(espera * 2, RECONEXAO_ESPERA_MAXIMA)
+
+    def stop(self):
+        self._running = False
+        if historico.ao_publicar == self.ao_publicar:
+            historico.ao_publicar = None
+        if self.server_socket:
+            self.server_socket.close()
+        for link in self._links:
+            link.stop()
+
+
+_federacao = None
+_federacao_lock = threading.Lock()
+
+
+def iniciar_federacao(host="0.0.0.0", porta=None, pares=None, id_host=None):
+    """Inicia (uma vez por processo) a federação configurada. Retorna None se não há nada a fazer."""
+    global _federacao
+    porta = PORTA_FEDERACAO if porta is None else porta
+    pares = parse_pares(PARES_FEDERACAO) if pares is None else pares
+    with _federacao_lock:
+        if _federacao is not None or not (porta or pares):
+            return _federacao
+        federacao = Federacao(id_host, host, porta, pares)
+        try:
+            federacao.start()
+        except OSError as e:
+            logs.erro(f"[Federação] Não foi possível aceitar links na porta {porta}: {e}")
+            federacao.stop()
+            return None
+        _federacao = federacao
+        return federacao
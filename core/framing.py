@@ -0,0 +1,129 @@
+# core/framing.py
+"""Enquadramento das mensagens trocadas entre cliente e servidor de chat.
+
+Cada frame é um cabeçalho de 5 bytes (tamanho do payload em 4 bytes big-endian
+seguido de 1 byte de tipo) e o payload. Assim várias mensagens podem seguir no
+mesmo segmento TCP e uma mensagem pode chegar em vários `recv` sem corromper.
+"""
+import struct
+
+HEADER = struct.Struct("!IB")  # tamanho do payload, tipo do frame
+SEQUENCIA = struct.Struct("!Q")  # Número de sequência no início de um frame TIPO_MENSAGEM
+BLOCO = struct.Struct("!QQ")     # id da transferência e offset no início de um frame TIPO_BLOCO
+
+# Tipos de frame
+TIPO_TEXTO = 0x01     # Mensagem de chat em UTF-8
+TIPO_CONTROLE = 0x02  # Comandos do protocolo (ex.: '__USERNAME__:<nome>')
+TIPO_MENSAGEM = 0x03  # Mensagem de chat numerada pelo servidor: sequência (8 bytes) + UTF-8
+TIPO_BLOCO = 0x04     # Bloco de arquivo: id (8 bytes) + offset (8 bytes) + dados (core/transfer.py)
+TIPO_COMPRIMIDO = 0x05  # Um ou mais frames comprimidos com o codec negociado (core/compression.py)
+TIPO_PING = 0x06      # Batimento; o outro lado devolve o payload em um TIPO_PONG (core/heartbeat.py)
+TIPO_PONG = 0x07
+
+TAMANHO_MAXIMO = 16 * 1024 * 1024  # Recusa frames maiores que 16 MiB
+_CAPACIDADE_INICIAL = 64 * 1024
+_LIVRE_MINIMO = 4096
+
+
+class FrameError(ValueError):
+    """Frame inválido recebido (tamanho acima do limite)."""
+
+
+def encode_frame(payload: bytes, tipo: int = TIPO_TEXTO) -> bytes:
+    """Serializa um frame completo (cabeçalho + payload)."""
+    if len(payload) > TAMANHO_MAXIMO:
+        raise FrameError(f"Frame de {len(payload)} bytes excede o limite de {TAMANHO_MAXIMO}")
+    return HEADER.pack(len(payload), tipo) + payload
+
+
+def encode_texto(texto: str, tipo: int = TIPO_TEXTO) -> bytes:
+    return encode_frame(texto.encode('utf-8'), tipo)
+
+
+def encode_mensagem(seq: int, texto: str) -> bytes:
+    return encode_frame(SEQUENCIA.pack(seq) + texto.encode('utf-8'), TIPO_MENSAGEM)
+
+
+def decode_mensagem(payload: bytes):
+    """Retorna (seq, texto) de um payload TIPO_MENSAGEM."""
+    (seq,) = SEQUENCIA.unpack_from(payload)
+    return seq, payload[SEQUENCIA.size:].decode('utf-8')
+
+
+class FrameDecoder:
+    """Decodificador incremental de frames com buffer de recepção reutilizável.
+
+    Os bytes são lidos diretamente no buffer com `recv_into`; o buffer só cresce
+    quando um frame não cabe nele e é compactado em vez de realocado.
+    """
+
+    def __init__(self, capacidade=_CAPACIDADE_INICIAL, tamanho_maximo=TAMANHO_MAXIMO):
+        self._buf = bytearray(capacidade)
+        self._ini = 0
+        self._fim = 0
+        self.tamanho_maximo = tamanho_maximo
+        # Definido após negociar compressão: frames TIPO_COMPRIMIDO são abertos em frames comuns
+        self.descompressor = None
+
+    def pendente(self) -> int:
+        """Quantidade de bytes recebidos que ainda não formam um frame completo."""
+        return self._fim - self._ini
+
+    def _necessario(self) -> int:
+        """Bytes necessários (a partir de _ini) para completar o próximo frame."""
+        if self._fim - self._ini < HEADER.size:
+            return HEADER.size
+        tamanho, _ = HEADER.unpack_from(self._buf, self._ini)
+        if tamanho > self.tamanho_maximo:
+            raise FrameError(f"Frame de {tamanho} bytes excede o limite de {self.tamanho_maximo}")
+        return HEADER.size + tamanho
+
+    def _reservar(self):
+        """Garante espaço livre no fim do buffer para o próximo recv_into."""
+        if self._ini == self._fim:
+            self._ini = self._fim = 0
+
+        necessario = self._necessario()
+        capacidade = len(self._buf)
+        if capacidade - self._ini >= necessario and capacidade - self._fim >= _LIVRE_MINIMO:
+            return
+
+        # Move os bytes pendentes para o início do buffer
+        pendente = self._fim - self._ini
+        if self._ini:
+            self._buf[:pendente] = self._buf[self._ini:self._fim]
+            self._ini, self._fim = 0, pendente
+
+        # Cresce apenas se o frame atual não couber ou se não houver espaço livre
+        alvo = max(necessario, pendente + _LIVRE_MINIMO)
+        if alvo > capacidade:
+            self._buf.extend(bytes(max(alvo, capacidade * 2) - capacidade))
+
+    def recv_into(self, sock) -> int:
+        """Lê do socket direto para o buffer. Retorna 0 quando a conexão foi fechada."""
+        self._reservar()
+        with memoryview(self._buf) as visao:
+            n = sock.recv_into(visao[self._fim:])
+        self._fim += n
+        return n
+
+    def feed(self, dados: bytes):
+        """Acrescenta bytes já recebidos por outro meio."""
+        self._reservar()
+        fim = self._fim + len(dados)
+        self._buf[self._fim:fim] = dados
+        self._fim = fim
+
+    def frames(self):
+        """Gera (tipo, payload) para cada frame completo disponível no buffer."""
+        while self._fim - self._ini >= HEADER.size:
+            total = self._necessario()
+            if self._fim - self._ini < total:
+                return
+            _, tipo = HEADER.unpack_from(self._buf, self._ini)
+            inicio = self._ini + HEADER.size
+            self._ini += total
+            if tipo == TIPO_COMPRIMIDO and self.descompressor is not None:
+                yield from self.descompressor.frames(bytes(self._buf[inicio:self._ini]))
+            else:
+                yield tipo, bytes(self._buf[inicio:self._ini])
@@ -1,5 +1,87 @@
 # core/globals.py
 import threading
+from core.history import MessageHistory
+from core.outbound import transmitir
 
-clientes_lock = threading.Lock()
-handlers = []  # Lista global de ClientHandlers
\ No newline at end of file
+
+class _Destinos:
+    """Handlers de um registro em um instante; transmitir() não vê conexões posteriores."""
+    __slots__ = ("handlers",)
+
+    def __init__(self, handlers):
+        self.handlers = handlers
+
+    def transmitir(self, frame: bytes, excluir=None) -> int:
+        return transmitir(self.handlers, frame, excluir)
+
+
+class HandlerRegistry:
+    """Registro dos handlers conectados com cópia na escrita (copy-on-write).
+
+    Conexões e desconexões (raras) criam uma nova tupla; o broadcast (frequente)
+    apenas lê a tupla atual, sem lock e sem copiar a lista a cada mensagem.
+    """
+
+    def __init__(self, lock):
+        self._lock = lock
+        self._snapshot = ()
+        self._por_id = {}  # id(handler) → handler, para quem só recebe o id (core/workers.py)
+        self.versao = 0  # Incrementada a cada alteração do registro
+
+    def append(self, handler):
+        with self._lock:
+            self._snapshot = self._snapshot + (handler,)
+            self._por_id[id(handler)] = handler
+            self.versao += 1
+
+    def remove(self, handler) -> bool:
+        """Remove o handler. Retorna False se ele não estava registrado."""
+        with self._lock:
+            if handler not in self._snapshot:
+                return False
+            self._snapshot = tuple(h for h in self._snapshot if h is not handler)
+            self._por_id.pop(id(handler), None)
+            self.versao += 1
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._snapshot = ()
+            self._por_id = {}
+            self.versao += 1
+
+    def por_id(self, id_handler):
+        """Handler registrado com esse id(), ou None (leitura sem lock)."""
+        return self._por_id.get(id_handler)
+
+    def snapshot(self) -> tuple:
+        """Tupla imutável com os handlers atuais (leitura sem lock)."""
+        return self._snapshot
+
+    def copy(self) -> list:
+        return list(self._snapshot)
+
+    def fixar(self):
+        """Destino de transmissão com os handlers atuais (ver MessageHistory.publicar)."""
+        return _Destinos(self._snapshot)
+
+    def transmitir(self, frame: bytes, excluir=None) -> int:
+        """Enfileira o mesmo frame (serializado uma única vez) para todos os handlers.
+
+        Retorna quantos handlers foram alcançados.
+        """
+        return transmitir(self._snapshot, frame, excluir)
+
+    def __contains__(self, handler):
+        return handler in self._snapshot
+
+    def __iter__(self):
+        return iter(self._snapshot)
+
+    def __len__(self):
+        return len(self._snapshot)
+
+
+clientes_lock = threading.RLock()
+handlers = HandlerRegistry(clientes_lock)  # Registro global de ClientHandlers
+historico = MessageHistory()  # Mensagens recentes reexibidas a quem entra depois
@@ -0,0 +1,150 @@
+# core/heartbeat.py
+"""Batimentos (ping/pong) e detecção de clientes mortos.
+
+Um celular que some do hotspot não fecha a conexão: sem isso o handler só
+sairia do registro quando um envio falhasse, e até lá o broadcast continuaria
+enfileirando para ele. O servidor acompanha cada conexão em uma TimerWheel:
+
+- antes do handshake, a conexão tem TIMEOUT_HANDSHAKE segundos para se identificar;
+- clientes que anunciam __BATIMENTO__ no handshake recebem um TIPO_PING depois
+  de INTERVALO_PING segundos de silêncio e são desconectados após
+  TIMEOUT_SILENCIO segundos sem enviar nada (nem o TIPO_PONG);
+- clientes antigos, que não respondem a pings, ficam com o keepalive do TCP.
+
+O cliente faz o mesmo do lado dele (ChatClientWorker): pinga o servidor
+quando a conexão fica quieta e reconecta se nem o pong chegar.
+
+Ler dados só atualiza `ultima_atividade` no handler; a roda confere esse
+instante quando o prazo vence e, se houve atividade, apenas reagenda.
+"""
+import os
+import socket
+import struct
+import threading
+import time
+from core.framing import TIPO_PING, TIPO_PONG, encode_frame
+from core.metrics import metricas
+from core.timerwheel import TimerWheel
+from core import logs
+
+INTERVALO_PING = float(os.environ.get("P2P_CHAT_PING_INTERVALO", 15))
+TIMEOUT_SILENCIO = float(os.environ.get("P2P_CHAT_PING_TIMEOUT", 45))
+TIMEOUT_HANDSHAKE = float(os.environ.get("P2P_CHAT_HANDSHAKE_TIMEOUT", 10))
+RESOLUCAO = 1.0  # Segundos por slot da roda
+
+KEEPALIVE_OCIOSO = int(os.environ.get("P2P_CHAT_KEEPALIVE_OCIOSO", 30))
+KEEPALIVE_INTERVALO = int(os.environ.get("P2P_CHAT_KEEPALIVE_INTERVALO", 10))
+KEEPALIVE_TENTATIVAS = int(os.environ.get("P2P_CHAT_KEEPALIVE_TENTATIVAS", 3))
+
+_pings = metricas.contador("batimentos.pings")
+_expirados = metricas.contador("batimentos.expirados")
+
+FRAME_PING = encode_frame(b"", TIPO_PING)
+INSTANTE = struct.Struct("!Q")  # Payload dos pings do cliente: time.monotonic_ns() do envio
+
+
+def configurar_keepalive(sock, ocioso=None, intervalo=None, tentativas=None):
+    """Ativa o keepalive do TCP: uma conexão morta é detectada em ocioso + intervalo * tentativas segundos."""
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # As opções finas não existem em todos os sistemas
+        for opcao, valor in (("TCP_KEEPIDLE", ocioso or KEEPALIVE_OCIOSO),
+                             ("TCP_KEEPINTVL", intervalo or KEEPALIVE_INTERVALO),
+                             ("TCP_KEEPCNT", tentativas or KEEPALIVE_TENTATIVAS)):
+            if hasattr(socket, opcao):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, opcao), valor)
+    except OSError:
+        pass
+
+
+def responder_ping(handler, payload):
+    """Devolve o payload do ping do cliente (ele mede o RTT com ele)."""
+    handler.enviar_frame(encode_frame(payload, TIPO_PONG))
+
+
+def montar_ping():
+    """Ping do cliente: o pong devolve o instante do envio e dá o RTT."""
+    return encode_frame(INSTANTE.pack(time.monotonic_ns()), TIPO_PING)
+
+
+def rtt_do_pong(payload):
+    """RTT em milissegundos de um pong de montar_ping() (None se o payload não veio de lá)."""
+    if len(payload) != INSTANTE.size:
+        return None
+    return (time.monotonic_ns() - INSTANTE.unpack(payload)[0]) / 1e6
+
+
+class MonitorBatimentos:
+    """Prazos de silêncio das conexões de um servidor (ou de um laço de eventos).
+
+    `ao_expirar(handler)` encerra a conexão; é chamado por quem executa verificar().
+    """
+
+    def __init__(self, ao_expirar, intervalo=None, timeout=None, timeout_handshake=None):
+        self.ao_expirar = ao_expirar
+        self.intervalo = intervalo or INTERVALO_PING
+        self.timeout = max(timeout or TIMEOUT_SILENCIO, self.intervalo)
+        self.timeout_handshake = timeout_handshake or TIMEOUT_HANDSHAKE
+        self.roda = TimerWheel(RESOLUCAO, num_slots=max(64, int(self.timeout / RESOLUCAO) + 2))
+        self._lock = threading.Lock()  # Modo threads: leitores e a thread da roda
+
+    def acompanhar(self, handler):
+        """Conexão nova: prazo para o handshake."""
+        handler.ultima_atividade = time.monotonic()
+        handler.com_batimento = False
+        with self._lock:
+            self.roda.agendar(handler, handler.ultima_atividade + self.timeout_handshake)
+
+    def apos_handshake(self, handler, com_batimento):
+        """Cliente identificado: passa a ser acompanhado por pings (ou fica com o keepalive do TCP)."""
+        handler.com_batimento = com_batimento
+        with self._lock:
+            if com_batimento:
+                self.roda.agendar(handler, handler.ultima_atividade + self.intervalo)
+            else:
+                self.roda.cancelar(handler)
+
+    def esquecer(self, handler):
+        with self._lock:
+            self.roda.cancelar(handler)
+
+    def __len__(self):
+        return len(self.roda)
+
+    def verificar(self, agora=None):
+        """Processa os prazos vencidos: reagenda, envia ping ou expira."""
+        agora = time.monotonic() if agora is None else agora
+        pingar, expirar = [], []
+        with self._lock:
+            for handler in self.roda.avancar(agora):
+                if not handler._running:
+                    continue
+                if not handler._identificado:
+                    expirar.append((handler, "sem handshake"))
+                    continue
+                silencio = agora - handler.ultima_atividade
+                if silencio >= self.timeout:
+                    expirar.append((handler, f"{silencio:.0f}s sem resposta"))
+                elif silencio >= self.intervalo:
+                    pingar.append(handler)
+                    self.roda.agendar(handler, handler.ultima_atividade + self.timeout)
+                else:
+                    self.roda.agendar(handler, handler.ultima_atividade + self.intervalo)
+        # Fora do lock: enviar pode despejar a fila e encerrar a conexão
+        for handler in pingar:
+            if handler.enviar_frame(FRAME_PING):
+                _pings.incrementar()
+        for handler, motivo in expirar:
+            _expirados.incrementar()
+            logs.info(f"[Servidor] Conexão com {handler.username} ({handler.addr}) expirada ({motivo})")
+            self.ao_expirar(handler)
+        return len(expirar)
+
+    def iniciar_thread(self):
+        """Verifica os prazos a cada RESOLUCAO segundos em uma thread daemon (modo threads)."""
+        def executar():
+            while True:
+                time.sleep(RESOLUCAO)
+                self.verificar()
+
+        threading.Thread(target=executar, name="chat-batimentos", daemon=True).start()
@@ -0,0 +1,263 @@
+# core/history.py
+"""Histórico recente de mensagens do servidor de chat, em memória e limitado.
+
+Cada mensagem recebe um número de sequência e é guardada já serializada, de
+modo que o mesmo frame serve para o broadcast e para a reexibição a clientes
+que entram depois. A numeração é única para todas as salas; cada entrada
+guarda a sala de destino para que a reexibição só inclua as salas do cliente.
+
+O lock cobre só a numeração, o buffer e o instantâneo dos destinatários.
+A transmissão (fan-out, compressão por conexão, repasse à federação) fica
+numa fila em ordem de seq, esvaziada fora do lock por quem publicou: quem
+chega com a fila já em andamento só enfileira e segue.
+"""
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from core.framing import TIPO_CONTROLE, encode_mensagem, encode_texto
+from core.outbound import transmitir
+from core.protocol import PREFIXO_DM, RESPOSTA_LACUNA, RESPOSTA_SEQ, SALA_PADRAO, montar_comando, montar_marca
+from core.metrics import metricas
+
+MAX_MENSAGENS = int(os.environ.get("P2P_CHAT_HISTORICO_MENSAGENS", 500))
+MAX_BYTES = int(os.environ.get("P2P_CHAT_HISTORICO_BYTES", 256 * 1024))
+
+_publicadas = metricas.contador("historico.publicadas")
+_reenviadas = metricas.contador("historico.reenviadas")
+_resumes_a_frente = metricas.contador("historico.resumes_a_frente")
+_resumes_outra_epoca = metricas.contador("historico.resumes_outra_epoca")
+_lacunas = metricas.contador("historico.lacunas")  # Reexibições que não cobriram tudo o que o cliente perdeu
+_tempo_broadcast = metricas.histograma("tempo.broadcast")   # Numeração + gravação + fan-out (se despachou)
+_tempo_inscricao = metricas.histograma("tempo.inscricao")   # Reexibição do histórico a quem entra
+
+
+class MessageHistory:
+    """Buffer circular de frames numerados, limitado por quantidade e por bytes."""
+
+    def __init__(self, max_mensagens=MAX_MENSAGENS, max_bytes=MAX_BYTES):
+        self.max_mensagens = max_mensagens
+        self.max_bytes = max_bytes
+        self._entradas = deque()  # (seq, frame, sala)
+        self._bytes = 0
+        self.ultimo_seq = 0
+        # Identifica esta numeração: sem log ela recomeça em 1 a cada início do servidor
+        self.epoca = secrets.token_hex(8)
+        self.log = None  # MessageLog opcional onde cada mensagem também é gravada
+        # ao_publicar(seq, texto, sala, remetente, via) opcional, chamado a cada publicação na
+        # ordem dos seqs, fora do lock (repasse aos hosts federados, ver core/federation.py)
+        self.ao_publicar = None
+        # Serializa numeração e gravação; o fan-out é agendado sob ele com em_ordem()
+        self.lock = threading.Lock()
+        self._agendados = deque()  # (função, args) na ordem em que foram agendados sob o lock
+        self._despacho = threading.Lock()  # Quem o tem executa os agendados; os outros só agendam
+
+    def __len__(self):
+        return len(self._entradas)
+
+    @property
+    def primeiro_seq(self):
+        return self._entradas[0][0] if self._entradas else self.ultimo_seq + 1
+
+    def carregar_log(self, log):
+        """Passa a gravar no log e retoma a numeração e o histórico a partir dele."""
+        with self.lock:
+            self.log = log
+            self.epoca = log.epoca  # A numeração continua a do log, que sobrevive ao reinício
+            self.ultimo_seq = max(self.ultimo_seq, log.ultimo_seq)
+            desde = max(0, log.ultimo_seq - self.max_mensagens)
+            for seq, _, _, texto, sala in log.ler(desde):
+                if seq > (self._entradas[-1][0] if self._entradas else 0):
+                    self._guardar(seq, encode_mensagem(seq, texto), sala or SALA_PADRAO)
+
+    def _guardar(self, seq, frame, sala=SALA_PADRAO):
+        self._entradas.append((seq, frame, sala))
+        self._bytes += len(frame)
+        # Descarta as mais antigas; cada entrada sai no máximo uma vez (O(1) amortizado)
+        while self._entradas and (len(self._entradas) > self.max_mensagens or self._bytes > self.max_bytes):
+            _, antigo, _ = self._entradas.popleft()
+            self._bytes -= len(antigo)
+
+    def _adicionar(self, texto, remetente="", sala=SALA_PADRAO):
+        self.ultimo_seq += 1
+        frame = encode_mensagem(self.ultimo_seq, texto)
+        self._guardar(self.ultimo_seq, frame, sala)
+        if self.log and not sala.startswith(PREFIXO_DM):
+            # Apenas enfileira; a gravação em disco é feita pela thread do log.
+            # Mensagens diretas ficam só na memória: não vão para o disco do host
+            self.log.append(self.ultimo_seq, time.time(), remetente, texto,
+                            "" if sala == SALA_PADRAO else sala)
+        return self.ultimo_seq, frame
+
+    def em_ordem(self, funcao, *args):
+        """Agenda funcao(*args) depois de tudo o que já foi agendado (chamar com o lock).
+
+        Executada por despachar(), fora do lock; quem a agenda chama despachar()
+        depois de soltar o lock.
+        """
+        self._agendados.append((funcao, args))
+
+    def despachar(self, esperar=False):
+        """Executa os agendados em ordem. Sem `esperar`, sai se outra thread já está despachando.
+
+        Essa thread verifica a fila de novo depois de soltar o _despacho, então
+        nada agendado fica para trás. Com `esperar`, retorna só depois de o que
+        já estava agendado ter sido executado (por esta ou pela outra thread).
+        """
+        while esperar or self._agendados:
+            if not self._despacho.acquire(blocking=esperar):
+                return
+            try:
+                while self._agendados:
+                    funcao, args = self._agendados.popleft()
+                    funcao(*args)
+            finally:
+                self._despacho.release()
+            esperar = False
+
+    def _transmitir(self, destinos, frame, excluir, publicacao):
+        destinos.transmitir(frame, excluir=excluir)
+        if publicacao is not None and self.ao_publicar is not None:
+            self.ao_publicar(*publicacao)
+
+    def publicar(self, texto, registro, excluir=None, remetente="", sala=SALA_PADRAO, via=None):
+        """Numera a mensagem, guarda no histórico e a transmite a todos do registro.
+
+        `registro` são os inscritos da `sala` (ver core/rooms.py); `via` identifica
+        mensagens recebidas de outro host federado. Os destinatários são os
+        inscritos no momento da numeração (registro.fixar()), mesmo que a
+        transmissão aconteça depois: quem se inscreve em seguida recebe a
+        mensagem pela reexibição, nunca pelas duas vias.
+        """
+        with _tempo_broadcast.medir():
+            with self.lock:
+                seq, frame = self._adicionar(texto, remetente, sala)
+                self.em_ordem(self._transmitir, registro.fixar(), frame, excluir, (seq, texto, sala, remetente, via))
+            self.despachar()
+        _publicadas.incrementar()
+        return seq
+
+    def replicar(self, seq, frame, registro, excluir=None, sala=SALA_PADRAO):
+        """Guarda e transmite um frame numerado por outro processo (ver core/workers.py)."""
+        with _tempo_broadcast.medir():
+            with self.lock:
+                self.ultimo_seq = max(self.ultimo_seq, seq)
+                self._guardar(seq, frame, sala)
+                self.em_ordem(self._transmitir, registro.fixar(), frame, excluir, None)
+            self.despachar()
+        _publicadas.incrementar()
+
+    def entradas(self):
+        """Cópia de (seq, frame, sala) do buffer em memória (chamar com o lock)."""
+        return list(self._entradas)
+
+    def frames_desde(self, seq=0, salas=None, minimos=None):
+        """Frames com número de sequência maior que `seq`, do mais antigo ao mais novo.
+
+        Com `salas`, apenas os destinados a essas salas; `minimos` (sala → seq)
+        esconde de uma sala o que veio até aquele seq.
+        """
+        frames = []
+        for entrada_seq, frame, sala in reversed(self._entradas):
+            if entrada_seq <= seq:
+                break
+            if (salas is None or sala in salas) and (not minimos or entrada_seq > minimos.get(sala, 0)):
+                frames.append(frame)
+        frames.reverse()
+        return frames
+
+    def _frames_do_log(self, desde_seq, ate_seq, salas=None):
+        """Frames de desde_seq (exclusive) a ate_seq (exclusive) lidos do log, limitados a max_bytes.
+
+        Retorna (frames, último seq que ficou de fora ou desde_seq): o que a
+        retenção do log já apagou ou o limite de bytes cortou. Lê o disco sem
+        o lock. Mensagens diretas nunca vão para o log, então os `minimos` de
+        inscrever() não se aplicam.
+        """
+        frames = deque()
+        total = 0
+        fora_ate = None
+        for seq, _, _, texto, sala in self.log.ler(desde_seq):
+            if seq >= ate_seq:
+                break
+            if fora_ate is None:
+                fora_ate = seq - 1  # Antes do primeiro registro disponível
+            if salas is not None and (sala or SALA_PADRAO) not in salas:
+                continue
+            frame = encode_mensagem(seq, texto)
+            frames.append((seq, frame))
+            total += len(frame)
+            while total > self.max_bytes:
+                fora_ate, descartado = frames.popleft()
+                total -= len(descartado)
+        if fora_ate is None:
+            fora_ate = ate_seq - 1  # Nada no log: tudo ficou de fora
+        return [frame for _, frame in frames], fora_ate
+
+    def _resolver_desde(self, desde_seq, epoca):
+        if epoca is not None and epoca != self.epoca:
+            _resumes_outra_epoca.incrementar()
+            return 0
+        if desde_seq > self.ultimo_seq:
+            _resumes_a_frente.incrementar()
+            return 0
+        return desde_seq
+
+    def inscrever(self, handler, registro, desde_seq=0, salas=None, indice_salas=None, informar_seq=False,
+                  minimos=None, epoca=None):
+        """Registra o handler e reenvia o histórico posterior a `desde_seq` em uma única escrita.
+
+        Com `salas` e `indice_salas` (core.rooms.RoomRegistry), reenvia apenas
+        as mensagens dessas salas e inscreve o handler em cada uma delas;
+        `minimos` como em frames_desde (mensagens diretas de um dono anterior).
+        A parte em memória é reunida e agendada (em_ordem) sob o mesmo lock de
+        publicar(): nenhuma mensagem é perdida ou duplicada entre a reexibição
+        e o tráfego ao vivo, e nenhuma chega fora de ordem.
+        O que já saiu da memória é lido do log antes, sem o lock, para uma
+        onda de reconexões não travar os broadcasts durante a leitura do disco.
+        O que não puder ser reexibido é informado com '__LACUNA__:<de>,<até>'.
+
+        Um `desde_seq` de outra `epoca` vem de antes de um reinício sem log (a
+        numeração recomeçou): o cliente recebe tudo o que houver. Clientes que
+        não informam a época só são reconhecidos assim quando o seq deles está
+        acima do último seq daqui. Com `informar_seq`, o reenvio começa por
+        '__SEQ__:<último seq>,<época>' para o cliente descartar a marca antiga
+        antes de conferir os frames.
+        """
+        inicio = time.perf_counter_ns()
+        desde_seq = self._resolver_desde(desde_seq, epoca)
+        lacunas = []
+        do_log = []
+        coberto = desde_seq  # Tudo até aqui já foi ou será reenviado
+        primeiro = self.primeiro_seq  # Sem o lock: só define até onde ler o disco
+        if desde_seq and desde_seq + 1 < primeiro and self.log:
+            # Reconexão com lacuna maior que o buffer em memória: completa a partir do disco
+            do_log, fora_ate = self._frames_do_log(desde_seq, primeiro, salas)
+            if fora_ate > desde_seq:
+                lacunas.append((desde_seq + 1, fora_ate))
+            coberto = primeiro - 1
+
+        with self.lock:
+            if desde_seq and coberto + 1 < self.primeiro_seq:
+                # Saiu da memória sem estar no log (sem log, ou durante a leitura acima)
+                lacunas.append((coberto + 1, self.primeiro_seq - 1))
+            frames = do_log + self.frames_desde(coberto, salas, minimos)
+            reenviadas = len(frames)
+            avisos = [encode_texto(montar_comando(RESPOSTA_LACUNA, f"{de},{ate}"), TIPO_CONTROLE)
+                      for de, ate in lacunas]
+            if informar_seq:
+                marca = montar_marca(self.ultimo_seq, self.epoca)
+                avisos.insert(0, encode_texto(montar_comando(RESPOSTA_SEQ, marca), TIPO_CONTROLE))
+            frames = avisos + frames
+            if frames:
+                self.em_ordem(transmitir, (handler,), b"".join(frames))
+            registro.append(handler)
+            if indice_salas is not None:
+                for sala in salas:
+                    indice_salas.entrar(sala, handler)
+        self.despachar()
+        _tempo_inscricao.observar_ns(time.perf_counter_ns() - inicio)
+        _reenviadas.incrementar(reenviadas)
+        _lacunas.incrementar(len(lacunas))
+        return reenviadas
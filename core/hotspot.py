@@ -1,19 +1,164 @@
+# core/hotspot.py
+"""Criação do hotspot Wi-Fi do host e o provisionamento completo de um host novo.
+
+O rádio é configurado por um backend plugável: BackendNmcli (NetworkManager,
+o padrão; P2P_CHAT_NMCLI troca o executável) ou BackendFalso, que só simula
+os comandos e serve para testes e máquinas sem NetworkManager
+(P2P_CHAT_HOTSPOT_BACKEND=falso).
+
+ProvisionamentoHost executa a configuração do rádio e a subida dos servidores
+em paralelo, fora da thread da interface: os servidores escutam em 0.0.0.0,
+então não precisam esperar o hotspot existir. O progresso de cada etapa e o
+tempo até o host ficar pronto chegam por callbacks (a janela os transforma
+em sinais Qt).
+"""
+import os
 import subprocess
+import threading
+import time
+from core.metrics import metricas
+from core.netinfo import info_rede
+from core import logs
+
+NMCLI = os.environ.get("P2P_CHAT_NMCLI", "nmcli")
+BACKEND_PADRAO = os.environ.get("P2P_CHAT_HOTSPOT_BACKEND", "nmcli")
+ATRASO_FALSO = float(os.environ.get("P2P_CHAT_HOTSPOT_ATRASO_FALSO", 1.5))  # Duração simulada de cada comando
+
+ETAPA_RADIO = "rádio"
+
+_tempo_pronto = metricas.histograma("tempo.hotspot_pronto")
+_tempo_radio = metricas.histograma("tempo.hotspot_radio")
+
+
+class BackendNmcli:
+    """Hotspot pelo NetworkManager."""
+    nome = "nmcli"
+
+    def __init__(self, executavel=None):
+        self.executavel = executavel or NMCLI
+
+    def interfaces_wifi(self):
+        return info_rede.interfaces_wifi()
+
+    def desconectar(self, interface):
+        subprocess.run([self.executavel, "dev", "disconnect", interface], capture_output=True)
+
+    def criar_hotspot(self, interface, ssid, senha):
+        try:
+            subprocess.run([self.executavel, "dev", "wifi", "hotspot", "ifname", interface,
+                            "ssid", ssid, "password", senha], check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            raise OSError(f"nmcli falhou ({e.returncode}): {(e.stderr or '').strip()}") from e
+
+
+class BackendFalso:
+    """Substituto do nmcli: registra os comandos e espera `atraso` segundos em cada um."""
+    nome = "falso"
+
+    def __init__(self, atraso=None, falhar=False, interfaces=("wlan0",)):
+        self.atraso = ATRASO_FALSO if atraso is None else atraso
+        self.falhar = falhar
+        self.interfaces = list(interfaces)
+        self.comandos = []
+
+    def interfaces_wifi(self):
+        return list(self.interfaces)
+
+    def desconectar(self, interface):
+        self.comandos.append(("dev", "disconnect", interface))
+        time.sleep(self.atraso)
+
+    def criar_hotspot(self, interface, ssid, senha):
+        self.comandos.append(("dev", "wifi", "hotspot", "ifname", interface, "ssid", ssid))
+        time.sleep(self.atraso)
+        if self.falhar:
+            raise OSError("hotspot simulado falhou")
+
+
+BACKENDS = {BackendNmcli.nome: BackendNmcli, BackendFalso.nome: BackendFalso}
+
+
+def criar_backend(nome=None):
+    return BACKENDS[nome or BACKEND_PADRAO]()
+
+
+def detectar_interfaces_wifi(backend=None):
+    # /sys/class/net em cache no backend nmcli; só recorre ao nmcli onde o sysfs não existe
+    return (backend or criar_backend()).interfaces_wifi()
+
+def desconectar_interface(interface, backend=None):
+    (backend or criar_backend()).desconectar(interface)
+
+def criar_hotspot(interface, ssid, senha, backend=None):
+    backend = backend or criar_backend()
+    backend.desconectar(interface)
+    backend.criar_hotspot(interface, ssid, senha)
+
+
+class ProvisionamentoHost:
+    """Sobe um host: hotspot e servidores em paralelo, em threads próprias.
+
+    `servidores` é uma lista de (nome, função); cada função retorna quando o
+    servidor está escutando ou levanta uma exceção. `ao_progredir(texto)` e
+    `ao_concluir(ok, texto)` são chamados das threads do provisionamento.
+    """
+
+    def __init__(self, interface, ssid, senha, servidores=(), backend=None, ao_progredir=None, ao_concluir=None):
+        self.interface = interface
+        self.ssid = ssid
+        self.senha = senha
+        self.servidores = list(servidores)
+        self.backend = backend or criar_backend()
+        self.ao_progredir = ao_progredir or (lambda texto: None)
+        self.ao_concluir = ao_concluir or (lambda ok, texto: None)
+        self.duracoes = {}  # etapa → segundos
+        self.erros = {}     # etapa → mensagem
+        self.tempo_pronto = None
+
+    def start(self):
+        self._inicio = time.perf_counter()
+        threading.Thread(target=self._executar, name="provisionamento", daemon=True).start()
+
+    def _progresso(self, texto):
+        logs.info(f"[Hotspot] {texto}")
+        self.ao_progredir(texto)
+
+    def _etapa(self, nome, funcao):
+        inicio = time.perf_counter()
+        try:
+            funcao()
+        except Exception as e:
+            self.erros[nome] = str(e)
+            self._progresso(f"Falha em {nome}: {e}")
+        else:
+            self._progresso(f"Etapa '{nome}' concluída em {time.perf_counter() - inicio:.2f}s")
+        finally:
+            self.duracoes[nome] = time.perf_counter() - inicio
+
+    def _radio(self):
+        self._progresso(f"Desconectando {self.interface}...")
+        self.backend.desconectar(self.interface)
+        self._progresso(f"Criando a rede '{self.ssid}' ({self.backend.nome})...")
+        self.backend.criar_hotspot(self.interface, self.ssid, self.senha)
+
+    def _executar(self):
+        etapas = [(ETAPA_RADIO, self._radio)] + self.servidores
+        threads = [threading.Thread(target=self._etapa, args=etapa, name=f"provisionamento-{etapa[0]}", daemon=True)
+                   for etapa in etapas]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
 
-def detectar_interfaces_wifi():
-    result = subprocess.run(["nmcli", "-t", "-f", "DEVICE,TYPE,STATE", "device"],
-                             capture_output=True, text=True)
-    interfaces = []
-    for linha in result.stdout.splitlines():
-        partes = linha.split(":")
-        if len(partes) >= 3 and partes[1] == "wifi":
-            interfaces.append(partes[0])
-    return interfaces
-
-def desconectar_interface(interface):
-    subprocess.run(["nmcli", "dev", "disconnect", interface])
-
-def criar_hotspot(interface, ssid, senha):
-    desconectar_interface(interface)
-    subprocess.run(["nmcli", "dev", "wifi", "hotspot", "ifname", interface,
-                    "ssid", ssid, "password", senha], check=True)
+        self.tempo_pronto = time.perf_counter() - self._inicio
+        _tempo_pronto.observar_ns(int(self.tempo_pronto * 1e9))
+        if ETAPA_RADIO in self.duracoes:
+            _tempo_radio.observar_ns(int(self.duracoes[ETAPA_RADIO] * 1e9))
+        detalhes = ", ".join(f"{nome} {duracao:.2f}s" for nome, duracao in self.duracoes.items())
+        if self.erros:
+            texto = "; ".join(f"{nome}: {erro}" for nome, erro in self.erros.items())
+            logs.aviso(f"[Hotspot] Provisionamento com falhas em {self.tempo_pronto:.2f}s ({detalhes}): {texto}")
+            self.ao_concluir(False, texto)
+        else:
+            logs.info(f"[Hotspot] Host pronto em {self.tempo_pronto:.2f}s ({detalhes})")
+            self.ao_concluir(True, f"SSID: {self.ssid}\nSenha: {self.senha}\nPronto em {self.tempo_pronto:.1f}s")
@@ -0,0 +1,78 @@
+# core/logs.py
+"""Mensagens de diagnóstico dos servidores, com nível e amostragem.
+
+Substitui os `print` diretos no caminho das mensagens: o texto só é montado e
+impresso quando o nível está habilitado, e os eventos por mensagem passam por
+um Amostrador (1 a cada N). P2P_CHAT_LOG_NIVEL=desligado silencia tudo.
+"""
+import os
+import threading
+
+DEBUG = 10      # Eventos por mensagem (amostrados)
+INFO = 20       # Conexões, desconexões e início/fim dos servidores
+AVISO = 30      # Clientes despejados, comandos inesperados
+ERRO = 40
+DESLIGADO = 100
+
+NIVEIS = {"debug": DEBUG, "info": INFO, "aviso": AVISO, "erro": ERRO, "desligado": DESLIGADO}
+
+nivel_atual = NIVEIS.get(os.environ.get("P2P_CHAT_LOG_NIVEL", "info").lower(), INFO)
+AMOSTRAGEM = max(1, int(os.environ.get("P2P_CHAT_LOG_AMOSTRAGEM", 100)))
+
+
+def definir_nivel(nivel):
+    """Aceita a constante ou o nome ('debug', 'info', 'aviso', 'erro', 'desligado')."""
+    global nivel_atual
+    nivel_atual = NIVEIS[nivel.lower()] if isinstance(nivel, str) else nivel
+
+
+def habilitado(nivel):
+    return nivel >= nivel_atual
+
+
+def log(nivel, texto):
+    if nivel >= nivel_atual:
+        print(texto)
+
+
+def debug(texto):
+    log(DEBUG, texto)
+
+
+def info(texto):
+    log(INFO, texto)
+
+
+def aviso(texto):
+    log(AVISO, texto)
+
+
+def erro(texto):
+    log(ERRO, texto)
+
+
+class Amostrador:
+    """Deixa passar 1 a cada `a_cada` eventos (o primeiro sempre passa)."""
+
+    def __init__(self, a_cada=None):
+        self.a_cada = a_cada or AMOSTRAGEM
+        self._contagem = 0
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        with self._lock:
+            self._contagem += 1
+            return (self._contagem - 1) % self.a_cada == 0
+
+    def sufixo(self):
+        """Texto indicando quantos eventos a linha representa."""
+        return f" (1 a cada {self.a_cada})" if self.a_cada > 1 else ""
+
+
+def log_amostrado(amostrador, nivel, montar_texto):
+    """Registra o texto de montar_texto() se o nível estiver ativo e a amostra permitir.
+
+    O texto só é montado quando vai de fato ser impresso.
+    """
+    if nivel >= nivel_atual and amostrador.permitir():
+        print(montar_texto() + amostrador.sufixo())
@@ -0,0 +1,298 @@
+# core/messagelog.py
+"""Log persistente, somente de acréscimo, das mensagens do servidor de chat.
+
+As mensagens são gravadas em segmentos `<primeiro seq>.log` por uma thread
+própria, em lotes, fora do caminho do broadcast. A leitura (reexibição,
+exportação e recuperação após reinício) usa mmap.
+
+Formato de cada registro:
+    tamanho (4) | crc32 (4) | seq (8) | timestamp (8, double) | len remetente (2) | remetente | texto
+onde `tamanho` e `crc32` cobrem tudo o que vem depois deles. Mensagens fora da
+sala padrão (salas e mensagens diretas) marcam o bit mais alto de `tamanho` e
+trazem `len sala (2) | sala` logo após o remetente; registros antigos continuam
+legíveis.
+
+O log é opcional (P2P_CHAT_LOG=1 no servidor) e fica em ~/.p2p-com/log
+(P2P_CHAT_LOG_DIR). Mensagens diretas nunca são gravadas. Retenção: no máximo
+P2P_CHAT_LOG_MAX_SEGMENTOS segmentos de P2P_CHAT_LOG_SEGMENTO bytes (16 x 4 MiB),
+e segmentos sem escrita há mais de P2P_CHAT_LOG_DIAS dias (7) são apagados ao
+abrir o log e a cada rotação.
+"""
+import mmap
+import os
+import secrets
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+from core.metrics import metricas
+
+CABECALHO = struct.Struct("!II")       # tamanho, crc32
+CORPO = struct.Struct("!QdH")          # seq, timestamp, tamanho do remetente
+TAMANHO_SALA = struct.Struct("!H")
+COM_SALA = 0x80000000                  # Bit de `tamanho` que indica o campo de sala
+EXTENSAO = ".log"
+ARQUIVO_EPOCA = "epoca"  # Identificador da numeração deste log (core/history.py)
+
+DIRETORIO_PADRAO = os.environ.get(
+    "P2P_CHAT_LOG_DIR", os.path.join(os.path.expanduser("~"), ".p2p-com", "log"))
+TAMANHO_SEGMENTO = int(os.environ.get("P2P_CHAT_LOG_SEGMENTO", 4 * 1024 * 1024))
+MAX_SEGMENTOS = int(os.environ.get("P2P_CHAT_LOG_MAX_SEGMENTOS", 16))
+FSYNC = os.environ.get("P2P_CHAT_LOG_FSYNC", "0") == "1"
+DIAS_RETENCAO = float(os.environ.get("P2P_CHAT_LOG_DIAS", 7))
+
+_tempo_lote = metricas.histograma("tempo.log_lote")
+_registros_gravados = metricas.contador("log.registros_gravados")
+
+
+def _codificar(seq, timestamp, remetente, texto, sala=""):
+    remetente_bytes = remetente.encode('utf-8')
+    corpo = CORPO.pack(seq, timestamp, len(remetente_bytes)) + remetente_bytes
+    marca = 0
+    if sala:
+        sala_bytes = sala.encode('utf-8')
+        corpo += TAMANHO_SALA.pack(len(sala_bytes)) + sala_bytes
+        marca = COM_SALA
+    corpo += texto.encode('utf-8')
+    return CABECALHO.pack(len(corpo) | marca, zlib.crc32(corpo)) + corpo
+
+
+def _ler_registros(dados, inicio=0):
+    """Gera (fim do registro, seq, timestamp, remetente, texto, sala) até o primeiro registro inválido.
+
+    `sala` é vazia para mensagens da sala padrão.
+    """
+    pos = inicio
+    total = len(dados)
+    while pos + CABECALHO.size <= total:
+        tamanho, crc = CABECALHO.unpack_from(dados, pos)
+        com_sala = tamanho & COM_SALA
+        tamanho &= ~COM_SALA
+        corpo_ini = pos + CABECALHO.size
+        corpo_fim = corpo_ini + tamanho
+        if tamanho < CORPO.size or corpo_fim > total:
+            return  # Registro incompleto (escrita interrompida)
+        corpo = dados[corpo_ini:corpo_fim]
+        if zlib.crc32(corpo) != crc:
+            return
+        seq, timestamp, len_remetente = CORPO.unpack_from(corpo)
+        inicio_texto = CORPO.size + len_remetente
+        remetente = corpo[CORPO.size:inicio_texto].decode('utf-8', errors='replace')
+        sala = ""
+        if com_sala:
+            (len_sala,) = TAMANHO_SALA.unpack_from(corpo, inicio_texto)
+            inicio_sala = inicio_texto + TAMANHO_SALA.size
+            inicio_texto = inicio_sala + len_sala
+            sala = corpo[inicio_sala:inicio_texto].decode('utf-8', errors='replace')
+        texto = corpo[inicio_texto:].decode('utf-8', errors='replace')
+        pos = corpo_fim
+        yield pos, seq, timestamp, remetente, texto, sala
+
+
+class MessageLog:
+    """Log de mensagens em segmentos com rotação e retenção."""
+
+    def __init__(self, diretorio=DIRETORIO_PADRAO, tamanho_segmento=TAMANHO_SEGMENTO,
+                 max_segmentos=MAX_SEGMENTOS, fsync=FSYNC, dias_retencao=DIAS_RETENCAO):
+        self.diretorio = diretorio
+        self.tamanho_segmento = tamanho_segmento
+        self.max_segmentos = max(1, max_segmentos)
+        self.dias_retencao = dias_retencao
+        self.fsync = fsync
+        os.makedirs(diretorio, exist_ok=True)
+
+        self._pendentes = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._fechado = False
+        self._arquivo = None
+        self._tamanho_atual = 0
+        self.ultimo_seq = 0
+        self.registros_enfileirados = 0
+        self.registros_gravados = 0
+        self.lotes_gravados = 0
+
+        self.epoca = self._ler_epoca()
+        self._aplicar_retencao()
+        self._recuperar()
+        self._thread = threading.Thread(target=self._gravar, name="chat-log", daemon=True)
+        self._thread.start()
+
+    def _ler_epoca(self):
+        """Época gravada no diretório do log; criada junto com o log (apagar o diretório a renova)."""
+        caminho = os.path.join(self.diretorio, ARQUIVO_EPOCA)
+        try:
+            with open(caminho, encoding="utf-8") as f:
+                epoca = f.read().strip()
+            if epoca:
+                return epoca
+        except FileNotFoundError:
+            pass
+        epoca = secrets.token_hex(8)
+        with open(caminho, "w", encoding="utf-8") as f:
+            f.write(epoca)
+        return epoca
+
+    # --- Segmentos ---
+
+    def segmentos(self):
+        """Caminhos dos segmentos em ordem de sequência."""
+        nomes = sorted(n for n in os.listdir(self.diretorio) if n.endswith(EXTENSAO))
+        return [os.path.join(self.diretorio, n) for n in nomes]
+
+    @staticmethod
+    def _primeiro_seq(caminho):
+        return int(os.path.basename(caminho)[:-len(EXTENSAO)])
+
+    def _recuperar(self):
+        """Descobre o último seq gravado e descarta um final de segmento corrompido."""
+        segmentos = self.segmentos()
+        if not segmentos:
+            return
+        ultimo = segmentos[-1]
+        fim_valido = 0
+        tamanho = os.path.getsize(ultimo)
+        if tamanho:
+            with open(ultimo, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as dados:
+                for fim_valido, seq, *_ in _ler_registros(dados):
+                    self.ultimo_seq = seq
+        if fim_valido < tamanho:
+            print(f"[Log] Descartando {tamanho - fim_valido} bytes incompletos de {ultimo}")
+            os.truncate(ultimo, fim_valido)
+        if not fim_valido:
+            # Último segmento sem registros válidos (ex.: criado na rotação que apagou os
+            # anteriores pela retenção): o nome dele diz qual seq viria a seguir
+            self.ultimo_seq = self._primeiro_seq(ultimo) - 1
+        self._arquivo = open(ultimo, "ab")
+        self._tamanho_atual = fim_valido
+
+    def _rotacionar(self, proximo_seq):
+        if self._arquivo:
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+            self._arquivo.close()
+        caminho = os.path.join(self.diretorio, f"{proximo_seq:020d}{EXTENSAO}")
+        self._arquivo = open(caminho, "ab")
+        self._tamanho_atual = 0
+
+        self._aplicar_retencao()
+
+    def _aplicar_retencao(self):
+        """Mantém apenas os segmentos mais recentes e apaga os parados há mais de dias_retencao."""
+        segmentos = self.segmentos()
+        antigos = segmentos[:-self.max_segmentos]
+        limite = time.time() - self.dias_retencao * 86400
+        # O segmento mais recente é o que recebe as escritas; nunca sai por idade
+        for caminho in segmentos[len(antigos):-1]:
+            try:
+                if os.path.getmtime(caminho) < limite:
+                    antigos.append(caminho)
+            except OSError:
+                pass
+        for antigo in antigos:
+            try:
+                os.remove(antigo)
+            except OSError as e:
+                print(f"[Log] Erro ao remover segmento {antigo}: {e}")
+
+    # --- Escrita ---
+
+    def append(self, seq, timestamp, remetente, texto, sala=""):
+        """Enfileira um registro; a gravação acontece na thread do log."""
+        with self._cond:
+            if self._fechado:
+                return
+            self._pendentes.append((seq, timestamp, remetente, texto, sala))
+            self.registros_enfileirados += 1
+            self.ultimo_seq = max(self.ultimo_seq, seq)
+            if len(self._pendentes) == 1:
+                self._cond.notify()
+
+    def _gravar(self):
+        while True:
+            with self._cond:
+                while not self._pendentes and not self._fechado:
+                    self._cond.wait()
+                if not self._pendentes and self._fechado:
+                    return
+                lote, self._pendentes = self._pendentes, deque()
+            try:
+                with _tempo_lote.medir():
+                    self._gravar_lote(lote)
+                _registros_gravados.incrementar(len(lote))
+            except Exception as e:
+                print(f"[Log] Erro ao gravar {len(lote)} registros: {e}")
+            with self._cond:
+                self._cond.notify_all()  # Acorda quem espera em flush()
+
+    def _gravar_lote(self, lote):
+        # Um único write por segmento tocado pelo lote
+        blocos = []
+        tamanho_blocos = 0
+        for seq, timestamp, remetente, texto, sala in lote:
+            if self._arquivo is None or self._tamanho_atual + tamanho_blocos >= self.tamanho_segmento:
+                self._escrever(blocos, tamanho_blocos)
+                blocos, tamanho_blocos = [], 0
+                self._rotacionar(seq)
+            registro = _codificar(seq, timestamp, remetente, texto, sala)
+            blocos.append(registro)
+            tamanho_blocos += len(registro)
+        self._escrever(blocos, tamanho_blocos)
+        self._arquivo.flush()
+        if self.fsync:
+            os.fsync(self._arquivo.fileno())
+        self.registros_gravados += len(lote)
+        self.lotes_gravados += 1
+
+    def _escrever(self, blocos, tamanho):
+        if blocos:
+            self._arquivo.write(b"".join(blocos))
+            self._tamanho_atual += tamanho
+
+    def flush(self, timeout=5.0):
+        """Aguarda a gravação de tudo que já foi enfileirado."""
+        with self._cond:
+            alvo = self.registros_enfileirados
+            self._cond.wait_for(lambda: self.registros_gravados >= alvo, timeout)
+
+    def close(self):
+        with self._cond:
+            self._fechado = True
+            self._cond.notify_all()
+        self._thread.join()
+        if self._arquivo:
+            self._arquivo.flush()
+            os.fsync(self._arquivo.fileno())
+            self._arquivo.close()
+            self._arquivo = None
+
+    # --- Leitura ---
+
+    def ler(self, desde_seq=0):
+        """Gera (seq, timestamp, remetente, texto, sala) com seq > desde_seq, lendo via mmap."""
+        segmentos = self.segmentos()
+        for i, caminho in enumerate(segmentos):
+            # Pula segmentos que terminam antes de desde_seq
+            if i + 1 < len(segmentos) and self._primeiro_seq(segmentos[i + 1]) <= desde_seq + 1:
+                continue
+            try:
+                with open(caminho, "rb") as f:
+                    if not os.fstat(f.fileno()).st_size:
+                        continue
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as dados:
+                        for _, seq, timestamp, remetente, texto, sala in _ler_registros(dados):
+                            if seq > desde_seq:
+                                yield seq, timestamp, remetente, texto, sala
+            except FileNotFoundError:
+                continue  # Removido pela retenção durante a leitura
+
+    def exportar(self, caminho_saida, desde_seq=0):
+        """Exporta o log como texto legível. Retorna a quantidade de mensagens."""
+        total = 0
+        with open(caminho_saida, "w", encoding="utf-8") as saida:
+            for seq, timestamp, _, texto, _ in self.ler(desde_seq):
+                quando = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+                saida.write(f"[{quando}] #{seq} {texto}\n")
+                total += 1
+        return total
@@ -0,0 +1,246 @@
+# core/metrics.py
+"""Métricas do servidor: contadores, medidores e histogramas de latência.
+
+Os contadores e histogramas são atualizados no caminho quente (recepção,
+broadcast, envio), então cada atualização é só uma soma ou um índice de
+bucket, sob um lock próprio da métrica. A leitura fica a cargo de quem consulta: um endpoint HTTP local
+(P2P_CHAT_METRICAS_PORTA) e/ou um despejo periódico no terminal
+(P2P_CHAT_METRICAS_INTERVALO, em segundos).
+"""
+import json
+import os
+import selectors
+import socket
+import threading
+import time
+
+PORTA_METRICAS = int(os.environ.get("P2P_CHAT_METRICAS_PORTA", 0))        # 0 = sem endpoint
+INTERVALO_DESPEJO = float(os.environ.get("P2P_CHAT_METRICAS_INTERVALO", 0))  # 0 = sem despejo
+
+_NUM_BUCKETS = 32  # Bucket i: até 2**i microssegundos (o último acumula o restante)
+
+
+class Contador:
+    """Valor que só cresce (ex.: mensagens recebidas)."""
+    __slots__ = ("valor", "_lock")
+
+    def __init__(self):
+        self.valor = 0
+        self._lock = threading.Lock()
+
+    def incrementar(self, n=1):
+        # `+=` em um atributo são vários bytecodes (ler, somar, gravar): sem o lock
+        # duas threads podem ler o mesmo valor e um dos incrementos se perde
+        with self._lock:
+            self.valor += n
+
+    def ler(self):
+        return self.valor
+
+
+class Medidor:
+    """Valor instantâneo (ex.: clientes conectados), definido ou calculado na leitura."""
+    __slots__ = ("valor", "funcao")
+
+    def __init__(self, funcao=None):
+        self.valor = 0
+        self.funcao = funcao
+
+    def definir(self, valor):
+        self.valor = valor
+
+    def ler(self):
+        if self.funcao is not None:
+            try:
+                return self.funcao()
+            except Exception:
+                return None
+        return self.valor
+
+
+class Histograma:
+    """Distribuição de durações em buckets exponenciais (potências de 2 em µs)."""
+
+    def __init__(self):
+        self._buckets = [0] * _NUM_BUCKETS
+        self.total = 0
+        self.soma_ns = 0
+        self.max_ns = 0
+        self._lock = threading.Lock()
+
+    def observar_ns(self, duracao_ns):
+        indice = min(_NUM_BUCKETS - 1, (duracao_ns // 1000).bit_length())
+        with self._lock:
+            self._buckets[indice] += 1
+            self.total += 1
+            self.soma_ns += duracao_ns
+            if duracao_ns > self.max_ns:
+                self.max_ns = duracao_ns
+
+    def medir(self):
+        """Gerenciador de contexto que observa a duração do bloco."""
+        return _Cronometro(self)
+
+    def percentil(self, fracao):
+        """Limite superior (em ms) do bucket que contém o percentil."""
+        with self._lock:
+            buckets, total, maximo = list(self._buckets), self.total, self.max_ns / 1e6
+        if not total:
+            return 0.0
+        alvo = fracao * total
+        acumulado = 0
+        for i, quantidade in enumerate(buckets):
+            acumulado += quantidade
+            if acumulado >= alvo:
+                return round(min((2 ** i) / 1000, maximo), 3)
+        return round(maximo, 3)
+
+    def ler(self):
+        total = self.total
+        return {
+            "total": total,
+            "media_ms": round(self.soma_ns / total / 1e6, 3) if total else 0.0,
+            "p50_ms": self.percentil(0.50),
+            "p99_ms": self.percentil(0.99),
+            "p999_ms": self.percentil(0.999),
+            "max_ms": round(self.max_ns / 1e6, 3),
+        }
+
+
+class _Cronometro:
+    __slots__ = ("histograma", "inicio")
+
+    def __init__(self, histograma):
+        self.histograma = histograma
+
+    def __enter__(self):
+        self.inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.histograma.observar_ns(time.perf_counter_ns() - self.inicio)
+        return False
+
+
+class MetricsRegistry:
+    """Registro de métricas por nome; pedir a mesma métrica duas vezes devolve a mesma instância."""
+
+    def __init__(self):
+        self._metricas = {}
+        self._lock = threading.Lock()
+        self.inicio = time.time()
+
+    def _obter(self, nome, classe, *args):
+        with self._lock:
+            metrica = self._metricas.get(nome)
+            if metrica is None:
+                metrica = self._metricas[nome] = classe(*args)
+            elif not isinstance(metrica, classe):
+                raise TypeError(f"Métrica '{nome}' já registrada como {type(metrica).__name__}")
+            return metrica
+
+    def contador(self, nome):
+        return self._obter(nome, Contador)
+
+    def medidor(self, nome, funcao=None):
+        medidor = self._obter(nome, Medidor)
+        if funcao is not None:
+            medidor.funcao = funcao
+        return medidor
+
+    def histograma(self, nome):
+        return self._obter(nome, Histograma)
+
+    def snapshot(self):
+        """Dicionário com o valor atual de todas as métricas."""
+        with self._lock:
+            metricas = sorted(self._metricas.items())
+        resultado = {"tempo_ativo_s": round(time.time() - self.inicio, 1)}
+        for nome, metrica in metricas:
+            resultado[nome] = metrica.ler()
+        return resultado
+
+    def json(self):
+        return json.dumps(self.snapshot(), indent=2, ensure_ascii=False)
+
+
+class MetricsServer:
+    """Endpoint HTTP mínimo que responde a qualquer requisição com o JSON das métricas.
+
+    Escuta apenas em 127.0.0.1 por padrão: `curl http://127.0.0.1:<porta>/`.
+    """
+
+    def __init__(self, registro, host="127.0.0.1", port=PORTA_METRICAS):
+        self.registro = registro
+        self.host = host
+        self.port = port
+        self.server_socket = None
+        self._thread = None
+
+    def start(self):
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(8)
+        self.port = self.server_socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._atender, name="metricas", daemon=True)
+        self._thread.start()
+        print(f"[Métricas] Endpoint em http://{self.host}:{self.port}/")
+
+    def _atender(self):
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.server_socket, selectors.EVENT_READ)
+            while self.server_socket.fileno() != -1:
+                if not selector.select(timeout=1.0):
+                    continue
+                try:
+                    conn, _ = self.server_socket.accept()
+                except OSError:
+                    continue
+                with conn:
+                    try:
+                        conn.settimeout(1.0)
+                        conn.recv(4096)  # Requisição ignorada: só existe um recurso
+                        corpo = self.registro.json().encode("utf-8")
+                        conn.sendall(b"HTTP/1.0 200 OK\r\nContent-Type: application/json\r\n"
+                                     b"Content-Length: " + str(len(corpo)).encode() + b"\r\n\r\n" + corpo)
+                    except OSError:
+                        pass
+
+    def stop(self):
+        if self.server_socket:
+            self.server_socket.close()
+
+
+def iniciar_despejo_periodico(registro, intervalo, destino=print):
+    """Escreve o snapshot das métricas a cada `intervalo` segundos (thread daemon)."""
+    def despejar():
+        while True:
+            time.sleep(intervalo)
+            destino(f"[Métricas] {json.dumps(registro.snapshot(), ensure_ascii=False)}")
+
+    threading.Thread(target=despejar, name="metricas-despejo", daemon=True).start()
+
+
+# Registro padrão do processo
+metricas = MetricsRegistry()
+
+_exposicao_iniciada = False
+_exposicao_lock = threading.Lock()
+
+def expor_metricas(porta=None, intervalo=None):
+    """Inicia (uma vez por processo) o endpoint e/ou o despejo periódico configurados."""
+    global _exposicao_iniciada
+    porta = PORTA_METRICAS if porta is None else porta
+    intervalo = INTERVALO_DESPEJO if intervalo is None else intervalo
+    with _exposicao_lock:
+        if _exposicao_iniciada:
+            return
+        _exposicao_iniciada = True
+    if porta:
+        try:
+            MetricsServer(metricas, port=porta).start()
+        except OSError as e:
+            print(f"[Métricas] Não foi possível abrir o endpoint na porta {porta}: {e}")
+    if intervalo:
+        iniciar_despejo_periodico(metricas, intervalo)
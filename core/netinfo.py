@@ -0,0 +1,196 @@
+# core/netinfo.py
+"""Informações de rede (gateway padrão e interfaces Wi-Fi) sem criar processos.
+
+Antes cada consulta executava `ip route` ou `nmcli`, e entrar num chat fazia
+vários forks em série. Aqui as rotas vêm de /proc/net/route e as interfaces de
+/sys/class/net, lidas no próprio processo, e o resultado fica em cache.
+
+O cache é invalidado por um socket netlink (NETLINK_ROUTE) inscrito nos grupos
+de links, endereços e rotas IPv4: cada consulta só drena esse socket sem
+bloquear, e qualquer notificação do kernel descarta o cache. Onde netlink não
+existe, o cache expira após TTL_CACHE segundos; onde /proc e /sys não existem,
+volta-se aos comandos `ip route` e `nmcli`.
+"""
+import os
+import socket
+import struct
+import subprocess
+import threading
+import time
+from core.metrics import metricas
+from core import logs
+
+ARQUIVO_ROTAS = "/proc/net/route"
+DIRETORIO_INTERFACES = "/sys/class/net"
+TTL_CACHE = float(os.environ.get("P2P_CHAT_REDE_TTL", 2.0))  # Só sem netlink
+
+# Flags de /proc/net/route (linux/route.h) e grupos netlink (linux/rtnetlink.h)
+RTF_UP = 0x0001
+RTF_GATEWAY = 0x0002
+RTMGRP_LINK = 0x01
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+
+_consultas = metricas.contador("rede.consultas")
+_leituras = metricas.contador("rede.leituras")
+_processos = metricas.contador("rede.processos")
+
+
+class Rota:
+    __slots__ = ("interface", "destino", "gateway", "mascara", "flags", "metrica")
+
+    def __init__(self, interface, destino, gateway, mascara, flags, metrica):
+        self.interface = interface
+        self.destino = destino
+        self.gateway = gateway
+        self.mascara = mascara
+        self.flags = flags
+        self.metrica = metrica
+
+    @property
+    def padrao(self):
+        return (self.destino == "0.0.0.0" and self.mascara == "0.0.0.0"
+                and self.flags & (RTF_UP | RTF_GATEWAY) == RTF_UP | RTF_GATEWAY)
+
+
+def _ip_de_hex(texto):
+    # /proc/net/route mostra o endereço (em ordem de rede) como um inteiro na ordem do host
+    return socket.inet_ntoa(struct.pack("=I", int(texto, 16)))
+
+
+def ler_rotas(caminho=ARQUIVO_ROTAS):
+    """Rotas IPv4 de /proc/net/route. Levanta OSError se o arquivo não existe."""
+    rotas = []
+    with open(caminho) as arquivo:
+        next(arquivo, None)  # Cabeçalho
+        for linha in arquivo:
+            campos = linha.split()
+            if len(campos) < 8:
+                continue
+            rotas.append(Rota(campos[0], _ip_de_hex(campos[1]), _ip_de_hex(campos[2]), _ip_de_hex(campos[7]),
+                              int(campos[3], 16), int(campos[6])))
+    return rotas
+
+
+def ler_interfaces_wifi(diretorio=DIRETORIO_INTERFACES):
+    """Interfaces com extensões sem fio em /sys/class/net. Levanta OSError se o diretório não existe."""
+    return sorted(nome for nome in os.listdir(diretorio)
+                  if os.path.exists(os.path.join(diretorio, nome, "wireless"))
+                  or os.path.exists(os.path.join(diretorio, nome, "phy80211")))
+
+
+def _gateway_via_ip_route():
+    _processos.incrementar()
+    result = subprocess.run(["ip", "route"], capture_output=True, text=True)
+    for line in result.stdout.splitlines():
+        if line.startswith("default"):
+            partes = line.split()
+            if "via" in partes:
+                return partes[partes.index("via") + 1], partes[partes.index("dev") + 1] if "dev" in partes else None
+    return None, None
+
+
+def _interfaces_via_nmcli():
+    _processos.incrementar()
+    result = subprocess.run(["nmcli", "-t", "-f", "DEVICE,TYPE,STATE", "device"],
+                            capture_output=True, text=True)
+    interfaces = []
+    for linha in result.stdout.splitlines():
+        partes = linha.split(":")
+        if len(partes) >= 3 and partes[1] == "wifi":
+            interfaces.append(partes[0])
+    return interfaces
+
+
+def _abrir_netlink():
+    """Socket netlink não bloqueante que recebe as mudanças de links, endereços e rotas (ou None)."""
+    if not hasattr(socket, "AF_NETLINK"):
+        return None
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE))
+        sock.setblocking(False)
+        return sock
+    except OSError as e:
+        logs.debug(f"[Rede] Netlink indisponível ({e}); cache expira a cada {TTL_CACHE}s")
+        return None
+
+
+class InfoRede:
+    """Cache das informações de rede, invalidado pelas notificações do kernel."""
+
+    def __init__(self, arquivo_rotas=ARQUIVO_ROTAS, diretorio_interfaces=DIRETORIO_INTERFACES, netlink=True):
+        self.arquivo_rotas = arquivo_rotas
+        self.diretorio_interfaces = diretorio_interfaces
+        self._lock = threading.Lock()
+        self._netlink = _abrir_netlink() if netlink else None
+        self._cache = {}
+        self._validade = 0.0  # Sem netlink: instante em que o cache expira
+
+    def invalidar(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _houve_mudanca(self):
+        """Drena o socket netlink; True se chegou alguma notificação (ou se o cache expirou)."""
+        if self._netlink is None:
+            return time.monotonic() >= self._validade
+        mudou = False
+        while True:
+            try:
+                if not self._netlink.recv(65536):
+                    return mudou
+                mudou = True
+            except (BlockingIOError, InterruptedError):
+                return mudou
+            except OSError:
+                return True  # ENOBUFS: notificações perdidas, o cache pode estar velho
+
+    def _obter(self, chave, ler):
+        _consultas.incrementar()
+        with self._lock:
+            if self._houve_mudanca():
+                self._cache.clear()
+                self._validade = time.monotonic() + TTL_CACHE
+            if chave not in self._cache:
+                _leituras.incrementar()
+                self._cache[chave] = ler()
+            return self._cache[chave]
+
+    def _ler_gateway(self):
+        try:
+            candidatas = [rota for rota in ler_rotas(self.arquivo_rotas) if rota.padrao]
+        except OSError:
+            return _gateway_via_ip_route()
+        if not candidatas:
+            return None, None
+        rota = min(candidatas, key=lambda r: r.metrica)
+        return rota.gateway, rota.interface
+
+    def _ler_interfaces_wifi(self):
+        try:
+            return ler_interfaces_wifi(self.diretorio_interfaces)
+        except OSError:
+            return _interfaces_via_nmcli()
+
+    def gateway_padrao(self):
+        """IP do gateway da rota padrão de menor métrica (o host do hotspot), ou None."""
+        return self._obter("gateway", self._ler_gateway)[0]
+
+    def interface_padrao(self):
+        """Interface da rota padrão, ou None."""
+        return self._obter("gateway", self._ler_gateway)[1]
+
+    def interfaces_wifi(self):
+        return list(self._obter("wifi", self._ler_interfaces_wifi))
+
+
+info_rede = InfoRede()
+
+
+def obter_gateway():
+    try:
+        return info_rede.gateway_padrao()
+    except Exception as e:
+        print(f"[ERRO] ao obter gateway: {e}")
+    return None
@@ -1,26 +1,45 @@
-import subprocess
 import socket
+from core.auth_token import MODO_AUTH, MODO_HMAC, PREFIXO_DESAFIO, servico_token
+from core.discovery import HostAnunciado, descobrir_hosts, ordenar_hosts
+from core.netinfo import obter_gateway  # Em cache, sem processos (core/netinfo.py)
 
-def obter_gateway():
-    try:
-        result = subprocess.run(["ip", "route"], capture_output=True, text=True)
-        for line in result.stdout.splitlines():
-            if line.startswith("default"):
-                partes = line.split()
-                if "via" in partes:
-                    return partes[partes.index("via") + 1]
-    except Exception as e:
-        print(f"[ERRO] ao obter gateway: {e}")
+def localizar_host(validar_token_func, modo=None):
+    """Descobre os hosts da rede e retorna o HostAnunciado autenticado menos carregado (ou None).
+
+    Sem respostas à descoberta (ex.: host antigo), tenta o gateway, como antes.
+    """
+    candidatos = ordenar_hosts(descobrir_hosts())
+    gateway = obter_gateway()
+    if gateway and not any(host.endereco == gateway for host in candidatos):
+        candidatos.append(HostAnunciado(gateway))
+    if not candidatos:
+        print("Nenhum host encontrado e gateway não encontrado.")
+        return None
+    for host in candidatos:
+        if autenticar_com_host(host.endereco, validar_token_func, host.porta_auth, modo):
+            print(f"Host encontrado: {host}")
+            return host
     return None
 
-def verificar_conexao_com_host(validar_token_func, porta=20556):
+def verificar_conexao_com_host(validar_token_func, porta=20556, modo=None):
     gateway = obter_gateway()
     if not gateway:
         print("Gateway não encontrado.")
         return False
+    return autenticar_com_host(gateway, validar_token_func, porta, modo)
 
+def autenticar_com_host(host, validar_token_func, porta=20556, modo=None, timeout=3):
+    """Faz o handshake de autenticação com o servidor em host:porta."""
     try:
-        with socket.create_connection((gateway, porta), timeout=3) as sock:
+        with socket.create_connection((host, porta), timeout=timeout) as sock:
+            if (modo or MODO_AUTH) == MODO_HMAC:
+                desafio = servico_token.gerar_desafio()
+                sock.sendall(f"{PREFIXO_DESAFIO}{desafio.hex()}".encode())
+                resposta = sock.recv(1024).decode().strip()
+                if not resposta.startswith(PREFIXO_DESAFIO):
+                    return False
+                return servico_token.validar_resposta(desafio, resposta[len(PREFIXO_DESAFIO):])
+
             token = sock.recv(1024).decode()
             return validar_token_func(token)
     except Exception as e:
@@ -0,0 +1,188 @@
+# core/outbound.py
+"""Fila de saída limitada por cliente, com contrapressão.
+
+Quem faz o broadcast apenas enfileira frames; cada conexão tem seu próprio
+escritor (thread no modo legado, o laço de eventos no modo orientado a eventos)
+que drena a fila. Assim um cliente lento não atrasa a entrega aos demais.
+No modo orientado a eventos o broadcast entrega o frame uma vez a cada laço,
+que o comprime e enfileira para as conexões dele na própria thread.
+"""
+import os
+import threading
+import time
+from collections import deque
+from core.metrics import metricas
+
+# Política aplicada quando a fila ultrapassa o limite alto
+POLITICA_DESCARTAR = "descartar"      # Descarta novos frames até a fila baixar do limite baixo
+POLITICA_DESCONECTAR = "desconectar"  # Desconecta o consumidor lento
+
+LIMITE_ALTO_PADRAO = int(os.environ.get("P2P_CHAT_FILA_LIMITE_ALTO", 1024 * 1024))
+LIMITE_BAIXO_PADRAO = int(os.environ.get("P2P_CHAT_FILA_LIMITE_BAIXO", 256 * 1024))
+POLITICA_PADRAO = os.environ.get("P2P_CHAT_FILA_POLITICA", POLITICA_DESCONECTAR)
+
+LOTE_MAXIMO = 256 * 1024  # Bytes retirados por vez pelo escritor
+IOV_MAXIMO = 512  # Buffers por chamada de sendmsg (abaixo do IOV_MAX do sistema)
+
+_frames_enfileirados = metricas.contador("saida.frames_enfileirados")
+_frames_descartados = metricas.contador("saida.frames_descartados")
+_clientes_despejados = metricas.contador("saida.clientes_despejados")
+_bytes_enviados = metricas.contador("saida.bytes_enviados")
+_chamadas_envio = metricas.contador("saida.chamadas_envio")
+_tempo_envio = metricas.histograma("tempo.envio")
+
+
+class OutboundQueue:
+    """Fila de frames prontos para envio a um único cliente."""
+
+    def __init__(self, limite_alto=None, limite_baixo=None, politica=None, ao_despejar=None,
+                 ao_ficar_pendente=None):
+        self.limite_alto = limite_alto or LIMITE_ALTO_PADRAO
+        self.limite_baixo = min(limite_baixo or LIMITE_BAIXO_PADRAO, self.limite_alto)
+        self.politica = politica or POLITICA_PADRAO
+        self.ao_despejar = ao_despejar  # Chamado (uma vez) quando o cliente deve ser desconectado
+        self.ao_ficar_pendente = ao_ficar_pendente  # Chamado quando a fila deixa de estar vazia
+
+        self._frames = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self.fechada = False
+        self.congestionada = False
+
+        # Contadores
+        self.bytes_enfileirados = 0
+        self.pico_bytes_enfileirados = 0
+        self.frames_enfileirados_total = 0
+        self.frames_descartados = 0
+        self.bytes_descartados = 0
+
+    def __len__(self):
+        return len(self._frames)
+
+    def put(self, frame) -> bool:
+        """Enfileira um frame. Retorna False se foi descartado ou a fila está fechada."""
+        tamanho = len(frame)
+        aceito = despejar = pendente = False
+        with self._cond:
+            if self.fechada:
+                return False
+
+            if self.congestionada or self.bytes_enfileirados + tamanho > self.limite_alto:
+                self.frames_descartados += 1
+                self.bytes_descartados += tamanho
+                if self.politica == POLITICA_DESCONECTAR:
+                    self.fechada = True
+                    despejar = True
+                    self._cond.notify_all()
+                else:
+                    self.congestionada = True
+            else:
+                self._frames.append(frame)
+                aceito = True
+                self.bytes_enfileirados += tamanho
+                self.frames_enfileirados_total += 1
+                if self.bytes_enfileirados > self.pico_bytes_enfileirados:
+                    self.pico_bytes_enfileirados = self.bytes_enfileirados
+                if len(self._frames) == 1:
+                    self._cond.notify()
+                    pendente = True
+
+        if aceito:
+            _frames_enfileirados.incrementar()
+        else:
+            _frames_descartados.incrementar()
+        if pendente and self.ao_ficar_pendente:
+            self.ao_ficar_pendente()
+        if despejar:
+            _clientes_despejados.incrementar()
+            if self.ao_despejar:
+                self.ao_despejar()
+        return aceito
+
+    def _retirar_lote(self, max_bytes):
+        lote = []
+        total = 0
+        while self._frames and (not lote or total + len(self._frames[0]) <= max_bytes):
+            frame = self._frames.popleft()
+            lote.append(frame)
+            total += len(frame)
+        self.bytes_enfileirados -= total
+        if self.congestionada and self.bytes_enfileirados <= self.limite_baixo:
+            self.congestionada = False
+        return lote
+
+    def proximo_lote(self, max_bytes=LOTE_MAXIMO):
+        """Retira frames (até max_bytes, no mínimo um) sem bloquear."""
+        with self._cond:
+            return self._retirar_lote(max_bytes)
+
+    def aguardar_lote(self, max_bytes=LOTE_MAXIMO):
+        """Bloqueia até haver frames. Retorna lista vazia quando a fila é fechada."""
+        with self._cond:
+            while not self._frames and not self.fechada:
+                self._cond.wait()
+            if self.fechada:
+                return []
+            return self._retirar_lote(max_bytes)
+
+    def fechar(self):
+        with self._cond:
+            self.fechada = True
+            self._frames.clear()
+            self.bytes_enfileirados = 0
+            self._cond.notify_all()
+
+    def estatisticas(self):
+        return {
+            "bytes_enfileirados": self.bytes_enfileirados,
+            "pico_bytes_enfileirados": self.pico_bytes_enfileirados,
+            "frames_pendentes": len(self._frames),
+            "frames_enfileirados_total": self.frames_enfileirados_total,
+            "frames_descartados": self.frames_descartados,
+            "bytes_descartados": self.bytes_descartados,
+            "congestionada": self.congestionada,
+        }
+
+
+def transmitir(destinos, frame, excluir=None) -> int:
+    """Enfileira o mesmo frame para cada handler de `destinos` (exceto `excluir`).
+
+    Handlers de um laço de eventos (com atributo `loop`) são agrupados: cada
+    laço recebe o frame uma vez e o repassa às suas conexões na ordem em que
+    as transmissões foram feitas. Retorna quantos handlers foram alcançados.
+    """
+    por_laco = {}
+    entregues = 0
+    for handler in destinos:
+        if handler is excluir or not handler._running:
+            continue
+        laco = getattr(handler, "loop", None)
+        if laco is not None:
+            por_laco.setdefault(laco, []).append(handler)
+            entregues += 1
+        elif handler.enviar_frame(frame):
+            entregues += 1
+    for laco, grupo in por_laco.items():
+        laco.transmitir(frame, grupo)
+    return entregues
+
+
+def enviar_vetorizado(sock, buffers):
+    """Envia vários frames com uma única chamada de sendmsg, sem concatená-los.
+
+    Retorna a lista de buffers (memoryviews) que ainda falta enviar; o primeiro
+    pode ser o restante de um frame enviado parcialmente.
+    """
+    inicio = time.perf_counter_ns()
+    enviados = sock.sendmsg(buffers[:IOV_MAXIMO])
+    _tempo_envio.observar_ns(time.perf_counter_ns() - inicio)
+    _chamadas_envio.incrementar()
+    _bytes_enviados.incrementar(enviados)
+    for i, buf in enumerate(buffers):
+        tamanho = len(buf)
+        if enviados < tamanho:
+            restante = buffers[i:]
+            if enviados:
+                restante[0] = memoryview(buf)[enviados:]
+            return restante
+        enviados -= tamanho
+    return []
@@ -0,0 +1,113 @@
+# core/protocol.py
+"""Comandos de controle do protocolo de chat (payload dos frames TIPO_CONTROLE).
+
+O handshake continua sendo '__USERNAME__:<nome>'; opções extras vão em linhas
+seguintes no mesmo frame, no formato '__OPCAO__:<valor>'. Servidores que não
+conhecem uma opção simplesmente a ignoram.
+
+Depois do handshake, os comandos seguem o formato '__COMANDO__:<argumento>',
+opcionalmente seguido de uma quebra de linha e um corpo de texto.
+"""
+
+PREFIXO_USUARIO = "__USERNAME__:"
+OPCAO_RESUME = "__RESUME__"  # '<último seq recebido>,<época>' do cliente (reconexão; ver montar_marca)
+OPCAO_SALAS = "__SALAS__"    # Salas do cliente separadas por vírgula; a última é a sala atual
+OPCAO_COMPRESSAO = "__COMPRESSAO__"  # Codecs aceitos pelo cliente, por preferência (core/compression.py)
+OPCAO_BATIMENTO = "__BATIMENTO__"  # Cliente responde a TIPO_PING; pode ser desconectado se ficar mudo
+OPCAO_SESSAO = "__SESSAO__"  # Segredo recebido em RESPOSTA_SESSAO; prova a posse do nome ao reconectar
+
+# Salas e mensagens diretas
+SALA_PADRAO = "geral"        # Todo cliente entra nela; clientes antigos só conhecem esta
+COMANDO_ENTRAR = "__JOIN__"  # '__JOIN__:<sala>' inscreve na sala e a torna a sala atual
+COMANDO_SAIR = "__LEAVE__"   # '__LEAVE__:<sala>'
+COMANDO_SALA = "__ROOM__"    # '__ROOM__:<sala>\n<texto>' envia para uma sala específica
+COMANDO_DM = "__DM__"        # '__DM__:<usuário>\n<texto>' mensagem direta
+PREFIXO_DM = "@"             # Chave interna das mensagens diretas: '@<usuário>' (core/rooms.py)
+
+# Transferência de arquivos (core/transfer.py); os blocos vão em frames TIPO_BLOCO
+COMANDO_UPLOAD = "__UPLOAD__"      # '__UPLOAD__:<id>\n<JSON {nome, tamanho, sala}>' oferece um arquivo
+COMANDO_DOWNLOAD = "__DOWNLOAD__"  # '__DOWNLOAD__:<id>\n<offset>' pede um arquivo a partir do offset
+COMANDOS_ARQUIVO = (COMANDO_UPLOAD, COMANDO_DOWNLOAD)
+COMANDOS = (COMANDO_ENTRAR, COMANDO_SAIR, COMANDO_SALA, COMANDO_DM) + COMANDOS_ARQUIVO
+TAMANHO_MAXIMO_SALA = 32
+
+# Respostas do servidor (frames TIPO_CONTROLE enviados ao cliente)
+RESPOSTA_UPLOAD = "__UPLOAD_OK__"      # '__UPLOAD_OK__:<id>\n<offset>' bytes que o servidor já tem
+RESPOSTA_ARQUIVO = "__ARQUIVO__"       # '__ARQUIVO__:<id>\n<JSON {nome, tamanho, offset}>' antes dos blocos
+RESPOSTA_ERRO_ARQUIVO = "__ARQUIVO_ERRO__"  # '__ARQUIVO_ERRO__:<id>\n<motivo>'
+RESPOSTAS_ARQUIVO = (RESPOSTA_UPLOAD, RESPOSTA_ARQUIVO, RESPOSTA_ERRO_ARQUIVO)
+RESPOSTA_COMPRESSAO = OPCAO_COMPRESSAO  # '__COMPRESSAO__:<codec>' escolhido pelo servidor
+RESPOSTA_SEQ = "__SEQ__"  # '__SEQ__:<último seq>,<época>' do servidor antes do histórico, em resposta a __RESUME__
+RESPOSTA_LACUNA = "__LACUNA__"  # '__LACUNA__:<primeiro seq>,<último seq>' que a reexibição não incluiu
+RESPOSTA_SESSAO = OPCAO_SESSAO  # '__SESSAO__:<segredo>' ao dono do nome, antes do histórico
+
+
+def montar_handshake(nome_usuario, **opcoes):
+    """Monta o payload do handshake. Opções com valor None são omitidas."""
+    linhas = [f"{PREFIXO_USUARIO}{nome_usuario}"]
+    for chave, valor in opcoes.items():
+        if valor is not None:
+            linhas.append(f"{chave}:{valor}")
+    return "\n".join(linhas)
+
+
+def parse_handshake(texto):
+    """Retorna (nome_usuario, opcoes) ou (None, {}) se não for um handshake."""
+    linhas = texto.strip().split("\n")
+    if not linhas[0].startswith(PREFIXO_USUARIO):
+        return None, {}
+    nome_usuario = linhas[0][len(PREFIXO_USUARIO):].strip()
+    opcoes = {}
+    for linha in linhas[1:]:
+        chave, sep, valor = linha.partition(":")
+        if sep:
+            opcoes[chave.strip()] = valor.strip()
+    return nome_usuario, opcoes
+
+
+def montar_marca(seq, epoca=None):
+    """'<seq>,<época>' de __RESUME__ e __SEQ__.
+
+    A época identifica uma numeração do servidor: muda a cada início sem log
+    (a numeração recomeça em 1), então o mesmo seq em épocas diferentes são
+    mensagens diferentes.
+    """
+    return f"{seq},{epoca}" if epoca else str(seq)
+
+
+def parse_marca(valor):
+    """(seq, época) de uma marca; (0, None) quando inválida. Clientes antigos mandam só o seq."""
+    seq, _, epoca = str(valor).partition(",")
+    try:
+        return max(0, int(seq)), epoca.strip() or None
+    except ValueError:
+        return 0, None
+
+
+def resume_do_handshake(opcoes):
+    """(seq, época) informados em __RESUME__ ((0, None) quando ausente ou inválido)."""
+    return parse_marca(opcoes.get(OPCAO_RESUME, 0))
+
+
+def salas_do_handshake(opcoes):
+    """Salas informadas em __SALAS__, na ordem enviada (vazia quando ausente)."""
+    return [sala.strip() for sala in opcoes.get(OPCAO_SALAS, "").split(",") if sala.strip()]
+
+
+def nome_de_sala_valido(nome):
+    return (0 < len(nome) <= TAMANHO_MAXIMO_SALA and not nome.startswith(PREFIXO_DM)
+            and not any(c.isspace() or c == "," for c in nome))
+
+
+def montar_comando(comando, argumento, corpo=None):
+    texto = f"{comando}:{argumento}"
+    return texto if corpo is None else f"{texto}\n{corpo}"
+
+
+def parse_comando(texto, conhecidos=COMANDOS):
+    """Retorna (comando, argumento, corpo) ou (None, None, None) se não for um comando conhecido."""
+    cabecalho, _, corpo = texto.partition("\n")
+    comando, sep, argumento = cabecalho.partition(":")
+    if not sep or comando not in conhecidos:
+        return None, None, None
+    return comando, argumento.strip(), corpo
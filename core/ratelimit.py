@@ -0,0 +1,191 @@
+# core/ratelimit.py
+"""Limite de envio por conexão e por IP (token bucket).
+
+Cada mensagem publicada por um cliente é retransmitida a todos os inscritos
+da sala e exibida no host: um único cliente em laço multiplica a carga por N.
+O servidor cobra cada mensagem (e os bytes do texto) de dois pares de baldes,
+o da conexão e o do IP de origem (compartilhado pelas conexões desse IP):
+
+- enquanto há fichas, a mensagem passa normalmente;
+- um cliente acima da taxa fica em débito: o servidor para de tratar os
+  frames já recebidos e de ler a conexão até o débito ser pago (o laço tira o
+  EVENT_READ; no modo threads a thread de leitura dorme). O que ele continuar
+  enviando fica no buffer do kernel e o TCP segura o remetente, sem fila
+  crescendo no servidor;
+- uma mensagem que chega já em débito e o levaria além de ATRASO_MAXIMO
+  segundos é descartada e o remetente é avisado (ex.: um frame grande que
+  já estava no buffer quando a leitura parou).
+
+Sem o balde do IP, K conexões somariam K vezes a taxa e cada reconexão
+traria uma rajada cheia. Ele sobrevive às conexões: só é esquecido quando
+nenhuma conexão o usa e ele já se encheu de novo, quando equivale a um novo.
+Não há limite por usuário: o nome vem do handshake, sem autenticação, e um
+balde por nome deixaria qualquer um esgotar a cota de outro só usando o nome
+dele. Só as mensagens de chat e os comandos de sala são cobrados; pings e
+blocos de arquivo, que não são retransmitidos, ficam de fora. No modo
+'processos' o balde do IP é por processo worker.
+
+Configuração: P2P_CHAT_LIMITE (0 desativa), P2P_CHAT_LIMITE_MSGS e
+P2P_CHAT_LIMITE_MSGS_RAJADA (mensagens/s e rajada), P2P_CHAT_LIMITE_BYTES e
+P2P_CHAT_LIMITE_BYTES_RAJADA (bytes/s e rajada), P2P_CHAT_LIMITE_IP_MSGS,
+P2P_CHAT_LIMITE_IP_MSGS_RAJADA, P2P_CHAT_LIMITE_IP_BYTES e
+P2P_CHAT_LIMITE_IP_BYTES_RAJADA (o mesmo, somando as conexões do IP),
+P2P_CHAT_LIMITE_ATRASO_MAX.
+"""
+import contextlib
+import os
+import threading
+import time
+from core.metrics import metricas
+
+LIMITE_ATIVADO = os.environ.get("P2P_CHAT_LIMITE", "1") == "1"
+TAXA_MENSAGENS = float(os.environ.get("P2P_CHAT_LIMITE_MSGS", 10))
+RAJADA_MENSAGENS = float(os.environ.get("P2P_CHAT_LIMITE_MSGS_RAJADA", 30))
+TAXA_BYTES = float(os.environ.get("P2P_CHAT_LIMITE_BYTES", 32 * 1024))
+RAJADA_BYTES = float(os.environ.get("P2P_CHAT_LIMITE_BYTES_RAJADA", 128 * 1024))
+TAXA_MENSAGENS_IP = float(os.environ.get("P2P_CHAT_LIMITE_IP_MSGS", 3 * TAXA_MENSAGENS))
+RAJADA_MENSAGENS_IP = float(os.environ.get("P2P_CHAT_LIMITE_IP_MSGS_RAJADA", 2 * RAJADA_MENSAGENS))
+TAXA_BYTES_IP = float(os.environ.get("P2P_CHAT_LIMITE_IP_BYTES", 3 * TAXA_BYTES))
+RAJADA_BYTES_IP = float(os.environ.get("P2P_CHAT_LIMITE_IP_BYTES_RAJADA", 2 * RAJADA_BYTES))
+ATRASO_MAXIMO = float(os.environ.get("P2P_CHAT_LIMITE_ATRASO_MAX", 2.0))
+INTERVALO_AVISO = 5.0  # Segundos entre avisos de descarte para o mesmo cliente
+INTERVALO_LIMPEZA = 60.0  # Segundos entre varreduras dos baldes de IP sem conexões
+
+_descartadas = metricas.contador("limite.mensagens_descartadas")
+_bytes_descartados = metricas.contador("limite.bytes_descartados")
+_leituras_adiadas = metricas.contador("limite.leituras_adiadas")
+_tempo_adiado = metricas.histograma("limite.tempo_adiado")
+metricas.medidor("limite.ips", lambda: len(_baldes_ip))
+
+
+class TokenBucket:
+    """Balde de fichas que pode ficar negativo: o débito é o tempo até a próxima ficha."""
+    __slots__ = ("taxa", "rajada", "fichas", "_instante")
+
+    def __init__(self, taxa, rajada, agora=None):
+        self.taxa = taxa
+        self.rajada = max(rajada, 1.0)
+        self.fichas = self.rajada
+        self._instante = time.monotonic() if agora is None else agora
+
+    def _repor(self, agora):
+        self.fichas = min(self.rajada, self.fichas + (agora - self._instante) * self.taxa)
+        self._instante = agora
+
+    def atraso(self, quantidade=0, agora=None):
+        """Segundos até o saldo cobrir `quantidade` (0 se já cobre)."""
+        self._repor(time.monotonic() if agora is None else agora)
+        falta = quantidade - self.fichas if quantidade else -self.fichas
+        return max(0.0, falta / self.taxa)
+
+    def consumir(self, quantidade, agora=None):
+        """Desconta `quantidade` fichas, mesmo que o saldo fique negativo."""
+        self._repor(time.monotonic() if agora is None else agora)
+        self.fichas -= quantidade
+
+    def cheio(self, agora=None):
+        """True se o saldo já voltou à rajada (o balde equivale a um novo)."""
+        self._repor(time.monotonic() if agora is None else agora)
+        return self.fichas >= self.rajada
+
+
+# Baldes por IP: ip → [mensagens, bytes, conexões usando, lock dos baldes]
+_baldes_ip = {}
+_lock = threading.Lock()  # Conexões do mesmo IP podem estar em threads ou laços diferentes
+_ultima_limpeza = 0.0
+
+
+def _baldes_do_ip(ip):
+    global _ultima_limpeza
+    with _lock:
+        agora = time.monotonic()
+        if agora - _ultima_limpeza >= INTERVALO_LIMPEZA:
+            _ultima_limpeza = agora
+            for chave, (mensagens, tamanho, conexoes, _) in list(_baldes_ip.items()):
+                if not conexoes and mensagens.cheio(agora) and tamanho.cheio(agora):
+                    del _baldes_ip[chave]
+        entrada = _baldes_ip.get(ip)
+        if entrada is None:
+            entrada = _baldes_ip[ip] = [TokenBucket(TAXA_MENSAGENS_IP, RAJADA_MENSAGENS_IP, agora),
+                                        TokenBucket(TAXA_BYTES_IP, RAJADA_BYTES_IP, agora), 0, threading.Lock()]
+        entrada[2] += 1
+        return entrada
+
+
+class LimitadorDeConexao:
+    """Baldes de mensagens e de bytes de uma conexão, somados aos do IP dela.
+
+    Os da conexão são usados só pela thread ou laço que a lê; os do IP são
+    divididos com as outras conexões dele e tocados sob o lock da entrada.
+    """
+
+    def __init__(self, ip=None):
+        self._baldes = (TokenBucket(TAXA_MENSAGENS, RAJADA_MENSAGENS), TokenBucket(TAXA_BYTES, RAJADA_BYTES))
+        self._entrada_ip = _baldes_do_ip(ip) if ip is not None and LIMITE_ATIVADO else None
+        self._trava = contextlib.nullcontext()
+        if self._entrada_ip is not None:
+            self._baldes += tuple(self._entrada_ip[:2])
+            self._trava = self._entrada_ip[3]
+        self._ultimo_aviso = 0.0
+
+    def encerrar(self):
+        """Solta o balde do IP (ele só é esquecido depois de se encher de novo)."""
+        with _lock:
+            if self._entrada_ip is not None:
+                self._entrada_ip[2] -= 1
+                self._entrada_ip = None
+
+    def admitir(self, tamanho):
+        """Cobra uma mensagem de `tamanho` bytes. False se ela deve ser descartada."""
+        if not LIMITE_ATIVADO:
+            return True
+        agora = time.monotonic()
+        custos = (1, tamanho) * (len(self._baldes) // 2)
+        with self._trava:
+            # Com o saldo em dia a mensagem sempre passa (mesmo maior que a rajada) e é paga com a pausa
+            em_debito = any(balde.atraso(0, agora) for balde in self._baldes)
+            if em_debito and max(balde.atraso(custo, agora)
+                                 for balde, custo in zip(self._baldes, custos)) > ATRASO_MAXIMO:
+                _descartadas.incrementar()
+                _bytes_descartados.incrementar(tamanho)
+                return False
+            for balde, custo in zip(self._baldes, custos):
+                balde.consumir(custo, agora)
+        return True
+
+    def em_debito(self):
+        """True se a conexão gastou mais do que tinha (a leitura deve parar)."""
+        if not LIMITE_ATIVADO:
+            return False
+        agora = time.monotonic()
+        with self._trava:
+            return any(balde.atraso(0, agora) for balde in self._baldes)
+
+    def atraso_leitura(self):
+        """Segundos que a leitura da conexão deve esperar até o débito ser pago (0 se nenhum)."""
+        if not LIMITE_ATIVADO:
+            return 0.0
+        agora = time.monotonic()
+        with self._trava:
+            atraso = max(balde.atraso(0, agora) for balde in self._baldes)
+        if atraso > 0:
+            _leituras_adiadas.incrementar()
+            _tempo_adiado.observar_ns(int(atraso * 1e9))
+        return atraso
+
+    def deve_avisar(self):
+        """True no máximo uma vez a cada INTERVALO_AVISO segundos (o aviso também é tráfego)."""
+        agora = time.monotonic()
+        if agora - self._ultimo_aviso < INTERVALO_AVISO:
+            return False
+        self._ultimo_aviso = agora
+        return True
+
+
+AVISO_DESCARTE = "[Servidor] Você está enviando mensagens rápido demais; algumas foram descartadas."
+
+
+def avisar_descarte(handler):
+    """Avisa o remetente de que mensagens dele foram descartadas (com moderação)."""
+    if handler.limitador.deve_avisar():
+        handler.send_to_client(AVISO_DESCARTE)
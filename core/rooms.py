@@ -0,0 +1,279 @@
+# core/rooms.py
+"""Salas (publish/subscribe) e mensagens diretas do servidor de chat.
+
+O índice sala → inscritos usa um HandlerRegistry por sala, então publicar em
+uma sala percorre apenas os inscritos dela. Mensagens diretas usam o mesmo
+índice com a chave '@<usuário>', que reúne as conexões daquele usuário.
+Compartilhado pelos dois modos do servidor (threads e eventos).
+
+O nome vem do handshake, sem autenticação, então a chave '@<usuário>' não é
+dada a quem só diz o nome: a primeira conexão com um nome livre recebe um
+segredo de sessão ('__SESSAO__:<segredo>') e só quem o devolve no handshake
+recebe as mensagens diretas daquele nome, ao vivo e na reexibição. A sessão
+sobrevive EXPIRACAO_SESSAO segundos às desconexões (tempo para reconectar);
+depois o nome fica livre e o próximo dono não vê as mensagens diretas
+anteriores a ele.
+Com federação (core/federation.py) as publicações também seguem para os
+outros hosts, e as que chegam deles entram por publicar_na_sala.
+"""
+import hmac
+import os
+import secrets
+import threading
+import time
+from core.framing import TIPO_CONTROLE, encode_texto
+from core.globals import HandlerRegistry, clientes_lock, handlers, historico
+from core.metrics import metricas
+from core.protocol import (
+    COMANDO_DM, COMANDO_ENTRAR, COMANDO_SAIR, COMANDO_SALA, OPCAO_RESUME, OPCAO_SESSAO, PREFIXO_DM,
+    RESPOSTA_SESSAO, SALA_PADRAO, montar_comando, nome_de_sala_valido, resume_do_handshake, salas_do_handshake,
+)
+
+MAX_SALAS_POR_CLIENTE = int(os.environ.get("P2P_CHAT_MAX_SALAS", 32))
+# Segundos sem conexões até o nome ficar livre
+EXPIRACAO_SESSAO = float(os.environ.get("P2P_CHAT_SESSAO_EXPIRA", 600))
+
+_mensagens_diretas = metricas.contador("salas.mensagens_diretas")
+_dm_sem_destino = metricas.contador("salas.dm_sem_destino")
+_sessoes_recusadas = metricas.contador("salas.sessoes_recusadas")
+
+# Quando definido (modo multiprocesso, ver core/workers.py), as publicações são
+# entregues a ele em vez de numeradas e transmitidas neste processo
+_encaminhador = None
+
+
+def definir_encaminhador(funcao):
+    """funcao(texto, sala, remetente, nome_remetente, via=None) substitui a publicação local."""
+    global _encaminhador
+    _encaminhador = funcao
+
+
+def chave_dm(usuario):
+    return f"{PREFIXO_DM}{usuario}"
+
+
+class SessoesDM:
+    """Dono de cada nome para as mensagens diretas: quem tem o segredo da sessão."""
+
+    def __init__(self, expiracao=EXPIRACAO_SESSAO):
+        self.expiracao = expiracao
+        self._lock = threading.Lock()
+        self._sessoes = {}  # nome → [segredo, conexões, solta desde (monotonic), primeiro seq visível]
+
+    def __len__(self):
+        return len(self._sessoes)
+
+    def _expirar(self, agora):
+        for nome, sessao in list(self._sessoes.items()):
+            if not sessao[1] and agora - sessao[2] > self.expiracao:
+                del self._sessoes[nome]
+
+    def reivindicar(self, nome, segredo, ultimo_seq):
+        """(segredo, seq) da sessão se o nome estava livre ou `segredo` confere; senão None.
+
+        Só as mensagens diretas com número maior que `seq` são reexibidas ao dono.
+        """
+        with self._lock:
+            self._expirar(time.monotonic())
+            sessao = self._sessoes.get(nome)
+            if sessao is None:
+                sessao = self._sessoes[nome] = [secrets.token_hex(16), 0, 0.0, ultimo_seq]
+            elif not segredo or not hmac.compare_digest(sessao[0], segredo):
+                return None
+            sessao[1] += 1
+            return sessao[0], sessao[3]
+
+    def soltar(self, nome):
+        with self._lock:
+            sessao = self._sessoes.get(nome)
+            if sessao is not None and sessao[1]:
+                sessao[1] -= 1
+                sessao[2] = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._sessoes.clear()
+
+
+sessoes_dm = SessoesDM()
+metricas.medidor("salas.sessoes_dm", lambda: len(sessoes_dm))
+
+# No modo multiprocesso os donos dos nomes ficam no hub (core/workers.py): o worker
+# troca este objeto por um que consulta o hub pelo barramento
+_sessoes = sessoes_dm
+
+
+def definir_sessoes(sessoes):
+    """sessoes.reivindicar(nome, segredo, ultimo_seq) e sessoes.soltar(nome) substituem os locais."""
+    global _sessoes
+    _sessoes = sessoes if sessoes is not None else sessoes_dm
+
+
+class RoomRegistry:
+    """Índice sala → HandlerRegistry dos inscritos. Salas vazias são removidas."""
+
+    def __init__(self, lock):
+        self._lock = lock
+        self._salas = {}
+        self._vazio = HandlerRegistry(lock)  # Devolvido para salas inexistentes
+
+    def membros(self, sala) -> HandlerRegistry:
+        return self._salas.get(sala, self._vazio)
+
+    def entrar(self, sala, handler):
+        with self._lock:
+            registro = self._salas.get(sala)
+            if registro is None:
+                registro = self._salas[sala] = HandlerRegistry(self._lock)
+            if handler not in registro:
+                registro.append(handler)
+
+    def sair(self, sala, handler) -> bool:
+        with self._lock:
+            registro = self._salas.get(sala)
+            if registro is None or not registro.remove(handler):
+                return False
+            if not len(registro):
+                del self._salas[sala]
+            return True
+
+    def sair_de_todas(self, handler):
+        for sala in list(handler.salas) + [chave_dm(handler.username)]:
+            self.sair(sala, handler)
+
+    def clear(self):
+        with self._lock:
+            self._salas.clear()
+
+    def resumo(self):
+        """Quantidade de inscritos por sala (sem as chaves de mensagens diretas)."""
+        return {sala: len(registro) for sala, registro in list(self._salas.items())
+                if not sala.startswith(PREFIXO_DM)}
+
+
+salas = RoomRegistry(clientes_lock)
+metricas.medidor("salas.total", lambda: len(salas.resumo()))
+
+
+def formatar(sala, nome, texto):
+    """Texto exibido aos destinatários; a sala padrão mantém o formato 'nome: texto'."""
+    if sala == SALA_PADRAO:
+        return f"{nome}: {texto}"
+    return f"[{sala}] {nome}: {texto}"
+
+
+def publicar_na_sala(texto, sala=SALA_PADRAO, remetente=None, nome_remetente="", via=None):
+    """Numera e entrega o texto aos inscritos da sala (exceto o remetente).
+
+    `via` é repassado a MessageHistory.publicar (mensagens vindas da federação).
+    """
+    if _encaminhador is not None:
+        return _encaminhador(texto, sala, remetente, nome_remetente, via=via)
+    return historico.publicar(texto, salas.membros(sala), excluir=remetente,
+                              remetente=nome_remetente, sala=sala, via=via)
+
+
+def _destinos_externos():
+    """Se há clientes que este processo não enxerga (outros workers ou hosts federados)."""
+    return _encaminhador is not None or historico.ao_publicar is not None
+
+
+def inscrever_cliente(handler, opcoes):
+    """Conclui o handshake: inscreve nas salas pedidas e reenvia o que o cliente perdeu.
+
+    Sem a opção __SALAS__ (clientes antigos) o cliente entra só na sala padrão.
+    """
+    pedidas = [s for s in salas_do_handshake(opcoes) if nome_de_sala_valido(s)]
+    pedidas = pedidas[-MAX_SALAS_POR_CLIENTE:] or [SALA_PADRAO]
+    handler.salas = set(pedidas)
+    handler.sala_atual = pedidas[-1]
+    chaves = set(handler.salas)
+    minimos = None
+    sessao = _sessoes.reivindicar(handler.username, opcoes.get(OPCAO_SESSAO), historico.ultimo_seq)
+    if sessao is None:
+        _sessoes_recusadas.incrementar()
+        handler.send_to_client(f"[Servidor] O nome '{handler.username}' já tem uma sessão ativa; as mensagens "
+                               "diretas para ele não serão entregues a esta conexão.")
+    else:
+        segredo, primeiro_seq = sessao
+        handler.dono_dm = True
+        # Antes do histórico, como a resposta de compressão: o cliente guarda para a reconexão
+        handler.enviar_frame(encode_texto(montar_comando(RESPOSTA_SESSAO, segredo), TIPO_CONTROLE))
+        chaves.add(chave_dm(handler.username))
+        minimos = {chave_dm(handler.username): primeiro_seq}
+    desde_seq, epoca = resume_do_handshake(opcoes)
+    return historico.inscrever(handler, handlers, desde_seq=desde_seq, epoca=epoca, salas=chaves,
+                               indice_salas=salas, informar_seq=OPCAO_RESUME in opcoes, minimos=minimos)
+
+
+def remover_cliente(handler) -> bool:
+    """Tira o handler de todas as salas e do registro global."""
+    salas.sair_de_todas(handler)
+    if handler.dono_dm:
+        handler.dono_dm = False
+        _sessoes.soltar(handler.username)
+    return handlers.remove(handler)
+
+
+def tratar_comando(handler, comando, argumento, corpo):
+    """Executa um comando de sala/DM de um cliente já identificado.
+
+    Retorna o texto a exibir no host (ou None) para mensagens publicadas.
+    """
+    if comando == COMANDO_ENTRAR:
+        if not nome_de_sala_valido(argumento):
+            handler.send_to_client(f"[Servidor] Nome de sala inválido: '{argumento}'.")
+        elif argumento not in handler.salas and len(handler.salas) >= MAX_SALAS_POR_CLIENTE:
+            handler.send_to_client(f"[Servidor] Limite de {MAX_SALAS_POR_CLIENTE} salas atingido.")
+        else:
+            handler.salas.add(argumento)
+            handler.sala_atual = argumento
+            salas.entrar(argumento, handler)
+            # Com encaminhador ou federação o índice local só conhece os participantes deste processo
+            participantes = "" if _destinos_externos() else f" ({len(salas.membros(argumento))} participante(s))"
+            handler.send_to_client(f"[Servidor] Você entrou na sala '{argumento}'{participantes}.")
+        return None
+
+    if comando == COMANDO_SAIR:
+        if argumento in handler.salas:
+            handler.salas.discard(argumento)
+            salas.sair(argumento, handler)
+            if handler.sala_atual == argumento:
+                handler.sala_atual = SALA_PADRAO if SALA_PADRAO in handler.salas else None
+            handler.send_to_client(f"[Servidor] Você saiu da sala '{argumento}'.")
+        else:
+            handler.send_to_client(f"[Servidor] Você não está na sala '{argumento}'.")
+        return None
+
+    texto = corpo.strip()
+    if not texto:
+        return None
+
+    if comando == COMANDO_SALA:
+        return publicar_mensagem(handler, texto, argumento)
+
+    if comando == COMANDO_DM:
+        # O destinatário pode estar em outro processo ou host: não há como verificar aqui
+        if not _destinos_externos() and not len(salas.membros(chave_dm(argumento))):
+            _dm_sem_destino.incrementar()
+            handler.send_to_client(f"[Servidor] Usuário '{argumento}' não está conectado.")
+            return None
+        _mensagens_diretas.incrementar()
+        publicar_na_sala(f"[DM] {handler.username}: {texto}", chave_dm(argumento), handler, handler.username)
+        return None  # Mensagens diretas não aparecem no chat do host
+    return None
+
+
+def publicar_mensagem(handler, texto, sala=None):
+    """Publica um texto do cliente na sala indicada (ou na sala atual dele).
+
+    Retorna o texto formatado, para exibição no host, ou None se não foi publicado.
+    """
+    sala = sala or handler.sala_atual
+    if sala not in handler.salas:
+        handler.send_to_client(f"[Servidor] Você não está na sala '{sala}'. Use /entrar <sala>."
+                               if sala else "[Servidor] Você não está em nenhuma sala. Use /entrar <sala>.")
+        return None
+    mensagem = formatar(sala, handler.username, texto)
+    publicar_na_sala(mensagem, sala, handler, handler.username)
+    return mensagem
@@ -0,0 +1,107 @@
+# core/startup.py
+"""Medição da inicialização do aplicativo: marcos e tempo de importação por módulo.
+
+Ativada com P2P_CHAT_TEMPO_INICIO=1 (ou `python main.py --tempo-inicio`).
+Enquanto ativa, cada import feito na thread principal é cronometrado; quando a
+janela principal aparece, main.py imprime o relatório e a medição é desligada,
+então o restante da execução não paga nada. O orçamento
+(P2P_CHAT_ORCAMENTO_INICIO_MS) é o tempo até a primeira janela em que um
+notebook modesto ainda parece instantâneo: acima dele o relatório sai como aviso.
+
+Este módulo é importado antes de tudo em main.py e só usa a biblioteca padrão.
+"""
+import builtins
+import os
+import sys
+import threading
+import time
+from core import logs
+
+ATIVADO = os.environ.get("P2P_CHAT_TEMPO_INICIO", "0") == "1"
+ORCAMENTO_MS = float(os.environ.get("P2P_CHAT_ORCAMENTO_INICIO_MS", 1000))
+MODULOS_NO_RELATORIO = 15
+
+
+class MedidorDeInicio:
+    """Cronometra os imports da thread principal e registra marcos a partir de `inicio`."""
+
+    def __init__(self, inicio=None):
+        self.inicio = time.perf_counter() if inicio is None else inicio
+        self.marcos = []        # (nome, segundos desde o início)
+        self.importacoes = {}   # módulo → [ns próprios, ns totais]
+        self._pilha = []        # ns gastos pelos imports aninhados do import em andamento
+        self.total_importacoes_ns = 0  # Soma dos imports de nível mais alto
+        self._importar_original = None
+        self._thread_principal = threading.get_ident()
+
+    # --- Imports ---
+
+    def instalar(self):
+        if self._importar_original is None:
+            self._importar_original = builtins.__import__
+            builtins.__import__ = self._importar
+
+    def desinstalar(self):
+        if self._importar_original is not None:
+            builtins.__import__ = self._importar_original
+            self._importar_original = None
+
+    def _importar(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # Mesma assinatura de builtins.__import__ (há quem o chame com argumentos nomeados)
+        importar = self._importar_original
+        nome = name
+        # Só o primeiro import de cada módulo custa; os demais são uma consulta a sys.modules
+        if level or nome in sys.modules or threading.get_ident() != self._thread_principal:
+            return importar(name, globals, locals, fromlist, level)
+        self._pilha.append(0)
+        comeco = time.perf_counter_ns()
+        try:
+            return importar(name, globals, locals, fromlist, level)
+        finally:
+            total = time.perf_counter_ns() - comeco
+            aninhados = self._pilha.pop()
+            if self._pilha:
+                self._pilha[-1] += total
+            else:
+                self.total_importacoes_ns += total
+            self.importacoes[nome] = [total - aninhados, total]
+
+    # --- Marcos ---
+
+    def marcar(self, nome):
+        self.marcos.append((nome, time.perf_counter() - self.inicio))
+
+    def relatorio(self, modulos=MODULOS_NO_RELATORIO):
+        """Linhas do relatório: marcos e os módulos com maior tempo próprio de importação."""
+        linhas = []
+        anterior = 0.0
+        for nome, instante in self.marcos:
+            linhas.append(f"[Início] {nome}: {instante * 1000:.0f} ms (+{(instante - anterior) * 1000:.0f} ms)")
+            anterior = instante
+        linhas.append(f"[Início] Importações: {len(self.importacoes)} módulos, "
+                      f"{self.total_importacoes_ns / 1e6:.0f} ms")
+        mais_lentos = sorted(self.importacoes.items(), key=lambda item: item[1][0], reverse=True)[:modulos]
+        for nome, (proprio, total) in mais_lentos:
+            linhas.append(f"[Início]   {nome:<40} {proprio / 1e6:7.1f} ms próprios {total / 1e6:7.1f} ms total")
+        return linhas
+
+    def concluir(self, marco):
+        """Registra o marco final, imprime o relatório e desliga a medição. Retorna os ms até o marco."""
+        self.marcar(marco)
+        self.desinstalar()
+        decorrido_ms = self.marcos[-1][1] * 1000
+        acima = decorrido_ms > ORCAMENTO_MS
+        for linha in self.relatorio():
+            logs.log(logs.AVISO if acima else logs.INFO, linha)
+        if acima:
+            logs.aviso(f"[Início] {marco} em {decorrido_ms:.0f} ms, acima do orçamento de {ORCAMENTO_MS:.0f} ms")
+        return decorrido_ms
+
+
+def iniciar_medicao(inicio=None, ativado=None):
+    """Retorna um MedidorDeInicio já instalado, ou None se a medição está desativada."""
+    if not (ATIVADO if ativado is None else ativado):
+        return None
+    medidor = MedidorDeInicio(inicio)
+    medidor.instalar()
+    return medidor
@@ -0,0 +1,57 @@
+# core/timerwheel.py
+"""Roda de temporização (timer wheel) para prazos de muitas conexões.
+
+Os prazos são agrupados em slots de `resolucao` segundos dispostos em
+círculo. Agendar e cancelar custam O(1) e cada avanço visita só os slots
+que venceram, sem percorrer todas as conexões nem manter um heap ordenado.
+Prazos além de uma volta completa ficam no slot certo e só vencem quando
+o tick deles chega.
+"""
+import time
+
+
+class TimerWheel:
+    """Não é thread-safe: quem usa de várias threads deve proteger com um lock."""
+
+    def __init__(self, resolucao=1.0, num_slots=64, agora=None):
+        self.resolucao = resolucao
+        self._slots = [{} for _ in range(num_slots)]  # item → tick do prazo
+        self._slot_de = {}                             # item → slot em que está
+        self.tick = self._tick_de(time.monotonic() if agora is None else agora)
+
+    def __len__(self):
+        return len(self._slot_de)
+
+    def __contains__(self, item):
+        return item in self._slot_de
+
+    def _tick_de(self, instante):
+        return int(instante / self.resolucao)
+
+    def agendar(self, item, prazo):
+        """(Re)agenda `item` para o instante `prazo` (time.monotonic)."""
+        self.cancelar(item)
+        tick = max(self._tick_de(prazo), self.tick + 1)  # Prazo já vencido: próximo tick
+        slot = self._slots[tick % len(self._slots)]
+        slot[item] = tick
+        self._slot_de[item] = slot
+
+    def cancelar(self, item):
+        slot = self._slot_de.pop(item, None)
+        if slot is not None:
+            del slot[item]
+
+    def avancar(self, agora=None):
+        """Avança até `agora` e retorna os itens cujos prazos venceram (já removidos da roda)."""
+        alvo = self._tick_de(time.monotonic() if agora is None else agora)
+        vencidos = []
+        # Depois de uma pausa longa basta uma volta: cada slot é visitado no máximo uma vez
+        for tick in range(self.tick + 1, min(alvo, self.tick + len(self._slots)) + 1):
+            slot = self._slots[tick % len(self._slots)]
+            for item, prazo in list(slot.items()):
+                if prazo <= alvo:
+                    del slot[item]
+                    del self._slot_de[item]
+                    vencidos.append(item)
+        self.tick = max(self.tick, alvo)
+        return vencidos
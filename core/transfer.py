@@ -0,0 +1,457 @@
+# core/transfer.py
+"""Transferência de arquivos em blocos pela própria conexão de chat.
+
+Quem envia manda cada bloco como um frame TIPO_BLOCO: o cabeçalho com send e
+os dados direto do arquivo para o socket com os.sendfile, sem passar pelo
+espaço do usuário. Os blocos se alternam com os frames de chat na mesma
+conexão: entre um bloco e o próximo as mensagens pendentes saem primeiro,
+então um arquivo grande atrasa uma mensagem em no máximo um bloco. Quem
+recebe grava cada bloco no offset indicado (os.pwrite) em um arquivo
+'.parte', sem juntar o arquivo em memória; depois de uma queda a
+transferência recomeça do tamanho desse arquivo.
+
+Fluxo (comandos em core/protocol.py):
+    upload    cliente → __UPLOAD__     servidor → __UPLOAD_OK__ (offset)   cliente → blocos
+    download  cliente → __DOWNLOAD__   servidor → __ARQUIVO__ e os blocos
+Concluído o upload, o servidor anuncia na sala o id para download.
+
+Limites do servidor: o espaço total dos arquivos (os completos e os
+tamanhos anunciados dos que estão chegando) fica abaixo de
+P2P_CHAT_ARQUIVOS_COTA; um '.parte' sem blocos novos há mais de
+P2P_CHAT_ARQUIVO_PARTE_EXPIRA segundos é apagado; cada conexão recebe no
+máximo P2P_CHAT_ARQUIVO_SIMULTANEOS uploads ao mesmo tempo.
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from core.framing import BLOCO, HEADER, TIPO_BLOCO, TIPO_CONTROLE, encode_texto
+from core.metrics import metricas
+from core.protocol import (
+    COMANDO_DOWNLOAD, COMANDO_UPLOAD, PREFIXO_DM, RESPOSTA_ARQUIVO, RESPOSTA_ERRO_ARQUIVO, RESPOSTA_UPLOAD,
+    montar_comando,
+)
+from core import logs
+
+TAMANHO_BLOCO = int(os.environ.get("P2P_CHAT_ARQUIVO_BLOCO", 64 * 1024))
+MAX_TAMANHO_ARQUIVO = int(os.environ.get("P2P_CHAT_ARQUIVO_MAX", 2 * 1024 ** 3))
+DIRETORIO_ARQUIVOS = os.environ.get(
+    "P2P_CHAT_ARQUIVOS_DIR", os.path.join(os.path.expanduser("~"), ".p2p-com", "arquivos"))
+COTA_ARQUIVOS = int(os.environ.get("P2P_CHAT_ARQUIVOS_COTA", 20 * 1024 ** 3))
+EXPIRACAO_PARCIAL = float(os.environ.get("P2P_CHAT_ARQUIVO_PARTE_EXPIRA", 24 * 3600))
+MAX_UPLOADS_SIMULTANEOS = int(os.environ.get("P2P_CHAT_ARQUIVO_SIMULTANEOS", 4))
+INTERVALO_LIMPEZA = 300.0  # Segundos entre varreduras do diretório atrás de '.parte' abandonados
+EXTENSAO_PARCIAL = ".parte"
+
+_bytes_enviados = metricas.contador("arquivos.bytes_enviados")
+_bytes_recebidos = metricas.contador("arquivos.bytes_recebidos")
+_envios_concluidos = metricas.contador("arquivos.envios_concluidos")
+_recebimentos_concluidos = metricas.contador("arquivos.recebimentos_concluidos")
+_parciais_expirados = metricas.contador("arquivos.parciais_expirados")
+_recusados_cota = metricas.contador("arquivos.recusados_cota")
+
+
+def novo_id():
+    return f"{random.getrandbits(64):016x}"
+
+
+def id_valido(texto):
+    return len(texto) == 16 and all(c in "0123456789abcdef" for c in texto)
+
+
+def formatar_tamanho(n):
+    for unidade in ("bytes", "KiB", "MiB"):
+        if n < 1024:
+            return f"{n:.0f} {unidade}" if unidade == "bytes" else f"{n:.1f} {unidade}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+
+def decode_bloco(payload):
+    """Retorna (id, offset, dados) de um frame TIPO_BLOCO."""
+    id_numero, offset = BLOCO.unpack_from(payload)
+    return f"{id_numero:016x}", offset, memoryview(payload)[BLOCO.size:]
+
+
+def encode_resposta(comando, id_transferencia, corpo):
+    return encode_texto(montar_comando(comando, id_transferencia, corpo), TIPO_CONTROLE)
+
+
+def _sendfile(sock, fd, offset, quantidade):
+    if hasattr(os, "sendfile"):
+        return os.sendfile(sock.fileno(), fd, offset, quantidade)
+    return sock.send(os.pread(fd, quantidade, offset))  # Sem sendfile: uma cópia por bloco
+
+
+class EnvioArquivo:
+    """Arquivo a enviar em blocos, a partir de `offset`."""
+
+    def __init__(self, id_transferencia, caminho, offset=0):
+        self.id = id_transferencia
+        self.id_numero = int(id_transferencia, 16)
+        self.fd = os.open(caminho, os.O_RDONLY)
+        self.tamanho = os.fstat(self.fd).st_size
+        self.offset = min(max(0, offset), self.tamanho)
+
+    @property
+    def concluido(self):
+        return self.offset >= self.tamanho
+
+    def fechar(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class EnviosDeArquivo:
+    """Arquivos em envio por uma conexão, intercalados bloco a bloco.
+
+    Só a thread (ou laço) que escreve no socket chama enviar(); adicionar()
+    pode vir de outra thread.
+    """
+
+    def __init__(self, tamanho_bloco=TAMANHO_BLOCO):
+        self.tamanho_bloco = tamanho_bloco
+        self._fila = deque()
+        self._lock = threading.Lock()
+        # Bloco em andamento: precisa terminar antes de qualquer outro frame no socket
+        self._atual = None
+        self._cabecalho = None
+        self._posicao = 0
+        self._restante = 0
+
+    def __bool__(self):
+        return bool(self._fila) or self._atual is not None
+
+    @property
+    def em_andamento(self):
+        return self._atual is not None
+
+    def adicionar(self, envio):
+        """Enfileira o envio, substituindo um envio anterior do mesmo id (ex.: pedido repetido)."""
+        with self._lock:
+            for antigo in [e for e in self._fila if e.id == envio.id and e is not self._atual]:
+                self._fila.remove(antigo)
+                antigo.fechar()
+            self._fila.append(envio)
+
+    def fechar(self):
+        with self._lock:
+            for envio in self._fila:
+                envio.fechar()
+            self._fila.clear()
+        self._atual = None
+
+    def enviar(self, sock, max_bytes):
+        """Conclui o bloco em andamento e envia novos blocos enquanto não passar de max_bytes.
+
+        Retorna True quando não resta nada a enviar. Em socket não bloqueante
+        levanta BlockingIOError; o bloco interrompido continua na próxima chamada.
+        """
+        enviados = 0
+        while True:
+            if self._atual is None:
+                if enviados >= max_bytes or not self._iniciar_bloco():
+                    return not self
+            if self._cabecalho:
+                n = sock.send(self._cabecalho)
+                self._cabecalho = self._cabecalho[n:]
+                enviados += n
+                continue
+            while self._restante:
+                n = _sendfile(sock, self._atual.fd, self._posicao, self._restante)
+                if not n:
+                    raise OSError(f"Arquivo da transferência {self._atual.id} encolheu durante o envio")
+                self._posicao += n
+                self._restante -= n
+                enviados += n
+                _bytes_enviados.incrementar(n)
+            self._concluir_bloco()
+
+    def _iniciar_bloco(self):
+        with self._lock:
+            if not self._fila:
+                return False
+            envio = self._fila[0]
+            self._fila.rotate(-1)  # Rodízio entre os arquivos da conexão
+        quantidade = min(self.tamanho_bloco, envio.tamanho - envio.offset)
+        self._atual = envio
+        self._cabecalho = memoryview(HEADER.pack(BLOCO.size + quantidade, TIPO_BLOCO)
+                                     + BLOCO.pack(envio.id_numero, envio.offset))
+        self._posicao = envio.offset
+        self._restante = quantidade
+        return True
+
+    def _concluir_bloco(self):
+        envio, self._atual = self._atual, None
+        envio.offset = self._posicao
+        if envio.concluido:
+            with self._lock:
+                if envio in self._fila:
+                    self._fila.remove(envio)
+            envio.fechar()
+            _envios_concluidos.incrementar()
+
+
+class RecebimentoArquivo:
+    """Arquivo sendo recebido: cada bloco vai para o seu offset em `caminho_parcial`."""
+
+    def __init__(self, id_transferencia, caminho_parcial, destino, tamanho, nome=""):
+        self.id = id_transferencia
+        self.caminho_parcial = caminho_parcial
+        self.destino = destino
+        self.tamanho = tamanho
+        self.nome = nome
+        self.fd = os.open(caminho_parcial, os.O_WRONLY | os.O_CREAT, 0o644)
+        # O que já está no disco de uma tentativa anterior não é pedido de novo
+        self.recebidos = min(os.fstat(self.fd).st_size, tamanho)
+
+    @property
+    def concluido(self):
+        return self.recebidos >= self.tamanho
+
+    def escrever(self, offset, dados) -> bool:
+        """Grava um bloco. Retorna True quando o arquivo foi concluído (e movido para o destino)."""
+        if offset != self.recebidos or offset + len(dados) > self.tamanho:
+            # Bloco repetido ou de um pedido anterior: o offset esperado é o que vale
+            logs.debug(f"[Arquivos] Bloco ignorado de {self.id} (offset {offset}, esperado {self.recebidos})")
+            return False
+        while dados:
+            n = os.pwrite(self.fd, dados, offset)
+            dados = dados[n:]
+            offset += n
+            self.recebidos += n
+            _bytes_recebidos.incrementar(n)
+        if self.concluido:
+            self.finalizar()
+            return True
+        return False
+
+    def finalizar(self):
+        self.fechar()
+        os.truncate(self.caminho_parcial, self.tamanho)
+        os.replace(self.caminho_parcial, self.destino)
+        _recebimentos_concluidos.incrementar()
+
+    def fechar(self):
+        """Fecha sem concluir; o arquivo parcial fica para uma retomada."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class RepositorioArquivos:
+    """Arquivos enviados ao servidor: '<id>' (completo), '<id>.parte' e '<id>.json' (metadados)."""
+
+    def __init__(self, diretorio=DIRETORIO_ARQUIVOS, cota=COTA_ARQUIVOS, expiracao=EXPIRACAO_PARCIAL):
+        self.diretorio = diretorio
+        self.cota = cota
+        self.expiracao = expiracao
+        self._lock = threading.Lock()
+        self._ocupado = 0            # Bytes reservados: arquivos completos e tamanhos dos que estão chegando
+        self._ultima_varredura = None
+
+    @property
+    def ocupado(self):
+        return self._ocupado
+
+    def _caminho(self, id_transferencia, extensao=""):
+        return os.path.join(self.diretorio, id_transferencia + extensao)
+
+    def metadados(self, id_transferencia):
+        try:
+            with open(self._caminho(id_transferencia, ".json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def caminho_completo(self, id_transferencia):
+        caminho = self._caminho(id_transferencia)
+        return caminho if os.path.exists(caminho) else None
+
+    def _idade(self, caminho, agora):
+        try:
+            return agora - os.path.getmtime(caminho)
+        except FileNotFoundError:
+            return None
+
+    def _varrer(self, agora):
+        """Apaga os '.parte' abandonados e recalcula o espaço ocupado (sob self._lock)."""
+        self._ultima_varredura = agora
+        ocupado = 0
+        try:
+            nomes = os.listdir(self.diretorio)
+        except FileNotFoundError:
+            nomes = []
+        for nome_arquivo in nomes:
+            if not nome_arquivo.endswith(".json"):
+                continue
+            id_transferencia = nome_arquivo[:-len(".json")]
+            meta = self.metadados(id_transferencia)
+            if meta is None:
+                continue
+            if not self.caminho_completo(id_transferencia):
+                # Sem '.parte' (oferta sem nenhum bloco gravado) vale a idade dos metadados
+                parcial = self._caminho(id_transferencia, EXTENSAO_PARCIAL)
+                idade = self._idade(parcial, agora)
+                if idade is None:
+                    idade = self._idade(self._caminho(id_transferencia, ".json"), agora) or 0
+                if idade > self.expiracao:
+                    for caminho in (parcial, self._caminho(id_transferencia, ".json")):
+                        try:
+                            os.remove(caminho)
+                        except FileNotFoundError:
+                            pass
+                    _parciais_expirados.incrementar()
+                    logs.info(f"[Arquivos] Envio parcial {id_transferencia} abandonado há {idade:.0f}s; apagado.")
+                    continue
+            ocupado += meta.get("tamanho", 0)
+        self._ocupado = ocupado
+
+    def receber(self, id_transferencia, nome, tamanho, remetente, sala):
+        """Prepara o recebimento (novo ou retomado). Retorna None se o arquivo já está completo."""
+        with self._lock:
+            os.makedirs(self.diretorio, exist_ok=True)
+            agora = time.time()
+            if self._ultima_varredura is None or agora - self._ultima_varredura >= INTERVALO_LIMPEZA:
+                self._varrer(agora)
+            meta = self.metadados(id_transferencia)
+            if meta is not None and (meta["remetente"] != remetente or meta["tamanho"] != tamanho):
+                raise ValueError("Identificador de transferência já usado por outro arquivo")
+            if self.caminho_completo(id_transferencia):
+                return None
+            if meta is None:
+                if self._ocupado + tamanho > self.cota:
+                    _recusados_cota.incrementar()
+                    raise ValueError(f"Sem espaço no servidor: cota de {formatar_tamanho(self.cota)} para "
+                                     f"arquivos atingida.")
+                self._ocupado += tamanho
+                meta = {"nome": nome, "tamanho": tamanho, "remetente": remetente, "sala": sala}
+                with open(self._caminho(id_transferencia, ".json"), "w", encoding="utf-8") as f:
+                    json.dump(meta, f, ensure_ascii=False)
+            return RecebimentoArquivo(id_transferencia, self._caminho(id_transferencia, EXTENSAO_PARCIAL),
+                                      self._caminho(id_transferencia), tamanho, meta["nome"])
+
+
+repositorio = RepositorioArquivos()
+metricas.medidor("arquivos.bytes_ocupados", lambda: repositorio.ocupado)
+
+
+# --- Lado do servidor (comum aos modos threads e eventos) ---
+
+def _erro(handler, id_transferencia, motivo):
+    handler.enviar_frame(encode_resposta(RESPOSTA_ERRO_ARQUIVO, id_transferencia, motivo))
+    return None
+
+
+def tratar_comando_arquivo(handler, comando, argumento, corpo):
+    """Trata __UPLOAD__/__DOWNLOAD__. Retorna o texto a exibir no host (ou None)."""
+    if not id_valido(argumento):
+        return _erro(handler, argumento, "Identificador de transferência inválido.")
+    if comando == COMANDO_UPLOAD:
+        return _iniciar_upload(handler, argumento, corpo)
+    if comando == COMANDO_DOWNLOAD:
+        return _iniciar_download(handler, argumento, corpo)
+    return None
+
+
+def _iniciar_upload(handler, id_transferencia, corpo):
+    try:
+        oferta = json.loads(corpo)
+        nome = os.path.basename(str(oferta["nome"])) or "arquivo"
+        tamanho = int(oferta["tamanho"])
+        sala = oferta.get("sala") or handler.sala_atual
+    except (ValueError, KeyError, TypeError):
+        return _erro(handler, id_transferencia, "Oferta de arquivo inválida.")
+    if not 0 <= tamanho <= MAX_TAMANHO_ARQUIVO:
+        return _erro(handler, id_transferencia, f"Arquivo acima do limite de {formatar_tamanho(MAX_TAMANHO_ARQUIVO)}.")
+    if not (sala in handler.salas or (sala.startswith(PREFIXO_DM) and len(sala) > 1)):
+        return _erro(handler, id_transferencia, f"Você não está na sala '{sala}'.")
+
+    anterior = handler.recebimentos.pop(id_transferencia, None)
+    if anterior:
+        anterior.fechar()
+    if len(handler.recebimentos) >= MAX_UPLOADS_SIMULTANEOS:
+        return _erro(handler, id_transferencia,
+                     f"Limite de {MAX_UPLOADS_SIMULTANEOS} envios simultâneos por conexão; aguarde um terminar.")
+    try:
+        recebimento = repositorio.receber(id_transferencia, nome, tamanho, handler.username, sala)
+    except (OSError, ValueError) as e:
+        return _erro(handler, id_transferencia, str(e))
+    offset = tamanho if recebimento is None else recebimento.recebidos
+    handler.enviar_frame(encode_resposta(RESPOSTA_UPLOAD, id_transferencia, str(offset)))
+    if recebimento is None:
+        return None  # Já recebido (e anunciado) antes
+    if recebimento.concluido:
+        recebimento.finalizar()  # Vazio, ou completo antes de uma queda
+        return _anunciar(handler, recebimento)
+    handler.recebimentos[id_transferencia] = recebimento
+    logs.info(f"[Arquivos] Recebendo '{nome}' ({formatar_tamanho(tamanho)}) de {handler.username}"
+              + (f", a partir de {offset} bytes" if offset else ""))
+    return None
+
+
+def _iniciar_download(handler, id_transferencia, corpo):
+    meta = repositorio.metadados(id_transferencia)
+    caminho = repositorio.caminho_completo(id_transferencia)
+    if meta is None or caminho is None:
+        return _erro(handler, id_transferencia, "Arquivo não encontrado no servidor.")
+    try:
+        envio = EnvioArquivo(id_transferencia, caminho, int(corpo.strip() or 0))
+    except (OSError, ValueError) as e:
+        return _erro(handler, id_transferencia, f"Não foi possível ler o arquivo: {e}")
+    resposta = encode_resposta(RESPOSTA_ARQUIVO, id_transferencia, json.dumps(
+        {"nome": meta["nome"], "tamanho": envio.tamanho, "offset": envio.offset}, ensure_ascii=False))
+    if envio.concluido:
+        envio.fechar()
+    else:
+        handler.envios.adicionar(envio)
+    # Depois de adicionar: o frame acorda o escritor da conexão, que então envia os blocos
+    handler.enviar_frame(resposta)
+    return None
+
+
+def receber_bloco(handler, payload):
+    """Grava um bloco de upload. Retorna o texto a exibir no host quando o arquivo é concluído."""
+    id_transferencia, offset, dados = decode_bloco(payload)
+    recebimento = handler.recebimentos.get(id_transferencia)
+    if recebimento is None:
+        logs.aviso(f"[Arquivos] Bloco de transferência desconhecida ({id_transferencia}) de {handler.username}")
+        return None
+    try:
+        concluido = recebimento.escrever(offset, dados)
+    except OSError as e:
+        del handler.recebimentos[id_transferencia]
+        recebimento.fechar()
+        return _erro(handler, id_transferencia, f"Falha ao gravar no servidor: {e}")
+    if not concluido:
+        return None
+    del handler.recebimentos[id_transferencia]
+    return _anunciar(handler, recebimento)
+
+
+def _anunciar(handler, recebimento):
+    from core.rooms import formatar, publicar_na_sala
+
+    meta = repositorio.metadados(recebimento.id) or {}
+    sala = meta.get("sala") or handler.sala_atual
+    texto = (f"compartilhou o arquivo '{recebimento.nome}' ({formatar_tamanho(recebimento.tamanho)}). "
+             f"Para baixar: /baixar {recebimento.id}")
+    logs.info(f"[Arquivos] '{recebimento.nome}' recebido de {handler.username} ({recebimento.id})")
+    handler.send_to_client(f"[Servidor] Arquivo '{recebimento.nome}' recebido (id {recebimento.id}).")
+    if sala.startswith(PREFIXO_DM):
+        publicar_na_sala(f"[DM] {handler.username}: {texto}", sala, handler, handler.username)
+        return None  # Mensagens diretas não aparecem no chat do host
+    mensagem = formatar(sala, handler.username, texto)
+    publicar_na_sala(mensagem, sala, handler, handler.username)
+    return mensagem
+
+
+def encerrar_transferencias(handler):
+    """Fecha os arquivos de uma conexão encerrada; os parciais ficam para a retomada."""
+    handler.envios.fechar()
+    for recebimento in handler.recebimentos.values():
+        recebimento.fechar()
+    handler.recebimentos.clear()
@@ -0,0 +1,369 @@
+# core/workers.py
+"""Servidor de chat em vários processos que compartilham a porta (SO_REUSEPORT).
+
+Cada worker é um processo com o próprio EventLoopChatServer escutando na mesma
+porta; o kernel distribui as conexões entre eles. O processo principal (hub)
+não atende clientes: ele numera as mensagens e as repassa a todos os workers
+por sockets Unix, e cada worker entrega aos seus clientes locais. Assim a
+ordem e os números de sequência continuam globais (reconexão e histórico
+funcionam como no modo de um processo) e o fan-out, a parte cara, roda em
+paralelo nos núcleos.
+
+Barramento (frames de core/framing.py):
+    worker → hub  BUS_PUBLICAR  JSON {texto, sala, nome, origem, handler}
+                  BUS_EVENTO    JSON {evento, texto}  (repassado a eventos_servidor do hub)
+                  BUS_CARGA     JSON {clientes}  (quando muda; o hub anuncia a soma na descoberta)
+                  BUS_SESSAO    JSON {pedido, nome, segredo}  (o hub é o dono das sessões de DM)
+                  BUS_SOLTAR    JSON {nome}  (o dono do nome desconectou)
+    hub → worker  BUS_ENTREGA   seq, origem, handler, sala + frame TIPO_MENSAGEM pronto
+                  BUS_PRONTO    época da numeração; fim do histórico inicial
+                  BUS_SESSAO    JSON {pedido, nome, sessao: [segredo, seq] ou null}
+"""
+import json
+import multiprocessing
+import os
+import selectors
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import time
+from core.events import EVENTO_MENSAGEM, EVENTO_STATUS, eventos_servidor
+from core.framing import HEADER, SEQUENCIA, FrameDecoder, encode_frame
+from core.globals import handlers, historico
+from core.protocol import SALA_PADRAO
+from core import logs
+from core import rooms
+
+NUM_PROCESSOS = int(os.environ.get("P2P_CHAT_NUM_PROCESSOS", os.cpu_count() or 1))
+TIMEOUT_INICIO = 15.0  # Tempo para os workers se conectarem ao hub
+INTERVALO_CARGA = 1.0  # Segundos entre verificações do número de clientes de um worker
+TIMEOUT_SESSAO = 2.0   # Espera do worker pela resposta do hub a uma sessão de DM (no handshake)
+
+BUS_PUBLICAR = 0x10
+BUS_EVENTO = 0x11
+BUS_ENTREGA = 0x12
+BUS_PRONTO = 0x13
+BUS_CARGA = 0x14
+BUS_SESSAO = 0x15
+BUS_SOLTAR = 0x16
+
+ENTREGA = struct.Struct("!QiQH")  # seq, worker de origem (-1: hub), id do handler remetente, tamanho da sala
+SEM_ORIGEM = -1
+
+
+def _encode_entrega(seq, origem, id_handler, sala, frame):
+    sala_bytes = sala.encode('utf-8')
+    return encode_frame(ENTREGA.pack(seq, origem, id_handler, len(sala_bytes)) + sala_bytes + frame, BUS_ENTREGA)
+
+
+def _decode_entrega(payload):
+    seq, origem, id_handler, tamanho_sala = ENTREGA.unpack_from(payload)
+    inicio = ENTREGA.size + tamanho_sala
+    return seq, origem, id_handler, payload[ENTREGA.size:inicio].decode('utf-8'), payload[inicio:]
+
+
+class _EntregaWorkers:
+    """Destino de MessageHistory.publicar no hub: repassa o frame numerado aos workers."""
+
+    def __init__(self, hub, sala, origem, id_handler):
+        self.hub = hub
+        self.sala = sala
+        self.origem = origem
+        self.id_handler = id_handler
+
+    def fixar(self):
+        # Os workers do hub só mudam por historico.em_ordem(): a lista vista na transmissão já é a certa
+        return self
+
+    def transmitir(self, frame, excluir=None):
+        (seq,) = SEQUENCIA.unpack_from(frame, HEADER.size)
+        return self.hub._difundir(_encode_entrega(seq, self.origem, self.id_handler, self.sala, frame))
+
+
+class WorkerHub:
+    """Processo principal do modo multiprocesso: inicia os workers e numera as mensagens."""
+
+    def __init__(self, host, port, num_processos=None, eventos=None):
+        self.host = host
+        self.port = port
+        self.num_processos = max(1, num_processos or NUM_PROCESSOS)
+        self.eventos = eventos or eventos_servidor
+        self.processos = []
+        self._conexoes = {}  # socket → índice do worker
+        self._cargas = {}    # índice do worker → clientes conectados nele
+        self._donos = {}     # índice do worker → {nome: conexões donas do nome nele}
+        self._diretorio = tempfile.mkdtemp(prefix="p2p-chat-")
+        self.caminho_bus = os.path.join(self._diretorio, "bus.sock")
+        self.selector = selectors.DefaultSelector()
+        self._running = True
+
+    # --- Publicação (difundida na ordem dos seqs, ver MessageHistory.publicar) ---
+
+    def publicar(self, texto, sala=SALA_PADRAO, remetente=None, nome_remetente="",
+                 origem=SEM_ORIGEM, id_handler=0, via=None):
+        destino = _EntregaWorkers(self, sala, origem, id_handler)
+        return historico.publicar(texto, destino, remetente=nome_remetente, sala=sala, via=via)
+
+    def _difundir(self, frame):
+        entregues = 0
+        for conn in list(self._conexoes):
+            try:
+                conn.sendall(frame)
+                entregues += 1
+            except OSError as e:
+                logs.erro(f"[Servidor] Erro ao repassar para o worker {self._conexoes.get(conn)}: {e}")
+        return entregues
+
+    def carga(self):
+        """Clientes conectados em todos os workers (o hub não atende nenhum)."""
+        return sum(list(self._cargas.values()))
+
+    # --- Ciclo de vida ---
+
+    def _iniciar_workers(self):
+        escuta = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        escuta.bind(self.caminho_bus)
+        escuta.listen(self.num_processos)
+        escuta.settimeout(TIMEOUT_INICIO)
+
+        # spawn: o processo do host pode ter threads (Qt, log) que não sobrevivem a um fork
+        contexto = multiprocessing.get_context("spawn")
+        for indice in range(self.num_processos):
+            processo = contexto.Process(
+                target=executar_worker, name=f"chat-worker-{indice}",
+                args=(indice, self.host, self.port, self.caminho_bus, logs.nivel_atual), daemon=True)
+            processo.start()
+            self.processos.append(processo)
+
+        try:
+            for _ in range(self.num_processos):
+                conn, _ = escuta.accept()
+                indice = json.loads(conn.recv(64).decode('utf-8'))["worker"]
+                # Histórico atual + marca de pronto na ordem das difusões: nada é perdido nem repetido
+                with historico.lock:
+                    historico.em_ordem(self._adicionar_worker, conn, indice, historico.entradas(),
+                                       historico.epoca)
+                historico.despachar(esperar=True)
+                self.selector.register(conn, selectors.EVENT_READ, FrameDecoder())
+        finally:
+            escuta.close()
+
+    def _adicionar_worker(self, conn, indice, entradas, epoca):
+        for seq, frame, sala in entradas:
+            conn.sendall(_encode_entrega(seq, SEM_ORIGEM, 0, sala, frame))
+        conn.sendall(encode_frame(epoca.encode('utf-8'), BUS_PRONTO))
+        self._conexoes[conn] = indice
+
+    def serve_forever(self, pronto=None):
+        """Inicia os workers e atende o barramento na thread atual; `pronto` é sinalizado com todos escutando."""
+        rooms.definir_encaminhador(self.publicar)  # Broadcast do host também passa pelo hub
+        try:
+            self._iniciar_workers()
+            logs.info(f"[Servidor] {self.num_processos} processo(s) worker escutando em {self.host}:{self.port}")
+            if pronto:
+                pronto.set()
+            while self._running and self._conexoes:
+                for key, _ in self.selector.select(timeout=1.0):
+                    self._ler(key.fileobj, key.data)
+        finally:
+            rooms.definir_encaminhador(None)
+            self.stop()
+
+    def _ler(self, conn, decoder):
+        try:
+            recebidos = decoder.recv_into(conn)
+        except OSError:
+            recebidos = 0
+        if not recebidos:
+            indice = self._conexoes.pop(conn, None)
+            self._cargas.pop(indice, None)
+            # As conexões do worker caíram com ele: as sessões passam a contar o prazo para expirar
+            for nome, conexoes in self._donos.pop(indice, {}).items():
+                for _ in range(conexoes):
+                    rooms.sessoes_dm.soltar(nome)
+            self.selector.unregister(conn)
+            conn.close()
+            if self._running:
+                logs.erro(f"[Servidor] Worker {indice} encerrou; seus clientes foram desconectados.")
+            return
+        for tipo, payload in decoder.frames():
+            dados = json.loads(payload.decode('utf-8'))
+            if tipo == BUS_PUBLICAR:
+                self.publicar(dados["texto"], dados["sala"], nome_remetente=dados["nome"],
+                              origem=dados["origem"], id_handler=dados["handler"])
+            elif tipo == BUS_EVENTO:
+                self.eventos.emit(dados["evento"], dados["texto"])
+            elif tipo == BUS_CARGA:
+                self._cargas[self._conexoes[conn]] = dados["clientes"]
+            elif tipo == BUS_SESSAO:
+                self._reivindicar(conn, dados)
+            elif tipo == BUS_SOLTAR:
+                donos = self._donos.get(self._conexoes[conn], {})
+                if donos.get(dados["nome"]):
+                    donos[dados["nome"]] -= 1
+                    rooms.sessoes_dm.soltar(dados["nome"])
+
+    def _reivindicar(self, conn, dados):
+        # Sob o lock do histórico o seq é o atual; a resposta sai na fila das difusões, depois
+        # das mensagens até esse seq e sem se misturar a um _difundir de outra thread
+        with historico.lock:
+            sessao = rooms.sessoes_dm.reivindicar(dados["nome"], dados["segredo"], historico.ultimo_seq)
+            if sessao is not None:
+                donos = self._donos.setdefault(self._conexoes[conn], {})
+                donos[dados["nome"]] = donos.get(dados["nome"], 0) + 1
+            resposta = {"pedido": dados["pedido"], "nome": dados["nome"], "sessao": sessao}
+            historico.em_ordem(self._responder, conn, encode_frame(json.dumps(resposta).encode('utf-8'), BUS_SESSAO))
+        historico.despachar()
+
+    def _responder(self, conn, frame):
+        try:
+            conn.sendall(frame)
+        except OSError as e:
+            logs.erro(f"[Servidor] Erro ao responder ao worker {self._conexoes.get(conn)}: {e}")
+
+    def stop(self):
+        self._running = False
+        for conn in list(self._conexoes):
+            conn.close()
+        self._conexoes.clear()
+        for processo in self.processos:
+            if processo.is_alive():
+                processo.terminate()
+        for processo in self.processos:
+            processo.join(timeout=5)
+        shutil.rmtree(self._diretorio, ignore_errors=True)
+
+
+class ChatWorker:
+    """Lado do worker no barramento: encaminha publicações e entrega o que o hub numerou."""
+
+    def __init__(self, indice, bus):
+        self.indice = indice
+        self.bus = bus
+        self._envio_lock = threading.Lock()
+        self.pronto = threading.Event()
+        self._pedidos = {}  # pedido de sessão → [Event, resposta]
+        self._proximo_pedido = 0
+        self._pedidos_lock = threading.Lock()
+
+    def _enviar(self, tipo, dados):
+        frame = encode_frame(json.dumps(dados).encode('utf-8'), tipo)
+        with self._envio_lock:
+            self.bus.sendall(frame)
+
+    def encaminhar(self, texto, sala, remetente, nome_remetente, via=None):
+        # `via` só existe no hub, onde a federação roda
+        self._enviar(BUS_PUBLICAR, {"texto": texto, "sala": sala, "nome": nome_remetente,
+                                    "origem": self.indice, "handler": id(remetente) if remetente else 0})
+
+    def encaminhar_evento(self, evento):
+        return lambda texto: self._enviar(BUS_EVENTO, {"evento": evento, "texto": texto})
+
+    # --- Sessões de DM (core/rooms.py), decididas pelo hub ---
+
+    def reivindicar(self, nome, segredo, ultimo_seq):
+        """Como SessoesDM.reivindicar, perguntando ao hub (bloqueia até a resposta)."""
+        with self._pedidos_lock:
+            self._proximo_pedido += 1
+            pedido = self._proximo_pedido
+            espera = self._pedidos[pedido] = [threading.Event(), None]
+        try:
+            self._enviar(BUS_SESSAO, {"pedido": pedido, "nome": nome, "segredo": segredo})
+            if not espera[0].wait(TIMEOUT_SESSAO):
+                logs.aviso(f"[Servidor] Worker {self.indice}: hub não respondeu à sessão de '{nome}'.")
+        except OSError:
+            pass
+        with self._pedidos_lock:
+            self._pedidos.pop(pedido, None)
+            return espera[1]
+
+    def soltar(self, nome):
+        try:
+            self._enviar(BUS_SOLTAR, {"nome": nome})
+        except OSError:
+            pass  # Hub encerrado: as sessões acabaram com ele
+
+    def _resposta_sessao(self, dados):
+        sessao = tuple(dados["sessao"]) if dados["sessao"] else None
+        with self._pedidos_lock:
+            espera = self._pedidos.get(dados["pedido"])
+            if espera is not None:
+                espera[1] = sessao
+                espera[0].set()
+                return
+        if sessao is not None:
+            # Chegou depois do prazo: a conexão seguiu sem a sessão, que não deve ficar presa no hub
+            self.soltar(dados["nome"])
+
+    def informar_carga(self):
+        """Avisa o hub sempre que o número de clientes deste worker muda (thread própria)."""
+        ultima = None
+        while True:
+            atual = len(handlers)
+            if atual != ultima:
+                try:
+                    self._enviar(BUS_CARGA, {"clientes": atual})
+                except OSError:
+                    return  # Barramento fechado: ler_bus encerra o processo
+                ultima = atual
+            time.sleep(INTERVALO_CARGA)
+
+    def ler_bus(self):
+        decoder = FrameDecoder()
+        try:
+            while decoder.recv_into(self.bus):
+                for tipo, payload in decoder.frames():
+                    if tipo == BUS_ENTREGA:
+                        self._entregar(*_decode_entrega(payload))
+                    elif tipo == BUS_PRONTO:
+                        historico.epoca = payload.decode('utf-8')  # A numeração é a do hub
+                        self.pronto.set()
+                    elif tipo == BUS_SESSAO:
+                        self._resposta_sessao(json.loads(payload.decode('utf-8')))
+        except OSError:
+            pass
+        # Hub encerrado: o worker não tem como continuar numerando mensagens
+        logs.info(f"[Servidor] Worker {self.indice}: barramento fechado, encerrando.")
+        os._exit(0)
+
+    def _entregar(self, seq, origem, id_handler, sala, frame):
+        excluir = None
+        if origem == self.indice and id_handler:
+            excluir = handlers.por_id(id_handler)
+        historico.replicar(seq, frame, rooms.salas.membros(sala), excluir=excluir, sala=sala)
+
+
+def executar_worker(indice, host, port, caminho_bus, nivel_log):
+    """Ponto de entrada de um processo worker."""
+    from core.eventserver import EventLoopChatServer
+
+    logs.definir_nivel(nivel_log)
+    # Escuta antes de se apresentar ao hub: com todos apresentados a porta já aceita conexões
+    # (que esperam no backlog até o histórico chegar)
+    server = EventLoopChatServer(host, port, num_loops=1, reutilizar_porta=True)
+    try:
+        server.bind()
+    except OSError as e:
+        logs.erro(f"[Servidor] Worker {indice}: erro ao escutar em {host}:{port}: {e}")
+        return
+
+    bus = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    bus.connect(caminho_bus)
+    bus.sendall(json.dumps({"worker": indice}).encode('utf-8'))
+
+    worker = ChatWorker(indice, bus)
+    rooms.definir_encaminhador(worker.encaminhar)
+    rooms.definir_sessoes(worker)
+    # Conexões e mensagens aparecem no chat do host, que está no processo do hub
+    eventos_servidor.subscribe(EVENTO_MENSAGEM, worker.encaminhar_evento(EVENTO_MENSAGEM))
+    eventos_servidor.subscribe(EVENTO_STATUS, worker.encaminhar_evento(EVENTO_STATUS))
+    threading.Thread(target=worker.ler_bus, name="chat-bus", daemon=True).start()
+    worker.pronto.wait()
+    threading.Thread(target=worker.informar_carga, name="chat-carga", daemon=True).start()
+
+    try:
+        server.serve_forever()
+    except OSError as e:
+        logs.erro(f"[Servidor] Worker {indice}: erro ao escutar em {host}:{port}: {e}")
@@ -0,0 +1,84 @@
+"""Host sem interface gráfica: servidores de autenticação e de chat, sem Qt.
+
+Uso: python3 headless.py [--modo eventos|threads|processos] [--loops N] [--processos N] [--sem-auth]
+                         [--log-nivel debug|info|aviso|erro|desligado]
+                         [--metricas-porta PORTA] [--metricas-intervalo SEGUNDOS]
+                         [--porta PORTA] [--federacao-porta PORTA] [--federar HOST:PORTA ...] [--id-host ID]
+
+Vários hosts federados na mesma máquina, por exemplo:
+    python3 headless.py --sem-auth --porta 21001 --federacao-porta 22001
+    python3 headless.py --sem-auth --porta 21002 --federacao-porta 22002 --federar 127.0.0.1:22001
+"""
+import argparse
+import sys
+import time
+from core.auth_server import servidor_autenticacao
+from core.chatserver import (
+    CHAT_SERVER_PORT, MODO_EVENTOS, MODO_PROCESSOS, MODO_THREADS, broadcast_from_host, iniciar_em_segundo_plano,
+)
+from core.events import EVENTO_MENSAGEM, EVENTO_STATUS, eventos_servidor
+from core.federation import iniciar_federacao, parse_pares
+from core.metrics import expor_metricas
+from core import logs
+
+
+def main(argv=None):
+    inicio = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Host de chat sem interface gráfica")
+    parser.add_argument("--modo", choices=(MODO_EVENTOS, MODO_THREADS, MODO_PROCESSOS), default=MODO_EVENTOS,
+                        help="motor do servidor de chat (padrão: eventos)")
+    parser.add_argument("--loops", type=int, default=1, help="laços de eventos no modo 'eventos'")
+    parser.add_argument("--processos", type=int, help="processos worker no modo 'processos' (padrão: CPUs)")
+    parser.add_argument("--sem-auth", action="store_true", help="não inicia o servidor de autenticação")
+    parser.add_argument("--silencioso", action="store_true", help="não exibe mensagens do chat no terminal")
+    parser.add_argument("--log-nivel", choices=tuple(logs.NIVEIS), help="nível das mensagens de diagnóstico")
+    parser.add_argument("--metricas-porta", type=int, help="endpoint HTTP local com as métricas em JSON")
+    parser.add_argument("--metricas-intervalo", type=float, help="despeja as métricas no terminal a cada N segundos")
+    parser.add_argument("--porta", type=int, default=CHAT_SERVER_PORT, help="porta do servidor de chat")
+    parser.add_argument("--federacao-porta", type=int, help="aceita links de outros hosts nesta porta")
+    parser.add_argument("--federar", action="append", metavar="HOST:PORTA",
+                        help="conecta a outro host federado (pode repetir)")
+    parser.add_argument("--id-host", help="identificador deste host na federação (padrão: aleatório)")
+    args = parser.parse_args(argv)
+
+    if args.log_nivel:
+        logs.definir_nivel(args.log_nivel)
+    # Antes de start_server, que usaria apenas as variáveis de ambiente
+    expor_metricas(args.metricas_porta, args.metricas_intervalo)
+    iniciar_federacao(porta=args.federacao_porta, id_host=args.id_host,
+                      pares=parse_pares(",".join(args.federar)) if args.federar else None)
+
+    if not args.silencioso:
+        eventos_servidor.subscribe(EVENTO_MENSAGEM, lambda texto: print(f"[Chat] {texto}"))
+        eventos_servidor.subscribe(EVENTO_STATUS, lambda texto: print(f"[Status] {texto}"))
+
+    if not args.sem_auth:
+        servidor_autenticacao().start()
+
+    # Retorna com o servidor já aceitando conexões: o tempo abaixo é o tempo real até o host ficar pronto
+    try:
+        iniciar_em_segundo_plano(modo=args.modo, num_loops=args.loops, num_processos=args.processos,
+                                 port=args.porta)
+    except OSError as e:
+        print(f"[Headless] Erro ao iniciar o servidor de chat: {e}")
+        servidor_autenticacao().stop()
+        sys.exit(1)
+    print(f"[Headless] Host pronto em {time.perf_counter() - inicio:.3f}s. "
+          "Digite mensagens para enviar como host (Ctrl+D ou Ctrl+C para sair).")
+
+    try:
+        for linha in sys.stdin:
+            broadcast_from_host(linha.strip())
+        # Ctrl+D no terminal encerra; sem entrada interativa (ex.: serviço, stdin em
+        # /dev/null) o fim da entrada chega logo e o processo continua vivo
+        while not sys.stdin.isatty():
+            time.sleep(3600)
+        print("\n[Headless] Encerrando.")
+    except KeyboardInterrupt:
+        print("\n[Headless] Encerrando.")
+    finally:
+        servidor_autenticacao().stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,26 @@
+import time
+
+_inicio = time.perf_counter()  # Antes de qualquer import pesado: base do relatório de inicialização
+
 import sys
+from core.startup import iniciar_medicao
+
+# Só o necessário para a primeira janela; servidor, cliente e hotspot são
+# importados quando o usuário escolhe hospedar ou entrar (ver ui/mainwindow.py)
+medidor = iniciar_medicao(_inicio, ativado=True if "--tempo-inicio" in sys.argv else None)
+
+from PySide6.QtCore import QTimer
 from PySide6.QtWidgets import QApplication
+if medidor:
+    medidor.marcar("Qt importado")
 from ui.mainwindow import MainWindow  # Sua janela principal com PySide6
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)  # Inicializa o app Qt
+    app = QApplication([arg for arg in sys.argv if arg != "--tempo-inicio"])  # Inicializa o app Qt
     win = MainWindow()            # Cria a janela principal
     win.show()                    # Exibe a janela
+    if medidor:
+        medidor.marcar("Janela principal criada")
+        # Dispara na primeira volta do laço de eventos, depois da primeira pintura
+        QTimer.singleShot(0, lambda: medidor.concluir("Janela principal exibida"))
     sys.exit(app.exec())         # Executa o loop principal
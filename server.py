@@ -3,10 +3,10 @@ import subprocess
 import os
 import signal
 import time
-from core.auth_token import gerar_token
+from core.auth_server import AuthServer, AUTH_SERVER_PORT
 
 HOST = '0.0.0.0'  # Aceita conexões de qualquer IP
-PORT = 20556      # A porta do servidor de autenticação
+PORT = AUTH_SERVER_PORT  # A porta do servidor de autenticação
 
 # Função para verificar e matar o processo que está utilizando a porta
 def verificar_porta_em_uso(port):
@@ -22,33 +22,24 @@ def verificar_porta_em_uso(port):
     except subprocess.CalledProcessError:
         print(f"Porta {port} não está sendo utilizada por nenhum processo.")
 
-# Verifica se a porta já está em uso e mata o processo se necessário
-verificar_porta_em_uso(PORT)
+def porta_livre(port):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        return sock.connect_ex(('127.0.0.1', port)) != 0
 
-# Criar o socket do servidor
-server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-server_socket.bind((HOST, PORT))
-server_socket.listen(1)
+if __name__ == "__main__":
+    # Execução avulsa; a interface usa core.auth_server dentro do próprio processo.
+    # Só procura (e mata) o dono da porta se ela estiver realmente ocupada.
+    if not porta_livre(PORT):
+        verificar_porta_em_uso(PORT)
 
-# Gerar token inicial apenas para log (o token muda a cada conexão de qualquer forma)
-print("[LOG] Servidor iniciado. Gerando exemplo de token:")
-_ = gerar_token()  # Mostra o salt e a palavra base via print do auth_token.py
+    servidor = AuthServer(HOST, PORT)
+    servidor.start()
+    print(f"Esperando por conexões na porta {PORT}...")
 
-print(f"Esperando por uma conexão na porta {PORT}...")
-
-try:
-    while True:
-        conn, addr = server_socket.accept()
-        print(f"\nConexão recebida de {addr}")
-
-        # Gerar o token de autenticação
-        token = gerar_token()
-        print(f"Token enviado: {token}")
-
-        # Enviar o token para o cliente
-        conn.sendall(token.encode())
-        conn.close()
-except KeyboardInterrupt:
-    print("\nServidor encerrado manualmente.")
-finally:
-    server_socket.close()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\nServidor encerrado manualmente.")
+    finally:
+        servidor.stop()
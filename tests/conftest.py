@@ -0,0 +1,190 @@
+# tests/conftest.py
+"""Apoio aos testes: hosts headless em processos próprios e clientes de socket cru.
+
+Cada host roda `headless.py` em um subprocesso, com portas livres de
+127.0.0.1, sem autenticação e sem anúncio na rede (P2P_CHAT_DESCOBERTA=0),
+então vários hosts convivem na mesma máquina. Os clientes falam o protocolo
+de frames direto, sem Qt.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+# Servidores iniciados no próprio processo dos testes também ficam sem log em disco e nunca
+# se anunciam por multicast na rede de quem roda os testes (nem com a variável exportada)
+os.environ["P2P_CHAT_DESCOBERTA"] = "0"
+os.environ.setdefault("P2P_CHAT_LOG", "0")
+
+from core.framing import (  # noqa: E402
+    TIPO_CONTROLE, TIPO_MENSAGEM, TIPO_TEXTO, FrameDecoder, decode_mensagem, encode_texto,
+)
+from core.protocol import COMANDO_DM, montar_comando, montar_handshake  # noqa: E402
+
+TIMEOUT = 10.0
+
+
+def porta_livre():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def esperar(condicao, timeout=TIMEOUT, intervalo=0.02):
+    """Espera `condicao()` ficar verdadeira; retorna o último valor dela."""
+    prazo = time.monotonic() + timeout
+    while True:
+        valor = condicao()
+        if valor or time.monotonic() >= prazo:
+            return valor
+        time.sleep(intervalo)
+
+
+class HostDeTeste:
+    """Um `headless.py` em subprocesso; guarda as linhas que ele imprime."""
+
+    def __init__(self, id_host, federar=(), modo="eventos", ambiente=None):
+        self.id_host = id_host
+        self.porta = porta_livre()
+        self.porta_federacao = porta_livre()
+        self.porta_metricas = porta_livre()
+        argumentos = [sys.executable, "-u", os.path.join(RAIZ, "headless.py"), "--sem-auth", "--silencioso",
+                      "--modo", modo, "--log-nivel", "info", "--porta", str(self.porta),
+                      "--federacao-porta", str(self.porta_federacao), "--id-host", id_host,
+                      "--metricas-porta", str(self.porta_metricas)]
+        for par in federar:
+            argumentos += ["--federar", f"127.0.0.1:{par.porta_federacao}"]
+        self._argumentos = argumentos
+        self._ambiente = dict(os.environ, P2P_CHAT_DESCOBERTA="0", P2P_CHAT_LOG="0", PYTHONPATH=RAIZ,
+                              **(ambiente or {}))
+        self.linhas = []
+        self._iniciar()
+
+    def _iniciar(self):
+        prontos = self.contar("[Headless] Host pronto")
+        self.processo = subprocess.Popen(self._argumentos, cwd=RAIZ, env=self._ambiente, stdin=subprocess.DEVNULL,
+                                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        threading.Thread(target=self._ler_saida, args=(self.processo,), daemon=True).start()
+        if not esperar(lambda: self.contar("[Headless] Host pronto") > prontos):
+            raise RuntimeError(f"host {self.id_host} não ficou pronto:\n" + "".join(self.linhas))
+
+    def reiniciar(self):
+        """Encerra e sobe de novo nas mesmas portas (sem log, a numeração recomeça)."""
+        self.encerrar()
+        self._iniciar()
+
+    def _ler_saida(self, processo):
+        for linha in processo.stdout:
+            self.linhas.append(linha)
+
+    def contar(self, trecho):
+        return sum(trecho in linha for linha in list(self.linhas))
+
+    def esperar_links(self, quantidade):
+        return esperar(lambda: self.contar("[Federação] Link estabelecido") >= quantidade)
+
+    def metricas(self):
+        with urllib.request.urlopen(f"http://127.0.0.1:{self.porta_metricas}/", timeout=TIMEOUT) as resposta:
+            return json.loads(resposta.read())
+
+    def encerrar(self):
+        self.processo.terminate()
+        try:
+            self.processo.wait(5)
+        except subprocess.TimeoutExpired:
+            self.processo.kill()
+
+
+class ClienteDeTeste:
+    """Cliente mínimo: faz o handshake e acumula os textos recebidos.
+
+    `mensagens` guarda as mensagens numeradas, `seqs` os números delas, `avisos`
+    os textos do servidor e `controles` as respostas de controle.
+    """
+
+    def __init__(self, porta, nome, **opcoes):
+        self.sock = socket.create_connection(("127.0.0.1", porta), timeout=TIMEOUT)
+        self.sock.sendall(encode_texto(montar_handshake(nome, **opcoes), TIPO_CONTROLE))
+        self.mensagens = []
+        self.seqs = []
+        self.avisos = []
+        self.controles = []
+        threading.Thread(target=self._ler, daemon=True).start()
+
+    def _ler(self):
+        decoder = FrameDecoder()
+        self.sock.settimeout(None)
+        try:
+            while decoder.recv_into(self.sock):
+                for tipo, payload in decoder.frames():
+                    if tipo == TIPO_MENSAGEM:
+                        seq, texto = decode_mensagem(payload)
+                        self.seqs.append(seq)
+                        self.mensagens.append(texto)
+                    elif tipo == TIPO_TEXTO:
+                        self.avisos.append(payload.decode("utf-8"))
+                    elif tipo == TIPO_CONTROLE:
+                        self.controles.append(payload.decode("utf-8"))
+        except OSError:
+            pass
+
+    def enviar(self, texto):
+        self.sock.sendall(encode_texto(texto))
+
+    def enviar_dm(self, destino, texto):
+        self.sock.sendall(encode_texto(montar_comando(COMANDO_DM, destino, texto), TIPO_CONTROLE))
+
+    def controle(self, comando):
+        """Argumento da última resposta de controle `comando` (None se não veio)."""
+        respostas = [c.partition(":")[2] for c in self.controles if c.startswith(f"{comando}:")]
+        return respostas[-1] if respostas else None
+
+    def recebidas(self, trecho):
+        return [m for m in self.mensagens if trecho in m]
+
+    def fechar(self):
+        # shutdown antes do close: a thread de leitura ainda segura o socket e o close sozinho não envia o FIN
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+@pytest.fixture
+def hosts():
+    """Fábrica de HostDeTeste; encerra todos ao fim do teste."""
+    criados = []
+
+    def criar(id_host, **kwargs):
+        host = HostDeTeste(id_host, **kwargs)
+        criados.append(host)
+        return host
+
+    yield criar
+    for host in criados:
+        host.encerrar()
+
+
+@pytest.fixture
+def clientes():
+    """Fábrica de ClienteDeTeste; fecha todos ao fim do teste."""
+    criados = []
+
+    def criar(porta, nome, **opcoes):
+        cliente = ClienteDeTeste(porta, nome, **opcoes)
+        criados.append(cliente)
+        return cliente
+
+    yield criar
+    for cliente in criados:
+        cliente.fechar()
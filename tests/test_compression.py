@@ -0,0 +1,36 @@
+"""Ida e volta dos codecs de compressão (core/compression.py)."""
+import pytest
+
+from core.compression import CODECS, criar_compressor, criar_descompressor
+from core.framing import (
+    HEADER, TIPO_COMPRIMIDO, TIPO_CONTROLE, TIPO_MENSAGEM, FrameDecoder, encode_mensagem, encode_texto,
+)
+
+FRAMES = [
+    encode_texto("oi"),
+    encode_mensagem(1, "ana: bom dia, tudo bem? alguém sabe onde está o arquivo?"),
+    encode_texto("__SEQ__:2,abc", TIPO_CONTROLE),
+    encode_mensagem(2, "bruno: " + "texto repetido " * 200),
+    encode_mensagem(3, "ana: bom dia, tudo bem? alguém sabe onde está o arquivo?"),
+]
+
+
+@pytest.mark.parametrize("codec", sorted(CODECS))
+def test_ida_e_volta(codec):
+    compressor = criar_compressor(codec)
+    decoder = FrameDecoder()
+    decoder.descompressor = criar_descompressor(codec)
+    enviados = [compressor.comprimir(frame) for frame in FRAMES]
+    for frame in enviados:
+        decoder.feed(frame)
+    assert [HEADER.pack(len(payload), tipo) + payload for tipo, payload in decoder.frames()] == FRAMES
+    # O frame longo e repetitivo sempre encolhe; o de 2 letras fica abaixo do limiar
+    assert HEADER.unpack_from(enviados[3])[1] == TIPO_COMPRIMIDO and len(enviados[3]) < len(FRAMES[3]) // 10
+    assert enviados[0] == FRAMES[0]
+
+
+def test_mensagens_curtas_encolhem_com_dicionario():
+    frame = FRAMES[1]
+    assert HEADER.unpack_from(frame)[1] == TIPO_MENSAGEM
+    assert len(criar_compressor("zlib-dict").comprimir(frame)) < len(frame)
+    assert criar_compressor("zlib").comprimir(frame) is frame  # Abaixo do limiar sem dicionário
@@ -0,0 +1,97 @@
+"""Federação entre hosts na mesma máquina (core/federation.py)."""
+import json
+import socket
+import time
+
+from conftest import esperar
+from core.federation import FED_MENSAGEM, FED_OLA, FED_PROVA, VERSAO_FEDERACAO
+from core.framing import encode_frame
+
+ESPERA_ECO = 1.0  # Tempo para uma cópia duplicada (se houvesse) chegar
+
+
+def conectar(clientes, host, nome):
+    cliente = clientes(host.porta, nome)
+    assert esperar(lambda: host.contar(f"identificado como: {nome}"))
+    return cliente
+
+
+def test_mensagem_chega_ao_outro_host_uma_vez(hosts, clientes):
+    a = hosts("host-a")
+    b = hosts("host-b", federar=[a])
+    assert a.esperar_links(1) and b.esperar_links(1)
+
+    remetente = conectar(clientes, a, "ana")
+    vizinho = conectar(clientes, a, "alice")
+    remoto = conectar(clientes, b, "bruno")
+
+    remetente.enviar("olá da federação")
+    assert esperar(lambda: remoto.recebidas("olá da federação"))
+    time.sleep(ESPERA_ECO)
+
+    assert len(remoto.recebidas("olá da federação")) == 1
+    assert len(vizinho.recebidas("olá da federação")) == 1
+    assert remetente.recebidas("olá da federação") == []
+
+
+def test_ciclo_de_tres_hosts_nao_ecoa(hosts, clientes):
+    # a → b → c → a: cada host tem dois links e a mensagem chega a c pelos dois caminhos
+    a = hosts("host-a")
+    b = hosts("host-b", federar=[a])
+    c = hosts("host-c", federar=[b, a])
+    for host in (a, b, c):
+        assert host.esperar_links(2)
+
+    remetente = conectar(clientes, a, "ana")
+    locais = {host.id_host: conectar(clientes, host, f"leitor-{host.id_host}") for host in (a, b, c)}
+
+    remetente.enviar("volta ao mundo")
+    for cliente in locais.values():
+        assert esperar(lambda: cliente.recebidas("volta ao mundo"))
+    time.sleep(ESPERA_ECO)
+
+    for id_host, cliente in locais.items():
+        assert len(cliente.recebidas("volta ao mundo")) == 1, id_host
+    # A cópia que fechou o ciclo foi descartada pelos ids já vistos (_vistos), não entregue
+    duplicadas = sum(host.metricas()["federacao.duplicadas"] for host in (a, b, c))
+    assert duplicadas >= 1
+
+
+def test_reinicio_sem_log_nao_confunde_mensagens_novas_com_repetidas(hosts, clientes):
+    a = hosts("host-a")
+    b = hosts("host-b", federar=[a])
+    assert a.esperar_links(1) and b.esperar_links(1)
+    leitor = conectar(clientes, a, "alice")
+
+    remetente = conectar(clientes, b, "bruno")
+    remetente.enviar("antes do reinício")
+    assert esperar(lambda: leitor.recebidas("antes do reinício"))
+    remetente.fechar()
+
+    # b volta a numerar do 1: os ids novos não podem cair nos já vistos por a
+    b.reiniciar()
+    assert a.esperar_links(2)
+    remetente = conectar(clientes, b, "bruno")
+    remetente.enviar("depois do reinício")
+    assert esperar(lambda: leitor.recebidas("depois do reinício"))
+
+
+def _frame_json(dados, tipo):
+    return encode_frame(json.dumps(dados).encode('utf-8'), tipo)
+
+
+def test_par_sem_a_chave_do_dia_e_recusado(hosts, clientes):
+    a = hosts("host-a")
+    leitor = conectar(clientes, a, "alice")
+
+    with socket.create_connection(("127.0.0.1", a.porta_federacao), timeout=5) as intruso:
+        intruso.sendall(_frame_json({"host": "intruso", "versao": VERSAO_FEDERACAO, "desafio": "00" * 16}, FED_OLA))
+        intruso.sendall(_frame_json({"resposta": "0" * 64}, FED_PROVA))
+        intruso.sendall(_frame_json({"id": "intruso:x:1", "sala": "geral", "nome": "intruso",
+                                     "texto": "intruso: mensagem forjada"}, FED_MENSAGEM))
+        assert esperar(lambda: a.contar("não provou a chave do dia"))
+    time.sleep(ESPERA_ECO)
+
+    assert a.metricas()["federacao.pares_recusados"] == 1
+    assert a.contar("[Federação] Link estabelecido") == 0
+    assert leitor.recebidas("mensagem forjada") == []
@@ -0,0 +1,36 @@
+"""Decodificador incremental de frames (core/framing.py)."""
+import pytest
+
+from core.framing import (
+    TIPO_CONTROLE, TIPO_MENSAGEM, TIPO_TEXTO, FrameDecoder, FrameError, decode_mensagem, encode_frame,
+    encode_mensagem, encode_texto,
+)
+
+
+def test_frames_juntos_e_partidos_byte_a_byte():
+    fluxo = encode_texto("olá") + encode_texto("__SEQ__:3", TIPO_CONTROLE) + encode_mensagem(7, "oi")
+    decoder = FrameDecoder()
+    recebidos = []
+    for i in range(len(fluxo)):
+        decoder.feed(fluxo[i:i + 1])
+        recebidos.extend(decoder.frames())
+    assert recebidos[:2] == [(TIPO_TEXTO, "olá".encode('utf-8')), (TIPO_CONTROLE, b"__SEQ__:3")]
+    tipo, payload = recebidos[2]
+    assert tipo == TIPO_MENSAGEM and decode_mensagem(payload) == (7, "oi")
+    assert decoder.pendente() == 0
+
+
+def test_frame_maior_que_o_buffer_faz_o_buffer_crescer():
+    grande = bytes(range(256)) * 1024
+    decoder = FrameDecoder(capacidade=1024)
+    decoder.feed(encode_frame(grande)[:100])
+    assert list(decoder.frames()) == []
+    decoder.feed(encode_frame(grande)[100:] + encode_texto("depois"))
+    assert list(decoder.frames()) == [(TIPO_TEXTO, grande), (TIPO_TEXTO, b"depois")]
+
+
+def test_frame_acima_do_limite_e_recusado():
+    decoder = FrameDecoder(tamanho_maximo=10)
+    decoder.feed(encode_frame(b"x" * 11))
+    with pytest.raises(FrameError):
+        list(decoder.frames())
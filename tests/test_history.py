@@ -0,0 +1,87 @@
+"""Reexibição do histórico a quem reconecta (core/history.py)."""
+import threading
+
+from core.framing import TIPO_CONTROLE, FrameDecoder, decode_mensagem
+from core.globals import HandlerRegistry
+from core.history import MessageHistory
+from core.protocol import RESPOSTA_LACUNA, RESPOSTA_SEQ, montar_comando, montar_marca
+
+
+class HandlerFalso:
+    def __init__(self):
+        self._running = True
+        self.decoder = FrameDecoder()
+
+    def enviar_frame(self, frame):
+        self.decoder.feed(frame)
+        return True
+
+    def recebidos(self):
+        """(seqs, controles) na ordem de chegada."""
+        seqs, controles = [], []
+        for tipo, payload in self.decoder.frames():
+            if tipo == TIPO_CONTROLE:
+                controles.append(payload.decode('utf-8'))
+            else:
+                seqs.append(decode_mensagem(payload)[0])
+        return seqs, controles
+
+
+def _historico(quantidade, **opcoes):
+    historico = MessageHistory(**opcoes)
+    ninguem = HandlerRegistry(threading.Lock())
+    for i in range(quantidade):
+        historico.publicar(f"msg {i}", ninguem, sala="sala-par" if i % 2 else "geral")
+    return historico
+
+
+def _inscrever(historico, **opcoes):
+    handler = HandlerFalso()
+    historico.inscrever(handler, HandlerRegistry(threading.Lock()), informar_seq=True, **opcoes)
+    return handler.recebidos()
+
+
+def test_reenvia_so_o_que_faltou_das_salas_pedidas():
+    historico = _historico(10)
+    seqs, controles = _inscrever(historico, desde_seq=4, epoca=historico.epoca, salas={"geral"})
+    assert seqs == [5, 7, 9]
+    assert controles == [montar_comando(RESPOSTA_SEQ, montar_marca(10, historico.epoca))]
+
+
+def test_outra_epoca_ou_seq_a_frente_reenvia_tudo():
+    historico = _historico(5)
+    assert _inscrever(historico, desde_seq=3, epoca="outra")[0] == [1, 2, 3, 4, 5]
+    assert _inscrever(historico, desde_seq=50)[0] == [1, 2, 3, 4, 5]
+
+
+def test_minimos_escondem_o_que_veio_antes_do_dono():
+    historico = _historico(6)
+    seqs, _ = _inscrever(historico, salas={"geral", "sala-par"}, minimos={"sala-par": 4})
+    assert seqs == [1, 3, 5, 6]
+
+
+def test_lacuna_alem_do_buffer_e_informada():
+    historico = _historico(10, max_mensagens=4)
+    assert len(historico) == 4 and historico.primeiro_seq == 7
+    seqs, controles = _inscrever(historico, desde_seq=2, epoca=historico.epoca)
+    assert seqs == [7, 8, 9, 10]
+    assert montar_comando(RESPOSTA_LACUNA, "3,6") in controles
+
+
+def test_buffer_limitado_por_bytes():
+    historico = _historico(10, max_bytes=100)
+    assert sum(len(frame) for _, frame, _ in historico.entradas()) <= 100
+    assert historico.entradas()[-1][0] == 10
+
+
+def test_inscrito_depois_da_numeracao_nao_recebe_em_dobro():
+    historico = MessageHistory()
+    registro = HandlerRegistry(threading.Lock())
+    antigo = HandlerFalso()
+    registro.append(antigo)
+    historico.publicar("primeira", registro)
+    novo = HandlerFalso()
+    historico.inscrever(novo, registro)
+    historico.publicar("segunda", registro)
+    assert novo.recebidos()[0] == [1, 2]
+    assert antigo.recebidos()[0] == [1, 2]
@@ -0,0 +1,61 @@
+"""Provisionamento do host com o backend falso (core/hotspot.py)."""
+import socket
+import threading
+
+from conftest import TIMEOUT, porta_livre
+from core.auth_server import AuthServer
+from core.chatserver import iniciar_em_segundo_plano
+from core.hotspot import ETAPA_RADIO, BackendFalso, ProvisionamentoHost
+
+
+def test_provisionamento_sobe_radio_e_servidores():
+    auth = AuthServer("127.0.0.1", 0)
+    porta_chat = porta_livre()
+    backend = BackendFalso(atraso=0.05)
+    progresso = []
+    conclusoes = []
+    concluido = threading.Event()
+
+    def ao_concluir(ok, texto):
+        conclusoes.append((ok, texto))
+        concluido.set()
+
+    provisionamento = ProvisionamentoHost(
+        "wlan0", "rede-teste", "senha-teste",
+        servidores=[
+            ("autenticação", auth.start),
+            ("chat", lambda: iniciar_em_segundo_plano(host="127.0.0.1", port=porta_chat, modo="eventos")),
+        ],
+        backend=backend, ao_progredir=progresso.append, ao_concluir=ao_concluir)
+    try:
+        provisionamento.start()
+        assert concluido.wait(TIMEOUT)
+
+        assert conclusoes == [(True, conclusoes[0][1])]
+        assert "rede-teste" in conclusoes[0][1]
+        assert provisionamento.erros == {}
+        assert set(provisionamento.duracoes) == {ETAPA_RADIO, "autenticação", "chat"}
+        assert provisionamento.tempo_pronto is not None
+        assert [comando[:3] for comando in backend.comandos] == [("dev", "disconnect", "wlan0"),
+                                                                  ("dev", "wifi", "hotspot")]
+        for etapa in (ETAPA_RADIO, "autenticação", "chat"):
+            assert any(f"'{etapa}' concluída" in texto for texto in progresso), etapa
+
+        for porta in (auth.port, porta_chat):
+            socket.create_connection(("127.0.0.1", porta), timeout=TIMEOUT).close()
+    finally:
+        auth.stop()
+
+
+def test_provisionamento_informa_falha_do_radio():
+    backend = BackendFalso(atraso=0, falhar=True)
+    conclusoes = []
+    concluido = threading.Event()
+
+    def ao_concluir(ok, texto):
+        conclusoes.append((ok, texto))
+        concluido.set()
+
+    ProvisionamentoHost("wlan0", "rede-teste", "senha-teste", backend=backend, ao_concluir=ao_concluir).start()
+    assert concluido.wait(TIMEOUT)
+    assert conclusoes == [(False, f"{ETAPA_RADIO}: hotspot simulado falhou")]
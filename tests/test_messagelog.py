@@ -0,0 +1,65 @@
+"""Recuperação e retenção do log de mensagens (core/messagelog.py)."""
+import os
+import time
+
+from core.messagelog import EXTENSAO, MessageLog
+
+
+def _gravar(diretorio, seqs, **opcoes):
+    log = MessageLog(str(diretorio), **opcoes)
+    for seq in seqs:
+        log.append(seq, time.time(), "ana", f"msg {seq}", "" if seq % 2 else "sala")
+    log.flush()
+    log.close()
+
+
+def _segmentos(diretorio):
+    return sorted(n for n in os.listdir(str(diretorio)) if n.endswith(EXTENSAO))
+
+
+def test_reabre_de_onde_parou_e_le_com_sala(tmp_path):
+    _gravar(tmp_path, range(1, 6))
+    log = MessageLog(str(tmp_path))
+    assert log.ultimo_seq == 5
+    assert [(seq, texto, sala) for seq, _, _, texto, sala in log.ler(3)] == [(4, "msg 4", "sala"), (5, "msg 5", "")]
+    log.close()
+
+
+def test_final_corrompido_e_descartado(tmp_path):
+    _gravar(tmp_path, range(1, 4))
+    caminho = os.path.join(str(tmp_path), _segmentos(tmp_path)[-1])
+    with open(caminho, "ab") as f:
+        f.write(b"\x00\x00\x00\x40lixo")  # Registro interrompido no meio da escrita
+    tamanho = os.path.getsize(caminho)
+    log = MessageLog(str(tmp_path))
+    assert log.ultimo_seq == 3 and os.path.getsize(caminho) == tamanho - 8
+    log.close()
+
+
+def test_segmento_vazio_sozinho_mantem_a_numeracao(tmp_path):
+    # Rotação que criou 00..41.log e a retenção apagou todos os anteriores
+    open(os.path.join(str(tmp_path), f"{41:020d}{EXTENSAO}"), "wb").close()
+    log = MessageLog(str(tmp_path))
+    assert log.ultimo_seq == 40
+    log.close()
+
+
+def test_retencao_por_quantidade_de_segmentos(tmp_path):
+    _gravar(tmp_path, range(1, 41), tamanho_segmento=100, max_segmentos=3)
+    assert len(_segmentos(tmp_path)) == 3
+    log = MessageLog(str(tmp_path), tamanho_segmento=100, max_segmentos=3)
+    seqs = [seq for seq, *_ in log.ler()]
+    assert seqs[-1] == 40 and seqs == list(range(seqs[0], 41))
+    log.close()
+
+
+def test_retencao_por_idade_poupa_o_segmento_atual(tmp_path):
+    _gravar(tmp_path, range(1, 21), tamanho_segmento=100)
+    segmentos = _segmentos(tmp_path)
+    antigo = time.time() - 10 * 86400
+    for nome in segmentos:
+        os.utime(os.path.join(str(tmp_path), nome), (antigo, antigo))
+    log = MessageLog(str(tmp_path), tamanho_segmento=100, dias_retencao=7)
+    assert _segmentos(tmp_path) == segmentos[-1:]
+    assert log.ultimo_seq == 20
+    log.close()
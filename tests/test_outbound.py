@@ -0,0 +1,38 @@
+"""Fila de saída com limites alto e baixo (core/outbound.py)."""
+from core.outbound import POLITICA_DESCARTAR, POLITICA_DESCONECTAR, OutboundQueue
+
+FRAME = b"x" * 100
+
+
+def test_descartar_ate_baixar_do_limite_baixo():
+    fila = OutboundQueue(limite_alto=300, limite_baixo=100, politica=POLITICA_DESCARTAR)
+    assert all(fila.put(FRAME) for _ in range(3))
+    assert not fila.put(FRAME) and fila.congestionada
+
+    # Abaixo do limite alto, mas ainda acima do baixo: continua descartando
+    fila.proximo_lote(max_bytes=100)
+    assert not fila.put(FRAME)
+    fila.proximo_lote(max_bytes=100)
+    assert not fila.congestionada and fila.put(FRAME)
+    assert fila.estatisticas()["frames_descartados"] == 2
+
+
+def test_desconectar_despeja_uma_vez_e_fecha():
+    despejos = []
+    fila = OutboundQueue(limite_alto=150, politica=POLITICA_DESCONECTAR, ao_despejar=lambda: despejos.append(1))
+    assert fila.put(FRAME)
+    assert not fila.put(FRAME)
+    assert not fila.put(FRAME)
+    assert despejos == [1] and fila.fechada
+    assert fila.aguardar_lote() == []
+
+
+def test_aviso_de_pendente_so_quando_deixa_de_estar_vazia():
+    avisos = []
+    fila = OutboundQueue(ao_ficar_pendente=lambda: avisos.append(1))
+    fila.put(FRAME)
+    fila.put(FRAME)
+    assert avisos == [1]
+    assert fila.proximo_lote() == [FRAME, FRAME]
+    fila.put(FRAME)
+    assert avisos == [1, 1]
@@ -0,0 +1,40 @@
+"""Token buckets do limite de envio (core/ratelimit.py)."""
+from core.ratelimit import RAJADA_MENSAGENS, LimitadorDeConexao, TokenBucket
+
+
+def test_rajada_depois_debito_pago_pelo_tempo():
+    balde = TokenBucket(taxa=10, rajada=5, agora=0.0)
+    for _ in range(5):
+        balde.consumir(1, agora=0.0)
+    assert balde.atraso(0, agora=0.0) == 0
+    balde.consumir(2, agora=0.0)  # Pode ficar negativo
+    assert balde.atraso(0, agora=0.0) == 0.2
+    assert balde.atraso(0, agora=0.2) == 0
+    assert balde.atraso(1, agora=0.2) == 0.1
+
+
+def test_saldo_nao_passa_da_rajada():
+    balde = TokenBucket(taxa=10, rajada=5, agora=0.0)
+    assert balde.cheio(agora=100.0)
+    balde.consumir(5, agora=100.0)
+    assert balde.atraso(6, agora=1000.0) == 0.1
+
+
+def _admitidas(limitadores, tentativas):
+    admitidas = 0
+    for i in range(tentativas):
+        limitador = limitadores[i % len(limitadores)]
+        if not limitador.em_debito() and limitador.admitir(10):
+            admitidas += 1
+    return admitidas
+
+
+def test_conexoes_do_mesmo_ip_dividem_o_balde_do_ip():
+    limitadores = [LimitadorDeConexao("10.0.0.1") for _ in range(5)]
+    # Separadas, as 5 conexões somariam 5 rajadas
+    assert _admitidas(limitadores, 500) < 3 * RAJADA_MENSAGENS
+    for limitador in limitadores:
+        limitador.encerrar()
+    # Reconectar não traz uma rajada nova: o balde do IP continua em débito
+    assert LimitadorDeConexao("10.0.0.1").em_debito()
+    assert not LimitadorDeConexao("10.0.0.2").em_debito()
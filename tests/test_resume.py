@@ -0,0 +1,68 @@
+"""Reconexão com __RESUME__ depois de um reinício do servidor (core/history.py)."""
+from conftest import esperar
+from core.protocol import OPCAO_RESUME, RESPOSTA_LACUNA, RESPOSTA_SEQ, montar_marca, parse_marca
+
+
+def test_reinicio_sem_log_reenvia_tudo_mesmo_com_seq_menor(hosts, clientes):
+    host = hosts("host-resume")
+    leitor = clientes(host.porta, "leitor", **{OPCAO_RESUME: 0})
+    remetente = clientes(host.porta, "ana")
+    for i in range(3):
+        remetente.enviar(f"antes {i}")
+    assert esperar(lambda: len(leitor.recebidas("antes")) == 3)
+    assert esperar(lambda: leitor.controle(RESPOSTA_SEQ))
+    _, epoca = parse_marca(leitor.controle(RESPOSTA_SEQ))
+    assert epoca
+    ultimo = max(leitor.seqs)
+    leitor.fechar()
+    remetente.fechar()
+
+    # Sem log a numeração recomeça: o novo servidor passa do seq do cliente antes de ele voltar
+    host.reiniciar()
+    remetente = clientes(host.porta, "ana")
+    for i in range(5):
+        remetente.enviar(f"depois {i}")
+    testemunha = clientes(host.porta, "testemunha")
+    assert esperar(lambda: len(testemunha.recebidas("depois")) == 5)
+
+    de_volta = clientes(host.porta, "leitor", **{OPCAO_RESUME: montar_marca(ultimo, epoca)})
+    assert esperar(lambda: len(de_volta.recebidas("depois")) == 5)
+    seq, nova_epoca = parse_marca(de_volta.controle(RESPOSTA_SEQ))
+    assert nova_epoca != epoca and seq >= 5
+
+
+def test_mesma_epoca_reenvia_so_o_que_faltou(hosts, clientes):
+    host = hosts("host-resume")
+    leitor = clientes(host.porta, "leitor", **{OPCAO_RESUME: 0})
+    remetente = clientes(host.porta, "ana")
+    for i in range(4):
+        remetente.enviar(f"msg {i}")
+    assert esperar(lambda: len(leitor.recebidas("msg")) == 4)
+    _, epoca = parse_marca(leitor.controle(RESPOSTA_SEQ))
+    leitor.fechar()
+
+    de_volta = clientes(host.porta, "leitor", **{OPCAO_RESUME: montar_marca(leitor.seqs[1], epoca)})
+    assert esperar(lambda: len(de_volta.recebidas("msg")) == 2)
+    assert de_volta.recebidas("msg") == ["ana: msg 2", "ana: msg 3"]
+
+
+def test_lacuna_maior_que_o_buffer_e_informada(hosts, clientes):
+    host = hosts("host-resume", ambiente={"P2P_CHAT_HISTORICO_MENSAGENS": "3"})
+    leitor = clientes(host.porta, "leitor", **{OPCAO_RESUME: 0})
+    remetente = clientes(host.porta, "ana")
+    remetente.enviar("msg 0")
+    assert esperar(lambda: len(leitor.recebidas("msg")) == 1)
+    _, epoca = parse_marca(leitor.controle(RESPOSTA_SEQ))
+    ultimo = leitor.seqs[-1]
+    leitor.fechar()
+
+    for i in range(1, 7):
+        remetente.enviar(f"msg {i}")
+    testemunha = clientes(host.porta, "testemunha")
+    assert esperar(lambda: testemunha.recebidas("msg 6"))
+
+    # Sem log, só as 3 últimas voltam; as outras são informadas em vez de sumirem em silêncio
+    de_volta = clientes(host.porta, "leitor", **{OPCAO_RESUME: montar_marca(ultimo, epoca)})
+    assert esperar(lambda: de_volta.controle(RESPOSTA_LACUNA))
+    assert de_volta.controle(RESPOSTA_LACUNA) == f"{ultimo + 1},{ultimo + 3}"
+    assert esperar(lambda: de_volta.recebidas("msg") == ["ana: msg 4", "ana: msg 5", "ana: msg 6"])
@@ -0,0 +1,59 @@
+"""Salas e mensagens diretas num host real (core/rooms.py)."""
+import time
+
+import pytest
+
+from conftest import esperar
+from core.protocol import OPCAO_RESUME, OPCAO_SESSAO, RESPOSTA_SESSAO
+
+
+def conectar(clientes, host, nome, **opcoes):
+    antes = host.contar(f"identificado como: {nome}")
+    cliente = clientes(host.porta, nome, **opcoes)
+    assert esperar(lambda: host.contar(f"identificado como: {nome}") > antes)
+    return cliente
+
+
+@pytest.mark.parametrize("modo", ["eventos", "threads", "processos"])
+def test_dm_so_chega_ao_dono_do_nome(hosts, clientes, modo):
+    host = hosts("host-dm", modo=modo)
+    alice = conectar(clientes, host, "alice")
+    assert esperar(lambda: alice.controle(RESPOSTA_SESSAO))
+    segredo = alice.controle(RESPOSTA_SESSAO)
+    bob = conectar(clientes, host, "bob")
+
+    bob.enviar_dm("alice", "segredo antigo")
+    assert esperar(lambda: alice.recebidas("segredo antigo"))
+    alice.fechar()
+
+    # Outra conexão dizendo ser "alice", sem o segredo: nem a reexibição nem o tráfego ao vivo
+    impostor = conectar(clientes, host, "alice")
+    assert esperar(lambda: any("já tem uma sessão" in aviso for aviso in impostor.avisos))
+    assert impostor.controle(RESPOSTA_SESSAO) is None
+    bob.enviar_dm("alice", "segredo novo")
+    bob.enviar("oi geral")
+    assert esperar(lambda: impostor.recebidas("oi geral"))
+    assert impostor.recebidas("segredo") == []
+
+    # A dona volta com o segredo e recebe o que perdeu
+    de_volta = conectar(clientes, host, "alice", **{OPCAO_SESSAO: segredo, OPCAO_RESUME: 1})
+    assert esperar(lambda: de_volta.recebidas("segredo novo"))
+    assert de_volta.controle(RESPOSTA_SESSAO) == segredo
+
+
+def test_nome_livre_depois_da_expiracao_nao_herda_dms(hosts, clientes):
+    host = hosts("host-dm", ambiente={"P2P_CHAT_SESSAO_EXPIRA": "0.2"})
+    alice = conectar(clientes, host, "alice")
+    bob = conectar(clientes, host, "bob")
+    bob.enviar_dm("alice", "só para a primeira")
+    assert esperar(lambda: alice.recebidas("só para a primeira"))
+    segredo = alice.controle(RESPOSTA_SESSAO)
+    alice.fechar()
+    time.sleep(0.5)
+
+    nova = conectar(clientes, host, "alice")
+    assert esperar(lambda: nova.controle(RESPOSTA_SESSAO))
+    assert nova.controle(RESPOSTA_SESSAO) != segredo
+    bob.enviar_dm("alice", "para a nova dona")
+    assert esperar(lambda: nova.recebidas("para a nova dona"))
+    assert nova.recebidas("só para a primeira") == []
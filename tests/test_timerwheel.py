@@ -0,0 +1,38 @@
+"""Roda de temporização dos batimentos (core/timerwheel.py)."""
+from core.timerwheel import TimerWheel
+
+
+def test_vence_so_no_tick_do_prazo():
+    roda = TimerWheel(resolucao=1.0, num_slots=8, agora=100.0)
+    roda.agendar("a", 103.5)
+    roda.agendar("b", 105.0)
+    assert roda.avancar(102.9) == []
+    assert roda.avancar(103.0) == ["a"]
+    assert roda.avancar(106.0) == ["b"]
+    assert len(roda) == 0
+
+
+def test_prazo_alem_de_uma_volta_espera_o_proprio_tick():
+    roda = TimerWheel(resolucao=1.0, num_slots=4, agora=0.0)
+    roda.agendar("longe", 10.0)  # Mesmo slot que os ticks 2 e 6
+    assert roda.avancar(6.0) == []
+    assert roda.avancar(10.0) == ["longe"]
+
+
+def test_reagendar_e_cancelar():
+    roda = TimerWheel(resolucao=1.0, num_slots=8, agora=0.0)
+    roda.agendar("a", 2.0)
+    roda.agendar("a", 5.0)
+    roda.agendar("b", 2.0)
+    roda.cancelar("b")
+    assert roda.avancar(3.0) == []
+    assert "a" in roda and "b" not in roda
+    assert roda.avancar(5.0) == ["a"]
+
+
+def test_prazo_vencido_cai_no_proximo_tick_e_pausa_longa_visita_uma_volta():
+    roda = TimerWheel(resolucao=1.0, num_slots=4, agora=10.0)
+    roda.agendar("atrasado", 3.0)
+    roda.agendar("c", 12.0)
+    assert sorted(roda.avancar(1000.0)) == ["atrasado", "c"]
+    assert roda.tick == 1000
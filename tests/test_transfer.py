@@ -0,0 +1,75 @@
+"""Limites do recebimento de arquivos no servidor (core/transfer.py)."""
+import json
+import os
+import time
+
+import pytest
+
+from core import transfer
+from core.framing import FrameDecoder
+from core.protocol import COMANDO_UPLOAD, RESPOSTA_ERRO_ARQUIVO, RESPOSTA_UPLOAD, SALA_PADRAO, parse_comando
+from core.transfer import EXTENSAO_PARCIAL, RepositorioArquivos, novo_id, tratar_comando_arquivo
+
+DIA = 24 * 3600
+
+
+class HandlerFalso:
+    def __init__(self):
+        self.username = "ana"
+        self.salas = {SALA_PADRAO}
+        self.sala_atual = SALA_PADRAO
+        self.recebimentos = {}
+        self.decoder = FrameDecoder()
+
+    def enviar_frame(self, frame):
+        self.decoder.feed(frame)
+        return True
+
+    def respostas(self):
+        return [parse_comando(payload.decode('utf-8'), (RESPOSTA_UPLOAD, RESPOSTA_ERRO_ARQUIVO))
+                for _, payload in self.decoder.frames()]
+
+
+def test_cota_recusa_arquivo_novo_mas_deixa_retomar(tmp_path):
+    repositorio = RepositorioArquivos(str(tmp_path), cota=1000)
+    primeiro = repositorio.receber(novo_id(), "a.bin", 600, "ana", SALA_PADRAO)
+    with pytest.raises(ValueError, match="cota"):
+        repositorio.receber(novo_id(), "b.bin", 500, "ana", SALA_PADRAO)
+    primeiro.fechar()
+
+    # Retomar o mesmo envio não reserva o espaço de novo
+    retomado = repositorio.receber(primeiro.id, "a.bin", 600, "ana", SALA_PADRAO)
+    assert retomado is not None and repositorio.ocupado == 600
+    retomado.fechar()
+
+
+def test_parte_abandonada_expira_e_libera_a_cota(tmp_path):
+    repositorio = RepositorioArquivos(str(tmp_path), cota=1000, expiracao=DIA)
+    abandonado = repositorio.receber(novo_id(), "a.bin", 600, "ana", SALA_PADRAO)
+    abandonado.escrever(0, b"x" * 100)
+    abandonado.fechar()
+    antigo = time.time() - 2 * DIA
+    for extensao in (EXTENSAO_PARCIAL, ".json"):
+        os.utime(os.path.join(str(tmp_path), abandonado.id + extensao), (antigo, antigo))
+
+    repositorio._ultima_varredura = None  # Força a varredura no próximo recebimento
+    novo = repositorio.receber(novo_id(), "b.bin", 900, "ana", SALA_PADRAO)
+    assert novo is not None and repositorio.ocupado == 900
+    assert sorted(os.listdir(str(tmp_path))) == sorted([novo.id + ".json", novo.id + EXTENSAO_PARCIAL])
+    novo.fechar()
+
+
+def test_limite_de_envios_simultaneos_por_conexao(tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, "repositorio", RepositorioArquivos(str(tmp_path)))
+    handler = HandlerFalso()
+    oferta = json.dumps({"nome": "a.bin", "tamanho": 10})
+    ids = [novo_id() for _ in range(transfer.MAX_UPLOADS_SIMULTANEOS + 1)]
+    for id_transferencia in ids:
+        tratar_comando_arquivo(handler, COMANDO_UPLOAD, id_transferencia, oferta)
+
+    respostas = handler.respostas()
+    assert [comando for comando, _, _ in respostas[:-1]] == [RESPOSTA_UPLOAD] * transfer.MAX_UPLOADS_SIMULTANEOS
+    assert respostas[-1][:2] == (RESPOSTA_ERRO_ARQUIVO, ids[-1])
+    assert len(handler.recebimentos) == transfer.MAX_UPLOADS_SIMULTANEOS
+    for recebimento in handler.recebimentos.values():
+        recebimento.fechar()
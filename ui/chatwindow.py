@@ -2,12 +2,20 @@ from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QTextEdit,
     QLineEdit, QPushButton, QCheckBox, QLabel, QTabWidget, QSizePolicy
 )
-from PySide6.QtCore import Qt
-from core.chatclient import ChatClient
-import subprocess
+from PySide6.QtCore import Qt, QTimer, Signal
+from PySide6.QtGui import QTextCursor
+from core.chatclient import ENTREGA_DESCARTADA, ENTREGA_ENVIADA, ENTREGA_PENDENTE, ChatClient
+import threading
+
+# Mensagens recebidas são acumuladas e desenhadas em lote a cada intervalo
+INTERVALO_RENDERIZACAO_MS = 33
+MAX_LINHAS_CHAT = 5000  # Linhas mantidas na área de chat; as mais antigas são descartadas
 
 
 class ChatWindow(QWidget):
+    # Emitido quando o buffer de mensagens deixa de estar vazio (uma vez por lote)
+    _mensagens_pendentes = Signal()
+
     def __init__(self, client: ChatClient = None, is_host: bool = False, broadcast_func=None):
         super().__init__()
         self.setWindowTitle("Chat Seguro")
@@ -16,7 +24,10 @@ class ChatWindow(QWidget):
         self.client = client  # Instância do cliente de chat
         self.is_host = is_host  # Se for o host, habilitar configurações
         self.broadcast_func = broadcast_func  # Função de broadcast (apenas para host)
-        self.server_process = None  # Referência para o processo do servidor
+        self.auth_server = None  # Servidor de autenticação no próprio processo (só no host)
+        if is_host:
+            from core.auth_server import servidor_autenticacao
+            self.auth_server = servidor_autenticacao()
 
         layout = QVBoxLayout(self)
 
@@ -32,8 +43,20 @@ class ChatWindow(QWidget):
         self.textview = QTextEdit()
         self.textview.setReadOnly(True)
         self.textview.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.textview.document().setMaximumBlockCount(MAX_LINHAS_CHAT)
         self.chat_layout.addWidget(self.textview)
 
+        # Renderização em lote: add_message_to_chat só acumula; o timer desenha tudo de uma vez
+        self._buffer_mensagens = []
+        self._buffer_lock = threading.Lock()
+        self._renderizacao_agendada = False
+        self._timer_renderizacao = QTimer(self)
+        self._timer_renderizacao.setSingleShot(True)
+        self._timer_renderizacao.setInterval(INTERVALO_RENDERIZACAO_MS)
+        self._timer_renderizacao.timeout.connect(self._renderizar_pendentes)
+        self._mensagens_pendentes.connect(self._timer_renderizacao.start)
+        self._envios_pendentes = set()  # Ids de mensagens retidas à espera da reconexão
+
         # Linha de entrada e botão enviar
         input_layout = QHBoxLayout()
         self.entry = QLineEdit()
@@ -68,10 +91,16 @@ class ChatWindow(QWidget):
         self.settings_layout.addWidget(settings_label)
 
         self.server_checkbox = QCheckBox("Servidor de autenticação ativado")
-        self.server_checkbox.setChecked(False)
+        self.server_checkbox.setChecked(self.auth_server.ativo)
         self.server_checkbox.stateChanged.connect(self.on_server_checkbox_changed)
         self.settings_layout.addWidget(self.server_checkbox)
 
+    def atualizar_estado_autenticacao(self):
+        """Sincroniza o checkbox com o servidor de autenticação (iniciado fora desta janela)"""
+        self.server_checkbox.blockSignals(True)
+        self.server_checkbox.setChecked(self.auth_server.ativo)
+        self.server_checkbox.blockSignals(False)
+
     def on_server_checkbox_changed(self):
         """Ativa ou desativa o servidor de autenticação dependendo do checkbox"""
         if self.server_checkbox.isChecked():
@@ -81,17 +110,18 @@ class ChatWindow(QWidget):
 
     def start_authentication_server(self):
         """Inicia o servidor de autenticação"""
-        if not self.server_process:
-            self.server_process = subprocess.Popen(["python3", "server.py"])
-            self.add_message_to_chat("Servidor de autenticação iniciado.")
-        else:
-            self.add_message_to_chat("Servidor de autenticação já está em execução.")
+        try:
+            if self.auth_server.start():
+                self.add_message_to_chat("Servidor de autenticação iniciado.")
+            else:
+                self.add_message_to_chat("Servidor de autenticação já está em execução.")
+        except OSError as e:
+            self.add_message_to_chat(f"Erro ao iniciar servidor de autenticação: {e}")
 
     def stop_authentication_server(self):
         """Para o servidor de autenticação"""
-        if self.server_process:
-            self.server_process.terminate()
-            self.server_process = None
+        if self.auth_server.ativo:
+            self.auth_server.stop()
             self.add_message_to_chat("Servidor de autenticação parado.")
         else:
             self.add_message_to_chat("Nenhum servidor de autenticação em execução.")
@@ -100,21 +130,75 @@ class ChatWindow(QWidget):
         mensagem = self.entry.text().strip()
 
         if mensagem:
-            self.add_message_to_chat(f"Você: {mensagem}")
             self.entry.clear()
+            if not self.is_host and self.client and mensagem.startswith("/"):
+                # Comandos de salas e mensagens diretas (ver ChatClient.executar_comando)
+                self.add_message_to_chat(self.client.executar_comando(mensagem))
+                return
+            self.add_message_to_chat(f"Você: {mensagem}")
             if self.is_host:
                 if self.broadcast_func:
                     self.broadcast_func(mensagem, self)
             else:
                 if self.client:
                     try:
-                        # Envia diretamente usando o cliente, sem dispatcher
+                        # Só enfileira: a escrita acontece na thread de escrita do cliente
                         self.client.send_message(mensagem)
                     except Exception as e:
                         self.add_message_to_chat(f"Erro ao enviar: {str(e)}")
                 else:
                     self.add_message_to_chat("Erro: Conexão não disponível")
 
+    def atualizar_entrega(self, id_envio: int, estado: str, texto: str):
+        """Estado de uma mensagem enviada (chamada da thread de escrita do cliente).
+
+        O envio normal não gera aviso; só mensagens retidas ou perdidas aparecem no chat.
+        """
+        if estado == ENTREGA_PENDENTE:
+            self._envios_pendentes.add(id_envio)
+            self.add_message_to_chat(f"(sem conexão) '{texto}' será enviada ao reconectar.")
+        elif estado == ENTREGA_ENVIADA and id_envio in self._envios_pendentes:
+            self._envios_pendentes.discard(id_envio)
+            self.add_message_to_chat(f"(enviada) '{texto}'")
+        elif estado == ENTREGA_DESCARTADA:
+            self._envios_pendentes.discard(id_envio)
+            self.add_message_to_chat(f"Erro: '{texto}' não foi enviada.")
+
     def add_message_to_chat(self, mensagem: str):
-        """Adiciona uma mensagem à área de chat"""
-        self.textview.append(mensagem)
\ No newline at end of file
+        """Adiciona uma mensagem à área de chat.
+
+        Pode ser chamada de qualquer thread: apenas acumula a mensagem e agenda
+        uma renderização, que acontece no máximo a cada INTERVALO_RENDERIZACAO_MS.
+        """
+        with self._buffer_lock:
+            self._buffer_mensagens.append(mensagem)
+            if self._renderizacao_agendada:
+                return
+            self._renderizacao_agendada = True
+        self._mensagens_pendentes.emit()
+
+    def _renderizar_pendentes(self):
+        """Insere todas as mensagens acumuladas em uma única edição do documento"""
+        with self._buffer_lock:
+            mensagens, self._buffer_mensagens = self._buffer_mensagens, []
+            self._renderizacao_agendada = False
+        if not mensagens:
+            return
+        # Em rajadas maiores que a área de chat, só as últimas linhas ficariam visíveis
+        mensagens = mensagens[-MAX_LINHAS_CHAT:]
+
+        scrollbar = self.textview.verticalScrollBar()
+        no_fim = scrollbar.value() >= scrollbar.maximum() - 4
+
+        documento = self.textview.document()
+        cursor = QTextCursor(documento)
+        cursor.movePosition(QTextCursor.End)
+        cursor.beginEditBlock()
+        if not documento.isEmpty():
+            cursor.insertBlock()
+        cursor.insertText("\n".join(mensagens))
+        cursor.endEditBlock()
+
+        # Só acompanha o fim se o usuário não tiver rolado para ler mensagens antigas
+        if no_fim:
+            scrollbar.setValue(scrollbar.maximum())
\ No newline at end of file
@@ -1,19 +1,27 @@
+import threading
+
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QLabel, QPushButton, QDialog,
     QHBoxLayout, QLineEdit, QMessageBox, QSpacerItem, QSizePolicy
 )
-from PySide6.QtCore import Qt, Slot
-import subprocess
-import sys
-import threading
+from PySide6.QtCore import QObject, Qt, Signal, Slot
 from PySide6 import QtCore
 from PySide6.QtGui import QIcon, QFont
-from core.auth_token import validar_token
-from core.networking import verificar_conexao_com_host, obter_gateway
-from core.hotspot import detectar_interfaces_wifi, criar_hotspot
-from ui.chatwindow import ChatWindow
-from core.chatclient import ChatClient
-from core.chatserver import start_server, broadcast_from_host  # Importa start_server e broadcast_from_host
+
+# Os módulos de rede (servidor, cliente, autenticação, hotspot) são importados
+# nos métodos de cada modo: quem só entra num chat nunca carrega o servidor e
+# a primeira janela aparece sem esperar por nenhum deles (ver core/startup.py).
+
+
+class SinaisProvisionamento(QObject):
+    """Leva o progresso do provisionamento (threads de core/hotspot.py) para a thread da interface."""
+    etapa = Signal(str)
+    concluido = Signal(bool, str)
+
+
+class SinaisDescoberta(QObject):
+    """Leva o resultado de localizar_host (thread de descoberta) para a thread da interface."""
+    encontrado = Signal(object)  # HostAnunciado ou None
 
 
 class MainWindow(QMainWindow):
@@ -43,12 +51,15 @@ class MainWindow(QMainWindow):
         btn_host.setFixedSize(200, 80)
         btn_host.clicked.connect(self.on_host_clicked)
 
-        btn_join = QPushButton("Juntar-se à Rede")
+        btn_join = self.btn_join = QPushButton("Juntar-se à Rede")
         btn_join.setIcon(QIcon.fromTheme("contact-new"))
         btn_join.setIconSize(QtCore.QSize(32, 32))
         btn_join.setFixedSize(200, 80)
         btn_join.clicked.connect(self.on_join_clicked)
 
+        self.sinais_descoberta = SinaisDescoberta()
+        self.sinais_descoberta.encontrado.connect(self.on_host_localizado)
+
         hbox.addStretch()
         hbox.addWidget(btn_host)
         hbox.addSpacing(50)
@@ -66,13 +77,29 @@ class MainWindow(QMainWindow):
 
     @Slot()
     def on_join_clicked(self):
-        if verificar_conexao_com_host(validar_token):
+        from core.auth_token import validar_token
+        from core.networking import localizar_host
+
+        # Descoberta na rede local (ou o gateway, se nenhum host responder): a janela de
+        # procura e as autenticações levam segundos, então rodam fora da thread da interface
+        self.btn_join.setEnabled(False)
+        self.btn_join.setText("Procurando hosts...")
+        threading.Thread(target=lambda: self.sinais_descoberta.encontrado.emit(localizar_host(validar_token)),
+                         name="descoberta-cliente", daemon=True).start()
+
+    @Slot(object)
+    def on_host_localizado(self, host):
+        self.btn_join.setEnabled(True)
+        self.btn_join.setText("Juntar-se à Rede")
+        if host:
             print("Você está conectado ao host correto!")
-            self.juntar_se_ao_hotspot()
+            self.juntar_se_ao_hotspot(host)
         else:
             self.mostrar_dialogo("Erro", "Não foi possível verificar a autenticidade do host.")
 
     def selecionar_interface_wifi(self):
+        from core.hotspot import detectar_interfaces_wifi
+
         interfaces = detectar_interfaces_wifi()
         if not interfaces:
             self.mostrar_dialogo("Erro", "Nenhuma interface Wi-Fi encontrada.")
@@ -125,6 +152,9 @@ class MainWindow(QMainWindow):
         layout.addWidget(btn_criar)
 
         def criar():
+            from core.chatserver import broadcast_from_host
+            from ui.chatwindow import ChatWindow
+
             ssid = ssid_entry.text()
             senha = senha_entry.text()
 
@@ -134,12 +164,6 @@ class MainWindow(QMainWindow):
 
             dialog.accept()
 
-            # Cria o hotspot e inicia o servidor de autenticação
-            criar_hotspot(interface, ssid, senha)
-            self.mostrar_dialogo("Hotspot criado", f"SSID: {ssid}\nSenha: {senha}")
-
-            threading.Thread(target=self.iniciar_servidor_autenticacao, daemon=True).start()
-
             # Cria a instância do ChatWindow para o host, passando a função broadcast_from_host
             self.chat_window = ChatWindow(
                 client=None,
@@ -148,12 +172,12 @@ class MainWindow(QMainWindow):
             )
             self.chat_window.show()
 
-            # Inicia o servidor de chat em uma thread
-            threading.Thread(target=self.iniciar_servidor_chat, daemon=True).start()
-
             # Esconde a janela principal
             self.hide()
 
+            # Hotspot e servidores sobem em segundo plano; a janela acompanha pelo chat
+            self.provisionar_host(interface, ssid, senha)
+
         btn_criar.clicked.connect(criar)
 
         dialog.exec()
@@ -165,33 +189,39 @@ class MainWindow(QMainWindow):
         msg.setIcon(QMessageBox.Information)
         msg.exec()
 
-    def iniciar_servidor_autenticacao(self):
-        subprocess.run(["python3", "server.py"])
+    def provisionar_host(self, interface, ssid, senha):
+        """Cria o hotspot e inicia os servidores de autenticação e de chat em paralelo, sem travar a janela"""
+        from core.auth_server import servidor_autenticacao
+        from core.chatserver import iniciar_em_segundo_plano
+        from core.hotspot import ProvisionamentoHost
+
+        self.sinais_provisionamento = SinaisProvisionamento()
+        self.sinais_provisionamento.etapa.connect(self.chat_window.add_message_to_chat)
+        self.sinais_provisionamento.concluido.connect(self.on_provisionamento_concluido)
+
+        self.provisionamento = ProvisionamentoHost(
+            interface, ssid, senha,
+            servidores=[
+                ("autenticação", servidor_autenticacao().start),
+                ("chat", lambda: iniciar_em_segundo_plano(self.chat_window)),
+            ],
+            ao_progredir=self.sinais_provisionamento.etapa.emit,
+            ao_concluir=self.sinais_provisionamento.concluido.emit,
+        )
+        self.provisionamento.start()
+
+    @Slot(bool, str)
+    def on_provisionamento_concluido(self, ok, texto):
+        self.chat_window.atualizar_estado_autenticacao()
+        if ok:
+            self.mostrar_dialogo("Hotspot criado", texto)
+        else:
+            self.mostrar_dialogo("Erro", f"Falha ao preparar o host: {texto}")
+
+    def juntar_se_ao_hotspot(self, host):
+        from core.chatclient import ChatClient
+        from ui.chatwindow import ChatWindow
 
-    def iniciar_servidor_chat(self):
-        """Inicia o servidor de chat em thread separada"""
-        try:
-            # Limpa handlers residuais antes de iniciar
-            from core.globals import handlers, clientes_lock
-            with clientes_lock:
-                handlers.clear()
-                
-            threading.Thread(
-                target=start_server,
-                args=(self.chat_window,),
-                daemon=True
-            ).start()
-        except Exception as e:
-            print(f"Erro ao iniciar servidor: {e}")
-            if hasattr(self, 'chat_window'):
-                self.chat_window.add_message_to_chat(f"Erro ao iniciar servidor: {e}")
-
-    def juntar_se_ao_hotspot(self):
-        gateway = obter_gateway()
-        if not gateway:
-            self.mostrar_dialogo("Erro", "Não foi possível obter o gateway da rede.")
-            return
-        
         name_dialog = QDialog(self)
         name_dialog.setWindowTitle("Seu Nome")
         name_layout = QVBoxLayout(name_dialog)
@@ -218,7 +248,7 @@ class MainWindow(QMainWindow):
         self.chat_window = ChatWindow(is_host=False)
         
         # Cria o cliente passando a janela já criada
-        client = ChatClient(gateway, 20557, self.chat_window, nome_usuario)
+        client = ChatClient(host.endereco, host.porta_chat, self.chat_window, nome_usuario)
         
         # Atualiza a referência do cliente na janela
         self.chat_window.client = client